@@ -0,0 +1,253 @@
+#include <Python.h>
+#include <stdlib.h>
+#include <string.h>
+#include <math.h>
+#include <complex.h>	// Use native C99 complex type for fftw3
+#ifdef MS_WINDOWS
+#include <windows.h>
+#else
+#include <time.h>
+#endif
+#include "quisk.h"
+
+// Time the receive processing without the sound card or the GUI.  The samples are a
+// synthetic tone plus noise, and the same input block is processed over and over.  This
+// is called by quisk_benchmark.py, which sets up the receiver with the usual calls to
+// _quisk and keeps the baseline results.  The stages are:
+//	"process"	quisk_process_samples() with the current mode, filters and sample rate.
+//	"frontend"	quisk_frontend() for format "param" with DC removal and correction.
+//	"decimate"	quisk_decimate() by "param".
+//	"resample"	quisk_resample_play() by "ratio" with quality "param".
+//	"source"	Read the sample source pt_sample_read, such as the file source in file_source.c,
+//				and call quisk_process_samples().  The block size is set by the source.
+//	"microphone"	quisk_process_microphone() with the key down for the current mode and
+//				transmit filters.  There is no transmit socket, so the samples are not sent.
+
+#define BENCH_MAX_BLOCKS	200000	// maximum number of block times to return
+#define BENCH_WARMUP		0.1		// seconds to run before timing
+
+static double bench_time(void)
+{	// Return a high resolution time in seconds
+#ifdef MS_WINDOWS
+	LARGE_INTEGER count, freq;
+
+	QueryPerformanceCounter(&count);
+	QueryPerformanceFrequency(&freq);
+	return (double)count.QuadPart / freq.QuadPart;
+#elif defined(CLOCK_MONOTONIC)
+	struct timespec ts;
+
+	clock_gettime(CLOCK_MONOTONIC, &ts);
+	return (double)ts.tv_sec + ts.tv_nsec * 1e-9;
+#else
+	return QuiskTimeSec();
+#endif
+}
+
+static void make_samples(complex * samples, int count)
+{	// A tone at 0.1 of the sample rate at -20 dB, and noise at -80 dB, with a DC offset
+	int i;
+	complex phase, vector;
+
+	srand(12345);
+	phase = cexp(I * 2.0 * M_PI * 0.1);
+	vector = CLIP32 * 0.1;
+	for (i = 0; i < count; i++) {
+		samples[i] = vector + CLIP32 * 0.0001 * ((double)rand() / RAND_MAX - 0.5 +
+			I * ((double)rand() / RAND_MAX - 0.5)) + CLIP32 * 0.001;
+		vector *= phase;
+	}
+}
+
+static void make_raw(void * raw, int format, complex * samples, int count)
+{	// Convert the samples to two-channel frames of the format
+	int i;
+	short * s16;
+	unsigned char * s24;
+	int * s32;
+	float * f32;
+	long re, im;
+
+	for (i = 0; i < count; i++) {
+		re = (long)creal(samples[i]);
+		im = (long)cimag(samples[i]);
+		switch (format) {
+		case QUISK_FMT_S16:
+			s16 = (short *)raw;
+			s16[2 * i] = (short)(re >> 16);
+			s16[2 * i + 1] = (short)(im >> 16);
+			break;
+		case QUISK_FMT_S24:
+			s24 = (unsigned char *)raw + 6 * i;
+			s24[0] = (unsigned char)(re >> 8);
+			s24[1] = (unsigned char)(re >> 16);
+			s24[2] = (unsigned char)(re >> 24);
+			s24[3] = (unsigned char)(im >> 8);
+			s24[4] = (unsigned char)(im >> 16);
+			s24[5] = (unsigned char)(im >> 24);
+			break;
+		case QUISK_FMT_S32:
+			s32 = (int *)raw;
+			s32[2 * i] = (int)re;
+			s32[2 * i + 1] = (int)im;
+			break;
+		case QUISK_FMT_FLOAT:
+			f32 = (float *)raw;
+			f32[2 * i] = (float)(creal(samples[i]) / CLIP32);
+			f32[2 * i + 1] = (float)(cimag(samples[i]) / CLIP32);
+			break;
+		}
+	}
+}
+
+PyObject * quisk_benchmark(PyObject * self, PyObject * args)
+{	// Process blocks of "block" samples with the stage for "seconds".  Return the input
+	// samples per second and a list of the time of each block in microseconds.  If seconds
+	// is zero, process one block with no warmup.
+	char * stage;
+	int i, block, param, nblocks, stage_id, warmup, n, key_down;
+	double seconds, ratio, t0, t1, tstart, total, count;
+	complex * input, * samples;
+	double * dSamples;
+	void * raw;
+	float * times;
+	struct sound_dev dev;
+	struct quisk_decimator dec;
+	struct quisk_resampler rs;
+	PyObject * list;
+	char play_name;
+
+	param = 0;
+	ratio = 196078.4 / 48000.0;
+	if (!PyArg_ParseTuple (args, "sid|id", &stage, &block, &seconds, &param, &ratio))
+		return NULL;
+	if ( ! strcmp(stage, "process"))
+		stage_id = 0;
+	else if ( ! strcmp(stage, "frontend") && param >= QUISK_FMT_S16 && param <= QUISK_FMT_FLOAT)
+		stage_id = 1;
+	else if ( ! strcmp(stage, "decimate") && param >= 1)
+		stage_id = 2;
+	else if ( ! strcmp(stage, "resample") && ratio > 0.0)
+		stage_id = 3;
+	else if ( ! strcmp(stage, "source") && pt_sample_read)
+		stage_id = 4;
+	else if ( ! strcmp(stage, "microphone"))
+		stage_id = 5;
+	else {
+		PyErr_SetString(QuiskError, "Unknown benchmark stage or bad parameter");
+		return NULL;
+	}
+	if (stage_id == 4)		// the source sets the block size
+		block = 0;
+	else if (block < 1 || block > SAMP_BUFFER_SIZE / 8) {
+		PyErr_SetString(QuiskError, "Block size is out of range");
+		return NULL;
+	}
+	else if (stage_id == 3 && block / ratio + 1 > SAMP_BUFFER_SIZE) {	// the output is larger than the input
+		PyErr_SetString(QuiskError, "The resample output is too large for the block size");
+		return NULL;
+	}
+	// The output of quisk_process_samples() may be larger than the input
+	samples = (complex *)malloc(SAMP_BUFFER_SIZE * sizeof(complex));
+	input = (complex *)malloc(block * sizeof(complex));
+	dSamples = (double *)malloc(block * sizeof(double));
+	raw = malloc(block * 2 * sizeof(int));
+	times = (float *)malloc(BENCH_MAX_BLOCKS * sizeof(float));
+	make_samples(input, block);
+	for (i = 0; i < block; i++)
+		dSamples[i] = creal(input[i]);
+	memset(&dev, 0, sizeof(dev));
+	memset(&dec, 0, sizeof(dec));
+	memset(&rs, 0, sizeof(rs));
+	play_name = quisk_sound_state.dev_play_name[0];
+	key_down = quisk_is_key_down();
+	switch (stage_id) {
+	case 0:		// quisk_process_samples() only demodulates if there is a play device
+	case 4:
+		if ( ! play_name)
+			quisk_sound_state.dev_play_name[0] = '-';
+		break;
+	case 1:
+		make_raw(raw, param, input, block);
+		dev.num_channels = 2;
+		dev.channel_I = 0;
+		dev.channel_Q = 1;
+		dev.channel_Delay = -1;
+		dev.doAmplPhase = 1;
+		dev.AmPhAAAA = 1.001;
+		dev.AmPhCCCC = 0.002;
+		dev.AmPhDDDD = 0.999;
+		dev.frontend = QUISK_FE_DC_REMOVE | QUISK_FE_CORRECT;
+		break;
+	case 3:
+		quisk_resample_init(&rs, ratio, param);		// design the filter before the timing
+		break;
+	case 5:		// the microphone samples are only filtered when the key is down
+		quisk_set_key_down(1);
+		break;
+	}
+	nblocks = 0;
+	count = 0;
+	total = 0;
+Py_BEGIN_ALLOW_THREADS
+	warmup = seconds > 0;
+	tstart = bench_time();
+	while (1) {
+		if (stage_id != 1 && stage_id != 4)
+			memcpy(samples, input, block * sizeof(complex));
+		n = block;
+		t0 = bench_time();
+		switch (stage_id) {
+		case 0:
+			quisk_process_samples(samples, block);
+			break;
+		case 1:
+			quisk_frontend(&dev, param, raw, block, samples);
+			break;
+		case 2:
+			quisk_decimate(&dec, samples, block, param);
+			break;
+		case 3:
+			quisk_resample_play(&rs, dSamples, block, samples);
+			break;
+		case 4:
+			n = (*pt_sample_read)(samples);
+			if (n > 0)
+				quisk_process_samples(samples, n);
+			break;
+		case 5:
+			quisk_process_microphone(samples, block);
+			break;
+		}
+		t1 = bench_time();
+		if (warmup) {		// plan the filters and fill the caches before the timing
+			if (t1 - tstart >= BENCH_WARMUP) {
+				warmup = 0;
+				tstart = t1;
+			}
+			continue;
+		}
+		if (nblocks < BENCH_MAX_BLOCKS)
+			times[nblocks++] = (float)((t1 - t0) * 1e6);
+		if (n > 0)
+			count += n;
+		total += t1 - t0;	// the time does not include the copy of the input
+		if (t1 - tstart >= seconds)
+			break;
+	}
+Py_END_ALLOW_THREADS
+	quisk_sound_state.dev_play_name[0] = play_name;
+	quisk_set_key_down(key_down);
+	list = PyList_New(nblocks);
+	for (i = 0; i < nblocks; i++)
+		PyList_SetItem(list, i, PyFloat_FromDouble(times[i]));
+	for (i = 0; i < dec.nstages; i++)
+		quisk_decim_fir_free(dec.stage + i);
+	quisk_resample_free(&rs);
+	free(samples);
+	free(input);
+	free(dSamples);
+	free(raw);
+	free(times);
+	return Py_BuildValue("dN", total > 0 ? count / total : 0.0, list);
+}
@@ -19,7 +19,7 @@ int quisk_extern_demod(complex * cSamples, int nSamples, double decim)
 // The return value is the number of output samples = nSamples / decim.
 // See quisk.h for useful data in quisk_sound_state.  For example, the
 // sample rate is quisk_sound_state.sample_rate.  If you need decimation,
-// look at iDecimate() and fDecimate() in quisk.c.
+// look at quisk_decimate() and quisk_resample_play() in filter.c.
 
 	int i;
 	double d, di;
@@ -0,0 +1,184 @@
+#include <Python.h>
+#include <stdlib.h>
+#include <math.h>
+#include <complex.h>	// Use native C99 complex type for fftw3
+#include <fftw3.h>
+#include "quisk.h"
+
+// Fast convolution for long receive filters.
+//
+// The direct form FIR filter in quisk_process_samples() costs sizeFilter
+// multiplies per sample for each of I and Q.  Sharp CW filters have a thousand
+// or more taps, and it is much cheaper to filter in the frequency domain using
+// overlap-save.  New samples are collected into blocks of "block" samples.  Each
+// block plus the prior (taps - 1) samples is transformed with an FFT of size
+// fft_size, multiplied by the transform of the filter, and transformed back.
+// The last "block" samples of the result are the filter output.
+//
+// For CW and SSB the I and Q filters are different.  Since the filters are real,
+// the transforms of the real and imaginary parts of the input can be separated
+// using X[k] and conj(X[N - k]), so one forward and one inverse FFT are enough:
+//		Y[k] = X[k] * (HI[k] + HQ[k]) / 2 + conj(X[N - k]) * (HI[k] - HQ[k]) / 2
+//
+// So that the number of output samples equals the number of input samples, the
+// output is delayed by exactly "block" samples.  Apart from this delay, the output
+// agrees with the direct FIR filter within rounding error; the difference is less
+// than 1e-12 of the maximum signal amplitude.
+
+#define FAST_CONV_MIN_SIZE	64		// smallest FFT size to use
+
+struct quisk_fast_conv {
+	int taps;				// number of filter coefficients
+	int fft_size;			// size of the FFT, a power of two
+	int block;				// number of new samples for each FFT: fft_size - taps + 1
+	int index;				// number of samples in the current block
+	fftw_complex * hSum;	// (HI + HQ) / 2 / fft_size
+	fftw_complex * hDiff;	// (HI - HQ) / 2 / fft_size
+	fftw_complex * hI;		// HI / fft_size; used for AM and FM
+	fftw_complex * time;	// the (taps - 1) prior samples followed by the block of new samples
+	fftw_complex * freq;	// FFT of time
+	fftw_complex * result;	// inverse FFT; the filter output is at the end
+	fftw_plan planF;		// time to freq
+	fftw_plan planB;		// freq to result
+} ;
+
+int quisk_fast_conv_size(int taps)
+{	// Return the FFT size to use for a filter with this many taps, or zero to
+	// use the direct FIR filter.  The config file item filter_fft_taps is zero for
+	// an automatic choice, -1 to never use the FFT, or else the minimum number
+	// of taps to filter with the FFT.
+	// Note: Call this from the GUI thread because it reads the config file.
+	int size;
+	long min_taps;
+	double direct, fast;
+
+	if (taps < 2)
+		return 0;
+	// The FFT size is the smallest power of two at least twice the filter size.
+	// A larger FFT is slightly faster, but the added delay is fft_size - taps + 1.
+	for (size = FAST_CONV_MIN_SIZE; size < 2 * taps; size *= 2)
+		;
+	min_taps = QuiskGetConfigLong("filter_fft_taps", 0);
+	if (min_taps < 0)
+		return 0;
+	if (min_taps > 0)
+		return taps >= min_taps ? size : 0;
+	// Estimate the floating point operations for each output sample
+	direct = 4.0 * taps;	// multiply and add for each of I and Q
+	fast = (10.0 * size * log(size) / log(2.0) + 8.0 * size) / (size - taps + 1);	// two FFT's plus the multiply
+	return fast < direct ? size : 0;
+}
+
+struct quisk_fast_conv * quisk_fast_conv_new(double * filterI, double * filterQ, int taps, int fft_size)
+{	// Create the fast convolution state for the I and Q filters.  The coefficients are
+	// in the order used by the direct FIR filter in quisk_process_samples(): filter[0]
+	// multiplies the newest sample, and filter[k] multiplies the sample delayed by taps - k.
+	// Note: Call this from the GUI thread because fftw planning is not thread safe.
+	struct quisk_fast_conv * fc;
+	fftw_plan plan;
+	fftw_complex * hQ;
+	int i, size;
+	double scale;
+
+	fc = (struct quisk_fast_conv *)malloc(sizeof(struct quisk_fast_conv));
+	fc->taps = taps;
+	fc->fft_size = fft_size;
+	fc->block = fft_size - taps + 1;
+	fc->index = 0;
+	size = sizeof(fftw_complex) * fft_size;
+	fc->hSum   = (fftw_complex *)fftw_malloc(size);
+	fc->hDiff  = (fftw_complex *)fftw_malloc(size);
+	fc->hI     = (fftw_complex *)fftw_malloc(size);
+	fc->time   = (fftw_complex *)fftw_malloc(size);
+	fc->freq   = (fftw_complex *)fftw_malloc(size);
+	fc->result = (fftw_complex *)fftw_malloc(size);
+	hQ = (fftw_complex *)fftw_malloc(size);
+	// The plans are shared, and they are used with these arrays by fftw_execute_dft().
+	fc->planF = quisk_fft_plan(fft_size, FFTW_FORWARD, 0);
+	fc->planB = quisk_fft_plan(fft_size, FFTW_BACKWARD, 0);
+	// Find the transform of the impulse response of each filter
+	memset(fc->hI, 0, size);
+	memset(hQ, 0, size);
+	fc->hI[0] = filterI[0];
+	hQ[0] = filterQ[0];
+	for (i = 1; i < taps; i++) {	// impulse response at delay i
+		fc->hI[i] = filterI[taps - i];
+		hQ[i] = filterQ[taps - i];
+	}
+	plan = quisk_fft_plan(fft_size, FFTW_FORWARD, 1);
+	fftw_execute_dft(plan, fc->hI, fc->hI);
+	fftw_execute_dft(plan, hQ, hQ);
+	scale = 1.0 / fft_size;		// normalize the inverse FFT
+	for (i = 0; i < fft_size; i++) {
+		fc->hI[i] *= scale;
+		hQ[i] *= scale;
+		fc->hSum[i] = (fc->hI[i] + hQ[i]) / 2.0;
+		fc->hDiff[i] = (fc->hI[i] - hQ[i]) / 2.0;
+	}
+	fftw_free(hQ);
+	memset(fc->time, 0, size);
+	memset(fc->result, 0, size);
+	return fc;
+}
+
+void quisk_fast_conv_delete(struct quisk_fast_conv * fc)
+{
+	if ( ! fc)
+		return;
+	fftw_free(fc->hSum);
+	fftw_free(fc->hDiff);
+	fftw_free(fc->hI);
+	fftw_free(fc->time);
+	fftw_free(fc->freq);
+	fftw_free(fc->result);
+	free(fc);
+}
+
+static void fast_conv_block(struct quisk_fast_conv * fc, int same_IQ)
+{	// Filter one block of samples
+	int k, N;
+	fftw_complex a, b;
+	fftw_complex * X;
+
+	N = fc->fft_size;
+	X = fc->freq;
+	fftw_execute_dft(fc->planF, fc->time, fc->freq);
+	if (same_IQ) {		// AM and FM: Use the same filter for I and Q
+		for (k = 0; k < N; k++)
+			X[k] *= fc->hI[k];
+	}
+	else {				// CW and SSB: Use filters for 90 degree phase shift
+		X[0] = X[0] * fc->hSum[0] + conj(X[0]) * fc->hDiff[0];
+		k = N / 2;
+		X[k] = X[k] * fc->hSum[k] + conj(X[k]) * fc->hDiff[k];
+		for (k = 1; k < N / 2; k++) {	// process the pairs k and N - k
+			a = X[k];
+			b = X[N - k];
+			X[k]     = a * fc->hSum[k]     + conj(b) * fc->hDiff[k];
+			X[N - k] = b * fc->hSum[N - k] + conj(a) * fc->hDiff[N - k];
+		}
+	}
+	fftw_execute_dft(fc->planB, fc->freq, fc->result);
+	// Save the last (taps - 1) samples for the next block
+	memmove(fc->time, fc->time + fc->block, (fc->taps - 1) * sizeof(fftw_complex));
+}
+
+void quisk_fast_conv_filter(struct quisk_fast_conv * fc, complex * cSamples, int nSamples, int same_IQ)
+{	// Filter the samples in place.  The output is delayed by fc->block samples.
+	// For AM and FM same_IQ is 1 and filterI is used for both I and Q.
+	int i, index;
+	fftw_complex * in, * out;
+
+	in = fc->time + fc->taps - 1;		// new samples go here
+	out = fc->result + fc->taps - 1;	// output of the previous block
+	index = fc->index;
+	for (i = 0; i < nSamples; i++) {
+		in[index] = cSamples[i];
+		cSamples[i] = out[index];
+		if (++index >= fc->block) {
+			fast_conv_block(fc, same_IQ);
+			index = 0;
+		}
+	}
+	fc->index = index;
+}
@@ -0,0 +1,127 @@
+#include <Python.h>
+#include <stdlib.h>
+#include <complex.h>	// Use native C99 complex type for fftw3
+#include <fftw3.h>
+#include "quisk.h"
+
+// A cache of fftw plans shared by all of _quisk, and the fftw wisdom file.
+//
+// Planning with FFTW_MEASURE runs and times many FFT's, and it is slow for large sizes.
+// Each plan is made once for its size, direction and placement, and is then used again
+// by every caller with fftw_execute_dft() on the caller's own arrays.  The arrays must be
+// allocated with fftw_malloc() so they have the same alignment as the planning arrays,
+// an in-place plan must be used in place, and an out-of-place plan must be used with
+// two different arrays.  The plans are never destroyed, so callers must not destroy them.
+//
+// The fftw wisdom remembers the best plan for each size, so importing the wisdom saved by
+// the last run of Quisk makes planning fast.  The statistics count the plans made from
+// wisdom, the plans that needed to be measured, and the plans used again from the cache.
+//
+// A plan for a large FFT can use several threads to calculate each FFT.  Such a plan
+// is kept separately from the single thread plan of the same size.
+//
+// Note: Call these from the GUI thread only, because fftw planning is not thread safe.
+// Executing a plan is thread safe.
+
+struct fft_plan {
+	int size;
+	int sign;				// FFTW_FORWARD or FFTW_BACKWARD
+	int in_place;
+	int nthreads;			// number of threads used for each FFT
+	fftw_plan plan;
+	double seconds;			// time used to make the plan
+	struct fft_plan * next;
+} ;
+
+static struct fft_plan * plan_list;
+static int plans_measured;			// plans made by measuring
+static int plans_wisdom;			// plans made from wisdom
+static int plans_reused;			// plans found in the cache
+static double plan_seconds;			// total time spent making plans
+static double saved_seconds;		// planning time not needed because of the cache
+static int wisdom_loaded;
+static int threads_ok;				// fftw threads are initialized
+
+fftw_plan quisk_fft_plan(int size, int sign, int in_place)
+{	// Return a plan for a complex FFT of this size, direction and placement
+	return quisk_fft_plan_threads(size, sign, in_place, 1);
+}
+
+fftw_plan quisk_fft_plan_threads(int size, int sign, int in_place, int nthreads)
+{	// Return a plan for a complex FFT that uses up to nthreads threads
+	struct fft_plan * pt;
+	fftw_complex * in, * out;
+	double t0;
+
+	if (nthreads > 1 && ! threads_ok)
+		threads_ok = fftw_init_threads() ? 1 : -1;
+	if (threads_ok != 1 || nthreads < 1)
+		nthreads = 1;
+	for (pt = plan_list; pt; pt = pt->next) {
+		if (pt->size == size && pt->sign == sign && pt->in_place == in_place &&
+				pt->nthreads == nthreads) {
+			plans_reused++;
+			saved_seconds += pt->seconds;
+			return pt->plan;
+		}
+	}
+	pt = (struct fft_plan *)malloc(sizeof(struct fft_plan));
+	pt->size = size;
+	pt->sign = sign;
+	pt->in_place = in_place;
+	pt->nthreads = nthreads;
+	if (threads_ok == 1)
+		fftw_plan_with_nthreads(nthreads);
+	in = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * size);
+	if (in_place)
+		out = in;
+	else
+		out = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * size);
+	t0 = QuiskTimeSec();
+	pt->plan = fftw_plan_dft_1d(size, in, out, sign, FFTW_MEASURE | FFTW_WISDOM_ONLY);
+	if (pt->plan) {
+		plans_wisdom++;
+	}
+	else {
+		pt->plan = fftw_plan_dft_1d(size, in, out, sign, FFTW_MEASURE);
+		plans_measured++;
+	}
+	pt->seconds = QuiskTimeSec() - t0;
+	if (threads_ok == 1)
+		fftw_plan_with_nthreads(1);
+	plan_seconds += pt->seconds;
+	if ( ! in_place)
+		fftw_free(out);
+	fftw_free(in);
+	pt->next = plan_list;
+	plan_list = pt;
+	return pt->plan;
+}
+
+PyObject * quisk_import_wisdom(PyObject * self, PyObject * args)
+{	// Read fftw wisdom from a file.  Return 1 for success or 0 if it could not be read.
+	char * path;
+
+	if (!PyArg_ParseTuple (args, "s", &path))
+		return NULL;
+	wisdom_loaded = fftw_import_wisdom_from_filename(path);
+	return PyInt_FromLong(wisdom_loaded);
+}
+
+PyObject * quisk_export_wisdom(PyObject * self, PyObject * args)
+{	// Write the fftw wisdom to a file.  Return 1 for success or 0 for an error.
+	char * path;
+
+	if (!PyArg_ParseTuple (args, "s", &path))
+		return NULL;
+	return PyInt_FromLong(fftw_export_wisdom_to_filename(path));
+}
+
+PyObject * quisk_get_plan_stats(PyObject * self, PyObject * args)
+{	// Return a tuple (wisdom loaded, plans from wisdom, plans measured, plans reused,
+	// milliseconds spent planning, milliseconds saved by the cache).
+	if (!PyArg_ParseTuple (args, ""))
+		return NULL;
+	return Py_BuildValue("iiiidd", wisdom_loaded, plans_wisdom, plans_measured, plans_reused,
+		plan_seconds * 1e3, saved_seconds * 1e3);
+}
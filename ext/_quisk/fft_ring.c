@@ -0,0 +1,176 @@
+#include <Python.h>
+#include <stdlib.h>
+#include <complex.h>	// Use native C99 complex type for fftw3
+#include <fftw3.h>
+#include "quisk.h"
+
+// A ring of sample history passed from the sound thread to the GUI thread for the FFT.
+//
+// The sound thread writes each sample once into the history, and the GUI thread reads
+// blocks of fft_size samples from it.  Each block starts hop samples after the previous
+// block, so with hop less than fft_size the blocks overlap, and the average of their
+// FFT's is a Welch spectrum.  With 50% or 75% overlap there are two or four times as
+// many FFT's to average for the same samples, so the graph is smoother at the same
+// refresh rate, and a large FFT does not need more capture time per graph.
+//
+// There is exactly one producer (the sound thread) and one consumer (the GUI thread), so
+// no lock is needed.  The producer owns write_count, the number of samples written, and
+// the consumer owns read_start, the sample number of the next block.  Both increase
+// without limit and wrap around as unsigned integers.  A memory barrier before
+// write_count is changed makes sure the samples are written before the consumer can see
+// the new count.
+//
+// The producer never waits.  If the GUI is too slow, the oldest samples are overwritten.
+// The consumer checks write_count before and after it copies a block; if the history
+// was overwritten, it skips ahead to the newest block.  The blocks_dropped statistic
+// counts each block that was skipped.  The producer may be writing up to
+// SAMP_BUFFER_SIZE samples that are not yet counted, so a block is only safe if it
+// is within limit = size - SAMP_BUFFER_SIZE samples of write_count.
+
+struct quisk_fft_ring * quisk_fft_ring_new(int fft_size, int nslots, int hop)
+{	// Create a ring with history for nslots blocks of fft_size samples
+	struct quisk_fft_ring * ring;
+
+	if (nslots < 2)
+		nslots = 2;
+	if (hop < 1 || hop > fft_size)
+		hop = fft_size;
+	ring = (struct quisk_fft_ring *)malloc(sizeof(struct quisk_fft_ring));
+	memset(ring, 0, sizeof(struct quisk_fft_ring));
+	ring->fft_size = fft_size;
+	ring->hop = hop;
+	ring->size = 1;		// the size is a power of two so the index is a mask
+	while (ring->size < nslots * fft_size + SAMP_BUFFER_SIZE)
+		ring->size *= 2;
+	ring->mask = ring->size - 1;
+	ring->limit = ring->size - SAMP_BUFFER_SIZE;
+	ring->nslots = (ring->limit - fft_size) / hop + 1;
+	ring->samples = (complex *)fftw_malloc(ring->size * sizeof(complex));
+	return ring;
+}
+
+void quisk_fft_ring_delete(struct quisk_fft_ring * ring)
+{	// Delete the ring.  Make sure neither thread is using it.
+	if ( ! ring)
+		return;
+	fftw_free(ring->samples);
+	free(ring);
+}
+
+void quisk_fft_ring_write(struct quisk_fft_ring * ring, complex * cSamples, int nSamples)
+{	// Write samples to the ring.  Call this from the producer (sound) thread only.
+	int index, n;
+	unsigned int write_count;
+
+	write_count = ring->write_count;
+	if (nSamples > ring->size) {	// keep only the newest samples
+		write_count += nSamples - ring->size;
+		cSamples += nSamples - ring->size;
+		nSamples = ring->size;
+	}
+	index = write_count & ring->mask;
+	n = ring->size - index;		// space before the end of the ring
+	if (n > nSamples)
+		n = nSamples;
+	memcpy(ring->samples + index, cSamples, n * sizeof(complex));
+	memcpy(ring->samples, cSamples + n, (nSamples - n) * sizeof(complex));
+	QUISK_MEMORY_BARRIER();			// write the samples before the count
+	ring->write_count = write_count + nSamples;
+}
+
+int quisk_fft_ring_read(struct quisk_fft_ring * ring, complex * block, double * window)
+{	// Copy the next block of samples into block, multiplied by the window if it is not
+	// NULL.  Return 1 for a block, or 0 if there is none.  Call this from the consumer
+	// (GUI) thread only.
+	int i, index, used;
+	unsigned int write_count, start, skip;
+	complex * samples;
+
+	start = ring->read_start;
+	while (1) {
+		write_count = ring->write_count;
+		if (write_count - start < (unsigned int)ring->fft_size)
+			return 0;
+		if (write_count - start > (unsigned int)ring->limit) {	// history was overwritten
+			skip = (write_count - start - ring->fft_size) / ring->hop;
+			start += skip * ring->hop;
+			ring->blocks_dropped += skip;
+			ring->overflows++;
+		}
+		used = (write_count - start - ring->fft_size) / ring->hop + 1;
+		if (used > ring->max_used)
+			ring->max_used = used;
+		QUISK_MEMORY_BARRIER();			// read the count before the samples
+		samples = ring->samples;
+		index = start & ring->mask;
+		if (window) {
+			for (i = 0; i < ring->fft_size; i++) {
+				block[i] = samples[index] * window[i];
+				index = (index + 1) & ring->mask;
+			}
+		}
+		else {
+			for (i = 0; i < ring->fft_size; i++) {
+				block[i] = samples[index];
+				index = (index + 1) & ring->mask;
+			}
+		}
+		QUISK_MEMORY_BARRIER();			// finish the copy before checking the count
+		if (ring->write_count - start <= (unsigned int)ring->limit)
+			break;
+		// The producer wrote over the block while we copied it; try the newest block
+		ring->blocks_dropped++;
+		ring->overflows++;
+		start += ring->hop;
+	}
+	ring->read_start = start + ring->hop;
+	ring->blocks_read++;
+	return 1;
+}
+
+int quisk_fft_ring_used(struct quisk_fft_ring * ring)
+{	// Return the number of full blocks waiting to be read
+	unsigned int count;
+
+	count = ring->write_count - ring->read_start;
+	if (count < (unsigned int)ring->fft_size)
+		return 0;
+	return (count - ring->fft_size) / ring->hop + 1;
+}
+
+int quisk_fft_ring_read_stream(struct quisk_fft_ring * ring, complex * cSamples, int nSamples)
+{	// Copy up to nSamples of the unread samples in order, for a consumer that needs a
+	// continuous stream instead of blocks.  Return the number of samples, or -1 if
+	// samples were lost and the stream starts again with the newest samples.  Call this
+	// from the consumer (GUI) thread only.
+	int index, n;
+	unsigned int write_count, start, count;
+
+	start = ring->read_start;
+	write_count = ring->write_count;
+	count = write_count - start;
+	if (count > (unsigned int)ring->limit) {	// history was overwritten
+		ring->blocks_dropped += count / ring->hop;
+		ring->overflows++;
+		ring->read_start = write_count;
+		return -1;
+	}
+	if (count > (unsigned int)nSamples)
+		count = nSamples;
+	QUISK_MEMORY_BARRIER();			// read the count before the samples
+	index = start & ring->mask;
+	n = ring->size - index;		// samples before the end of the ring
+	if (n > (int)count)
+		n = count;
+	memcpy(cSamples, ring->samples + index, n * sizeof(complex));
+	memcpy(cSamples + n, ring->samples, (count - n) * sizeof(complex));
+	QUISK_MEMORY_BARRIER();			// finish the copy before checking the count
+	write_count = ring->write_count;
+	if (write_count - start > (unsigned int)ring->limit) {	// overwritten while we copied
+		ring->overflows++;
+		ring->read_start = write_count;
+		return -1;
+	}
+	ring->read_start = start + count;
+	return count;
+}
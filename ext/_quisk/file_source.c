@@ -0,0 +1,355 @@
+#include <Python.h>
+#include <stdlib.h>
+#include <string.h>
+#include <math.h>
+#include <complex.h>	// Use native C99 complex type for fftw3
+#include <sys/types.h>
+#include <sys/stat.h>
+
+#ifdef MS_WINDOWS
+#include <windows.h>
+#else
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#endif
+
+#include "quisk.h"
+
+// Play I/Q samples from a file instead of a radio.  This uses the pt_sample_start/stop/read
+// interface in sound.c, the same as the SDR-IQ.  The file is a WAV file, or raw frames of
+// interleaved channels.  Channel 0 is I and channel 1 is Q, and there may be more channels.
+// The samples are 16, 24 or 32-bit little-endian integers or 32-bit floats.
+//
+// The file is mapped into memory, and quisk_frontend() converts the frames directly from
+// the mapped pages into the sample buffer, so there is no read() and no extra copy.  The
+// samples are sent at the sample rate of the file ("realtime"), or as fast as the
+// sound thread can take them.  At the end of the file, it starts again at the beginning
+// ("loop") or the samples stop.  The file is opened from the GUI thread by the hardware
+// file quisk_hardware_file.py before the sound starts.
+
+#define FILE_MAX_BEHIND		0.5		// seconds behind before the real time clock is reset
+#define FILE_MSG_SIZE		512		// size of the message for the config screen
+#define FILE_POLL_USEC		10000	// time between reads if data_poll_usec is not set
+
+static const unsigned char * file_map;		// the mapped file, or NULL
+static long long file_map_size;		// size of the mapping in bytes
+#ifdef MS_WINDOWS
+static HANDLE file_handle = INVALID_HANDLE_VALUE;
+static HANDLE file_mapping;
+#endif
+static const unsigned char * file_data;		// the first frame of samples
+static long long file_frames;		// number of frames
+static long long file_pos;			// the next frame to read
+static int file_format;				// QUISK_FMT_* sample format
+static int file_frame_bytes;		// bytes in each frame
+static int file_rate;				// sample rate in Hertz
+static int file_realtime;			// send samples at the sample rate, or else as fast as possible
+static int file_loop;				// start again at the end of the file
+static double file_time0;			// time when file_played was zero
+static long long file_played;		// number of frames sent since file_time0
+static struct sound_dev file_dev;	// channels and overrange count for quisk_frontend()
+
+static unsigned int get_le(const unsigned char * p, int bytes)
+{	// Return a little-endian unsigned integer
+	unsigned int u = 0;
+
+	while (bytes-- > 0)
+		u = u << 8 | p[bytes];
+	return u;
+}
+
+static int parse_wav(char * msg, int size)
+{	// Find the format and the samples in a WAV file.  Return zero for success, or
+	// write an error message.
+	const unsigned char * p, * end, * fmt;
+	unsigned int chunk, tag, bits, fmt_size = 0;
+	long long length = 0;
+
+	end = file_map + file_map_size;
+	if (file_map_size < 12 || memcmp(file_map, "RIFF", 4) || memcmp(file_map + 8, "WAVE", 4)) {
+		PyOS_snprintf(msg, size, "Not a WAV file");
+		return 1;
+	}
+	fmt = NULL;
+	for (p = file_map + 12; p + 8 <= end; p += 8 + chunk + (chunk & 1)) {
+		chunk = get_le(p + 4, 4);
+		if ( ! memcmp(p, "fmt ", 4) && chunk >= 16 && p + 8 + chunk <= end) {
+			fmt = p + 8;
+			fmt_size = chunk;
+		}
+		else if ( ! memcmp(p, "data", 4)) {
+			file_data = p + 8;
+			length = chunk;
+			if (length == 0 || file_data + length > end)	// a recording that was not finished
+				length = end - file_data;
+			break;
+		}
+	}
+	if ( ! fmt || ! file_data) {
+		PyOS_snprintf(msg, size, "The WAV file has no format or no data");
+		return 1;
+	}
+	tag = get_le(fmt, 2);
+	file_dev.num_channels = get_le(fmt + 2, 2);
+	file_rate = get_le(fmt + 4, 4);
+	file_frame_bytes = get_le(fmt + 12, 2);
+	bits = get_le(fmt + 14, 2);
+	if (tag == 0xFFFE) {		// WAVE_FORMAT_EXTENSIBLE
+		if (fmt_size < 40) {
+			PyOS_snprintf(msg, size, "The WAV extensible format is too short");
+			return 1;
+		}
+		tag = get_le(fmt + 24, 2);		// the first two bytes of the sub-format GUID
+	}
+	if (tag == 1 && bits == 16)
+		file_format = QUISK_FMT_S16;
+	else if (tag == 1 && bits == 24)
+		file_format = QUISK_FMT_S24;
+	else if (tag == 1 && bits == 32)
+		file_format = QUISK_FMT_S32;
+	else if (tag == 3 && bits == 32)
+		file_format = QUISK_FMT_FLOAT;
+	else {
+		PyOS_snprintf(msg, size, "The WAV format %u with %u bits is not supported", tag, bits);
+		return 1;
+	}
+	if (file_dev.num_channels < 2) {	// also prevents a zero block size
+		PyOS_snprintf(msg, size, "The number of channels %d is not supported", file_dev.num_channels);
+		return 1;
+	}
+	if (file_frame_bytes != file_dev.num_channels * (int)bits / 8) {
+		PyOS_snprintf(msg, size, "The WAV block size %d is not supported", file_frame_bytes);
+		return 1;
+	}
+	file_frames = length / file_frame_bytes;
+	return 0;
+}
+
+static void unmap_file(void)
+{
+	if (file_map) {
+#ifdef MS_WINDOWS
+		UnmapViewOfFile(file_map);
+#else
+		munmap((void *)file_map, file_map_size);
+#endif
+		file_map = NULL;
+	}
+#ifdef MS_WINDOWS
+	if (file_mapping) {
+		CloseHandle(file_mapping);
+		file_mapping = NULL;
+	}
+	if (file_handle != INVALID_HANDLE_VALUE) {
+		CloseHandle(file_handle);
+		file_handle = INVALID_HANDLE_VALUE;
+	}
+#endif
+	file_map_size = 0;
+}
+
+static int map_file(const char * name, char * msg, int size)
+{	// Map the file into memory.  Return zero for success, or write an error message.
+#ifdef MS_WINDOWS
+	LARGE_INTEGER length;
+
+	file_handle = CreateFileA(name, GENERIC_READ, FILE_SHARE_READ, NULL, OPEN_EXISTING,
+		FILE_FLAG_SEQUENTIAL_SCAN, NULL);
+	if (file_handle == INVALID_HANDLE_VALUE) {
+		PyOS_snprintf(msg, size, "Can not open %s", name);
+		return 1;
+	}
+	if ( ! GetFileSizeEx(file_handle, &length) || length.QuadPart == 0) {
+		PyOS_snprintf(msg, size, "The file %s is empty", name);
+		unmap_file();
+		return 1;
+	}
+	file_map_size = length.QuadPart;
+	file_mapping = CreateFileMapping(file_handle, NULL, PAGE_READONLY, 0, 0, NULL);
+	if (file_mapping)
+		file_map = (const unsigned char *)MapViewOfFile(file_mapping, FILE_MAP_READ, 0, 0, 0);
+	if ( ! file_map) {
+		PyOS_snprintf(msg, size, "Can not map %s into memory", name);
+		unmap_file();
+		return 1;
+	}
+#else
+	int fd;
+	struct stat st;
+	void * map;
+
+	fd = open(name, O_RDONLY);
+	if (fd < 0) {
+		PyOS_snprintf(msg, size, "Can not open %s", name);
+		return 1;
+	}
+	if (fstat(fd, &st) || st.st_size == 0) {
+		PyOS_snprintf(msg, size, "The file %s is empty", name);
+		close(fd);
+		return 1;
+	}
+	map = mmap(NULL, st.st_size, PROT_READ, MAP_SHARED, fd, 0);
+	close(fd);		// the mapping keeps the file open
+	if (map == MAP_FAILED) {
+		PyOS_snprintf(msg, size, "Can not map %s into memory", name);
+		return 1;
+	}
+#ifdef MADV_SEQUENTIAL
+	madvise(map, st.st_size, MADV_SEQUENTIAL);		// read ahead, and drop pages that were read
+#endif
+	file_map = (const unsigned char *)map;
+	file_map_size = st.st_size;
+#endif
+	return 0;
+}
+
+static void file_start(void)	// Called from the sound thread
+{
+	file_time0 = QuiskTimeSec();
+	file_played = 0;
+}
+
+static void file_stop(void)		// Called from the sound thread
+{	// The file stays mapped until quisk_close_file_source()
+}
+
+static int file_read(complex * cSamples)	// Called from the sound thread
+{	// Convert the next frames of the file into cSamples, and return the number of samples
+	int nSamples, n, frames, poll;
+	double behind, block;
+
+	if ( ! file_map)
+		return 0;
+	poll = quisk_sound_state.data_poll_usec;
+	if (poll <= 0)
+		poll = FILE_POLL_USEC;
+	block = poll * 1e-6 * file_rate;	// frames for each poll time
+	if (file_realtime) {	// wait until a block of samples is due
+		while (1) {
+			behind = (QuiskTimeSec() - file_time0) * file_rate - file_played;
+			if (behind >= block)
+				break;
+			QuiskSleepMicrosec((int)((block - behind) * 1e6 / file_rate) + 1);
+		}
+		if (behind > FILE_MAX_BEHIND * file_rate) {		// we were stopped; start the clock again
+			file_start();
+			behind = block;
+		}
+		frames = (int)behind;
+	}
+	else {
+		frames = (int)block;
+	}
+	if (frames < 1)
+		frames = 1;
+	else if (frames > SAMP_BUFFER_SIZE)
+		frames = SAMP_BUFFER_SIZE;
+	nSamples = 0;
+	while (nSamples < frames) {
+		if (file_pos >= file_frames) {	// end of file
+			if ( ! file_loop || file_frames == 0)
+				break;
+			file_pos = 0;
+		}
+		n = frames - nSamples;
+		if (n > file_frames - file_pos)
+			n = (int)(file_frames - file_pos);
+		quisk_frontend(&file_dev, file_format, file_data + file_pos * file_frame_bytes, n, cSamples + nSamples);
+		file_pos += n;
+		nSamples += n;
+	}
+	file_played += frames;
+	quisk_sound_state.overrange += file_dev.overrange;
+	file_dev.overrange = 0;
+	if (nSamples == 0 && ! file_realtime)		// the end of the file; do not use all the CPU
+		QuiskSleepMicrosec(poll);
+	return nSamples;
+}
+
+PyObject * quisk_open_file_source(PyObject * self, PyObject * args)	// Called from GUI thread
+{	// Open the file and use it as the sample source.  The format is "" for a WAV file,
+	// or "s16", "s24", "s32" or "float" for raw frames with this rate and number of
+	// channels.  Return a message and the sample rate, or a message and zero for an error.
+	const char * name, * format;
+	int rate, channels, realtime, loop;
+	char msg[FILE_MSG_SIZE];
+
+	if (!PyArg_ParseTuple (args, "ssiiii", &name, &format, &rate, &channels, &realtime, &loop))
+		return NULL;
+	pt_sample_start = NULL;
+	pt_sample_stop = NULL;
+	pt_sample_read = NULL;
+	unmap_file();
+	memset(&file_dev, 0, sizeof(file_dev));
+	file_data = NULL;
+	file_frames = 0;
+	file_pos = 0;
+	if (map_file(name, msg, FILE_MSG_SIZE))
+		return Py_BuildValue("si", msg, 0);
+	if (format[0]) {	// raw samples
+		if ( ! strcmp(format, "s16"))
+			file_format = QUISK_FMT_S16;
+		else if ( ! strcmp(format, "s24"))
+			file_format = QUISK_FMT_S24;
+		else if ( ! strcmp(format, "s32"))
+			file_format = QUISK_FMT_S32;
+		else if ( ! strcmp(format, "float"))
+			file_format = QUISK_FMT_FLOAT;
+		else {
+			PyOS_snprintf(msg, FILE_MSG_SIZE, "Unknown sample format \"%s\"", format);
+			unmap_file();
+			return Py_BuildValue("si", msg, 0);
+		}
+		if (channels < 2 || channels > 0xFFFF) {	// the same limits as a WAV file
+			PyOS_snprintf(msg, FILE_MSG_SIZE, "The number of channels %d is not supported", channels);
+			unmap_file();
+			return Py_BuildValue("si", msg, 0);
+		}
+		file_dev.num_channels = channels;
+		file_frame_bytes = channels * (file_format == QUISK_FMT_S16 ? 2 : file_format == QUISK_FMT_S24 ? 3 : 4);
+		file_rate = rate;
+		file_data = file_map;
+		file_frames = file_map_size / file_frame_bytes;
+	}
+	else if (parse_wav(msg, FILE_MSG_SIZE)) {
+		unmap_file();
+		return Py_BuildValue("si", msg, 0);
+	}
+	if (file_dev.num_channels < 2 || file_rate <= 0) {
+		PyOS_snprintf(msg, FILE_MSG_SIZE, "The file needs two channels and a sample rate");
+		unmap_file();
+		return Py_BuildValue("si", msg, 0);
+	}
+	file_dev.channel_I = 0;
+	file_dev.channel_Q = 1;
+	file_dev.channel_Delay = -1;
+	file_dev.frontend = 0;		// convert the samples with no changes
+	file_realtime = realtime;
+	file_loop = loop;
+	// Record our C-language Start/Stop/Read functions for use by sound.c.
+	pt_sample_start = &file_start;
+	pt_sample_stop = &file_stop;
+	pt_sample_read = &file_read;
+	PyOS_snprintf(msg, FILE_MSG_SIZE, "Play %s: %d channels of %s at %d Hz, %.1f seconds%s%s",
+		name, file_dev.num_channels,
+		file_format == QUISK_FMT_S16 ? "16-bit" : file_format == QUISK_FMT_S24 ? "24-bit" :
+		file_format == QUISK_FMT_S32 ? "32-bit" : "float",
+		file_rate, (double)file_frames / file_rate,
+		realtime ? "" : ", fast", loop ? ", loop" : "");
+	return Py_BuildValue("si", msg, file_rate);
+}
+
+PyObject * quisk_close_file_source(PyObject * self, PyObject * args)	// Called from GUI thread
+{
+	if (!PyArg_ParseTuple (args, ""))
+		return NULL;
+	if (pt_sample_read == &file_read) {
+		pt_sample_start = NULL;
+		pt_sample_stop = NULL;
+		pt_sample_read = NULL;
+	}
+	unmap_file();
+	Py_INCREF (Py_None);
+	return Py_None;
+}
@@ -4,249 +4,662 @@
 #include <complex.h>	// Use native C99 complex type for fftw3
 #include "quisk.h"
 
-static enum {
-	Unknown,
-	None,
-	Four,
-	Five,
-	Eight,
-	FiveFour,
-	FiveEight,
-	FourEight,
-	ThreeEight,
-	TwoEight
-} idecim_scheme;
-
-// Decimation filters are Parks-McClellan FIR Filter Design:
-// Order: 81
-// Passband ripple: 0.1 dB
-// Transition band: 0.05
-// Stopband attenuation: 100.0 dB
-
-#define DEC_FILT_TAPS		82
-
-static double dec_filt_four[DEC_FILT_TAPS] = {	// 0.200 bandwidth for 1/4
-6.93262847909316E-5, 1.6197926963904747E-4, -2.978880216503281E-5, -7.607072256017523E-4,
--0.0015328465141652313, -0.0012468590175053562, 2.610559866853963E-4, 0.0012944734487453414,
-2.3302486450800912E-4, -0.0016407424838786528, -0.0012416553276332963, 0.0015073572516228356,
-0.00246088370832881, -7.03592657698059E-4, -0.003615088283354994, -9.287652193144898E-4,
-0.004243002194452015, 0.003314623044307713, -0.003839298846344248, -0.006115837049852382,
-0.0019601369874323576, 0.008710630191084028, 0.0016299333322581358, -0.010249913305703927,
--0.006832131686428464, 0.009766175058001373, 0.013128572492857463, -0.006308334625132938,
--0.019542504322817577, -9.249612897081307E-4, 0.024651789635613427, 0.012545482681757834,
--0.026576155055309945, -0.029184569947365617, 0.022677733544428112, 0.0524099453299258,
--0.007945906430265487, -0.08887991706016465, -0.03541624039036922, 0.18706014148382252,
-0.4027578624778919, 0.4027578624778919, 0.18706014148382252, -0.03541624039036922,
--0.08887991706016465, -0.007945906430265487, 0.0524099453299258, 0.022677733544428112,
--0.029184569947365617, -0.026576155055309945, 0.012545482681757834, 0.024651789635613427,
--9.249612897081307E-4, -0.019542504322817577, -0.006308334625132938, 0.013128572492857463,
-0.009766175058001373, -0.006832131686428464, -0.010249913305703927, 0.0016299333322581358,
-0.008710630191084028, 0.0019601369874323576, -0.006115837049852382, -0.003839298846344248,
-0.003314623044307713, 0.004243002194452015, -9.287652193144898E-4, -0.003615088283354994,
--7.03592657698059E-4, 0.00246088370832881, 0.0015073572516228356, -0.0012416553276332963,
--0.0016407424838786528, 2.3302486450800912E-4, 0.0012944734487453414, 2.610559866853963E-4,
--0.0012468590175053562, -0.0015328465141652313, -7.607072256017523E-4, -2.978880216503281E-5,
-1.6197926963904747E-4, 6.93262847909316E-5};
-
-static double dec_filt_five[DEC_FILT_TAPS] = {	// 0.150 bandwidth for 1/5
-4.802945694175824E-5, 1.3678129104226564E-4, 1.5780237068504314E-4, -9.447967308879232E-5,
--7.096795320832177E-4, -0.001401250667455834, -0.0015400533718900225, -6.747045776483936E-4,
-8.153280522959677E-4, 0.0016993691656680282, 8.936602390940594E-4, -0.0012352048814478292,
--0.002710208527872082, -0.001616712517641334, 0.0016582434482831638, 0.004079060014727778,
-0.0026053079020420494, -0.0022732852688599737, -0.0059919633490814915, -0.003956217667702122,
-0.003149204678409682, 0.008619113656227065, 0.00575247818483739, -0.004432293133200357,
--0.012256528072905008, -0.008148410734226686, 0.006362564035902175, 0.01743705847413967,
-0.011452631286430849, -0.00939474436497328, -0.025278755048946437, -0.016382944751566725,
-0.014588955459961006, 0.03869591981083795, 0.02505025857670139, -0.025262163858126217,
--0.0684261501517449, -0.04695060459326292, 0.060595955694417517, 0.21142646204362847,
-0.32063462646029334, 0.32063462646029334, 0.21142646204362847, 0.060595955694417517,
--0.04695060459326292, -0.0684261501517449, -0.025262163858126217, 0.02505025857670139,
-0.03869591981083795, 0.014588955459961006, -0.016382944751566725, -0.025278755048946437,
--0.00939474436497328, 0.011452631286430849, 0.01743705847413967, 0.006362564035902175,
--0.008148410734226686, -0.012256528072905008, -0.004432293133200357, 0.00575247818483739,
-0.008619113656227065, 0.003149204678409682, -0.003956217667702122, -0.0059919633490814915,
--0.0022732852688599737, 0.0026053079020420494, 0.004079060014727778, 0.0016582434482831638,
--0.001616712517641334, -0.002710208527872082, -0.0012352048814478292, 8.936602390940594E-4,
-0.0016993691656680282, 8.153280522959677E-4, -6.747045776483936E-4, -0.0015400533718900225,
--0.001401250667455834, -7.096795320832177E-4, -9.447967308879232E-5, 1.5780237068504314E-4,
-1.3678129104226564E-4, 4.802945694175824E-5};
-
-static double dec_filt_eight[DEC_FILT_TAPS] = {	// 0.075 bandwidth for 1/8
-3.189499939137948E-5, 9.658000074768447E-5, 2.066544953451926E-4, 3.44452671428755E-4,
-4.5985201258950855E-4, 4.7151300219738324E-4, 2.884095680130089E-4, -1.4972784756879228E-4,
--8.240738514407132E-4, -0.001601285443271075, -0.0022351411796416518, -0.0024218067343669786,
--0.0019063148533499982, -6.12297195964114E-4, 0.0012546716666281578, 0.0031864584051393505,
-0.004473200480571965, 0.004424166162645936, 0.0026536808739181, -6.675516541696363E-4,
--0.004711222046697417, -0.00812616121435781, -0.00942114518562818, -0.007510029585918773,
--0.0022454680141598088, 0.00527145304120975, 0.012781816045613894, 0.017422645491741433,
-0.016645094307362603, 0.009241600363100413, -0.0038641474640177136, -0.019390756369107805,
--0.032221251420502695, -0.036629981372148956, -0.02792435737553998, -0.004033420538463705,
-0.03346490593697525, 0.07926024983841577, 0.12528860198355965, 0.16256947281001224,
-0.18341920540549964, 0.18341920540549964, 0.16256947281001224, 0.12528860198355965,
-0.07926024983841577, 0.03346490593697525, -0.004033420538463705, -0.02792435737553998,
--0.036629981372148956, -0.032221251420502695, -0.019390756369107805, -0.0038641474640177136,
-0.009241600363100413, 0.016645094307362603, 0.017422645491741433, 0.012781816045613894,
-0.00527145304120975, -0.0022454680141598088, -0.007510029585918773, -0.00942114518562818,
--0.00812616121435781, -0.004711222046697417, -6.675516541696363E-4, 0.0026536808739181,
-0.004424166162645936, 0.004473200480571965, 0.0031864584051393505, 0.0012546716666281578,
--6.12297195964114E-4, -0.0019063148533499982, -0.0024218067343669786, -0.0022351411796416518,
--0.001601285443271075, -8.240738514407132E-4, -1.4972784756879228E-4, 2.884095680130089E-4,
-4.7151300219738324E-4, 4.5985201258950855E-4, 3.44452671428755E-4, 2.066544953451926E-4,
-9.658000074768447E-5, 3.189499939137948E-5};
-
-static int iDecimateFour(complex * cSamples, int nSamples, int idecim)
-{  // Decimate to a lower sample rate by an integer idecim 2 through 4
-	int i, j, k, n;
-	complex cx;
-	static int findex = 0;
-	static complex bufDecim[MAX_FILTER_SIZE];
-	static int counter = 0;
+#ifdef MS_WINDOWS
+#include <windows.h>
+#else
+#include <pthread.h>
+#endif
 
-	n = 0;
-	for (i = 0; i < nSamples; i++) {
-		bufDecim[findex] = cSamples[i];
-		if (++counter >= idecim) {
-			counter = 0;		// output a sample
-			cx = 0;
-			j = findex;
-			for (k = 0; k < DEC_FILT_TAPS; k++) {
-				cx += bufDecim[j] * dec_filt_four[k];
-				if (++j >= DEC_FILT_TAPS)
-					j = 0;
+#define DEBUG		0
+
+// A decimating FIR filter only needs to calculate the output samples, so each output
+// costs one multiply per tap; this is the polyphase form of the decimator.  The delay
+// line is linearized: each sample is stored twice, at index and at index + taps, so
+// the most recent "taps" samples are always contiguous starting at index.  The inner
+// loop then has no wrap-around test and can be vectorized.  All state is in the
+// struct, so any number of filters may be used at the same time.  Symmetric filters
+// add the two samples that share a coefficient, and half-band filters also skip the
+// coefficients that are zero.
+
+// High decimation rates use a cascade of stages planned by quisk_decimate():
+//	1. A CIC filter decimates by R at the input rate using only additions.
+//	2. A compensating FIR filter corrects the CIC droop in the passband.
+//	3. Half-band filters decimate by two.  Every other coefficient is zero.
+// If too little decimation follows the CIC filter to reject its aliases, a single
+// FIR filter replaces the CIC and compensating filters.
+// The passband is DECIM_PASSBAND times the final sample rate, and the filters are
+// designed at run time with a Kaiser window for DECIM_ATTEN dB of alias rejection.
+// The interpolation filters for int_filter_interp and mic_interp are designed the same
+// way with INTERP_ATTEN dB of image rejection.  Each design is the shortest Kaiser filter
+// for its specification, and the designs are kept in a cache so that a change of sample
+// rate, or a new receiver, uses the same coefficients again without a new design.
+
+#define DECIM_PASSBAND	0.30	// passband edge as a fraction of the output sample rate
+#define DECIM_ATTEN		100.0	// stopband attenuation in dB
+#define INTERP_ATTEN	80.0	// image rejection of the interpolation filters in dB
+#define CIC_BITS		30		// maximum CIC bit growth; samples are 32 bits and the CIC uses 64 bits
+
+struct designed_fir {		// a cached filter design
+	double passband, atten;
+	int decim, half_band, cic_decim, cic_order;
+	int taps;
+	double * coef;
+	struct designed_fir * next;
+} ;
+
+static struct designed_fir * design_cache;
+
+#ifdef MS_WINDOWS
+static CRITICAL_SECTION lock;
+#define LOCK()			EnterCriticalSection(&lock)
+#define UNLOCK()		LeaveCriticalSection(&lock)
+#else
+static pthread_mutex_t lock = PTHREAD_MUTEX_INITIALIZER;
+#define LOCK()			pthread_mutex_lock(&lock)
+#define UNLOCK()		pthread_mutex_unlock(&lock)
+#endif
+
+void quisk_filter_init(void)
+{	// Initialize the lock for the design cache.  This is called once when _quisk is imported,
+	// because the cache is used by the GUI, sound and spectrum threads.
+#ifdef MS_WINDOWS
+	InitializeCriticalSection(&lock);
+#endif
+}
+
+enum {		// the form of a decimating FIR filter
+	FIR_GENERAL,
+	FIR_SYMMETRIC,
+	FIR_HALF_BAND
+} ;
+
+void quisk_decim_fir_init(struct quisk_decim_fir * filter, double * coef, int taps, int decim)
+{	// Initialize a decimating FIR filter.  The coefficients are copied.
+	int i, k;
+
+	quisk_decim_fir_free(filter);
+	filter->cBuf = (complex *)malloc(2 * taps * sizeof(complex));
+	for (i = 0; i < 2 * taps; i++)
+		filter->cBuf[i] = 0;
+	filter->coef = (double *)malloc(taps * sizeof(double));
+	memcpy(filter->coef, coef, taps * sizeof(double));
+	filter->taps = taps;
+	filter->decim = decim;
+	filter->counter = 0;
+	filter->index = 0;
+	filter->form = FIR_SYMMETRIC;
+	for (k = 0; k < taps / 2; k++) {
+		if (coef[k] != coef[taps - 1 - k]) {
+			filter->form = FIR_GENERAL;
+			break;
+		}
+	}
+	if (filter->form == FIR_SYMMETRIC && taps % 4 == 3) {
+		filter->form = FIR_HALF_BAND;
+		for (k = 1; k < taps / 2; k += 2) {		// zero at even distance from the center
+			if (coef[k] != 0) {
+				filter->form = FIR_SYMMETRIC;
+				break;
 			}
-			cSamples[n++] = cx;
 		}
-		if (++findex >= DEC_FILT_TAPS)
-			findex = 0;
 	}
-	return n;
 }
 
-static int iDecimateFive(complex * cSamples, int nSamples, int idecim)
-{  // Decimate to a lower sample rate by an integer idecim 2 through 5
-	int i, j, k, n;
-	complex cx;
-	static int findex = 0;
-	static complex bufDecim[MAX_FILTER_SIZE];
-	static int counter = 0;
+void quisk_decim_fir_free(struct quisk_decim_fir * filter)
+{
+	if (filter->cBuf)
+		free(filter->cBuf);
+	if (filter->coef)
+		free(filter->coef);
+	filter->cBuf = NULL;
+	filter->coef = NULL;
+	filter->taps = 0;
+}
 
+int quisk_decim_fir(struct quisk_decim_fir * filter, complex * cSamples, int nSamples)
+{	// Filter and decimate the samples in place.  Return the new number of samples.
+	int i, k, n, taps, index, center;
+	double accI, accQ;
+	double * coef;
+	complex * pt;
+
+	taps = filter->taps;
+	coef = filter->coef;
+	index = filter->index;
+	center = taps / 2;
 	n = 0;
 	for (i = 0; i < nSamples; i++) {
-		bufDecim[findex] = cSamples[i];
-		if (++counter >= idecim) {
-			counter = 0;		// output a sample
-			cx = 0;
-			j = findex;
-			for (k = 0; k < DEC_FILT_TAPS; k++) {
-				cx += bufDecim[j] * dec_filt_five[k];
-				if (++j >= DEC_FILT_TAPS)
-					j = 0;
+		if (--index < 0)		// the newest sample is at index
+			index = taps - 1;
+		filter->cBuf[index] = filter->cBuf[index + taps] = cSamples[i];
+		if (++filter->counter >= filter->decim) {
+			filter->counter = 0;		// output a sample
+			pt = filter->cBuf + index;	// pt[k] is the sample delayed by k
+			accI = accQ = 0;
+			switch (filter->form) {
+			case FIR_GENERAL:
+				for (k = 0; k < taps; k++) {
+					accI += creal(pt[k]) * coef[k];
+					accQ += cimag(pt[k]) * coef[k];
+				}
+				break;
+			case FIR_SYMMETRIC:
+				for (k = 0; k < center; k++) {
+					accI += (creal(pt[k]) + creal(pt[taps - 1 - k])) * coef[k];
+					accQ += (cimag(pt[k]) + cimag(pt[taps - 1 - k])) * coef[k];
+				}
+				if (taps % 2) {
+					accI += creal(pt[center]) * coef[center];
+					accQ += cimag(pt[center]) * coef[center];
+				}
+				break;
+			case FIR_HALF_BAND:
+				for (k = 0; k < center; k += 2) {
+					accI += (creal(pt[k]) + creal(pt[taps - 1 - k])) * coef[k];
+					accQ += (cimag(pt[k]) + cimag(pt[taps - 1 - k])) * coef[k];
+				}
+				accI += creal(pt[center]) * coef[center];
+				accQ += cimag(pt[center]) * coef[center];
+				break;
 			}
-			cSamples[n++] = cx;
+			cSamples[n++] = accI + I * accQ;
 		}
-		if (++findex >= DEC_FILT_TAPS)
-			findex = 0;
 	}
+	filter->index = index;
 	return n;
 }
 
-static int iDecimateEight(complex * cSamples, int nSamples, int idecim)
-{  // Decimate to a lower sample rate by an integer idecim 2 through 8
-	int i, j, k, n;
-	complex cx;
-	static int findex = 0;
-	static complex bufDecim[MAX_FILTER_SIZE];
-	static int counter = 0;
+void quisk_decim_cic_init(struct quisk_decim_cic * cic, int decim, int order)
+{	// Initialize a CIC decimator.  The order is at most QUISK_MAX_CIC_ORDER, and
+	// order * log2(decim) must be at most CIC_BITS.
+	memset(cic, 0, sizeof(struct quisk_decim_cic));
+	cic->decim = decim;
+	cic->order = order;
+	cic->scale = 1.0 / pow(decim, order);
+}
+
+int quisk_decim_cic(struct quisk_decim_cic * cic, complex * cSamples, int nSamples)
+{	// Filter and decimate the samples in place with a CIC filter.  Return the new
+	// number of samples.  The arithmetic is integer modulo 2**64, so the integrators
+	// may overflow without error.  The input samples must be less than 2**32.
+	int i, j, n, order;
+	unsigned long long vI, vQ, tI, tQ;
 
+	order = cic->order;
 	n = 0;
 	for (i = 0; i < nSamples; i++) {
-		bufDecim[findex] = cSamples[i];
-		if (++counter >= idecim) {
-			counter = 0;		// output a sample
-			cx = 0;
-			j = findex;
-			for (k = 0; k < DEC_FILT_TAPS; k++) {
-				cx += bufDecim[j] * dec_filt_eight[k];
-				if (++j >= DEC_FILT_TAPS)
-					j = 0;
+		vI = (unsigned long long)(long long)creal(cSamples[i]);
+		vQ = (unsigned long long)(long long)cimag(cSamples[i]);
+		for (j = 0; j < order; j++) {		// integrators at the input rate
+			vI = cic->integI[j] += vI;
+			vQ = cic->integQ[j] += vQ;
+		}
+		if (++cic->counter >= cic->decim) {
+			cic->counter = 0;
+			for (j = 0; j < order; j++) {	// combs at the output rate
+				tI = vI;
+				tQ = vQ;
+				vI -= cic->combI[j];
+				vQ -= cic->combQ[j];
+				cic->combI[j] = tI;
+				cic->combQ[j] = tQ;
 			}
-			cSamples[n++] = cx;
+			cSamples[n++] = ((long long)vI + I * (long long)vQ) * cic->scale;
 		}
-		if (++findex >= DEC_FILT_TAPS)
-			findex = 0;
 	}
 	return n;
 }
 
-// Decimate: Lower the sample rate by idecim.  This function uses
-// static storage, and there must be only one call to it in the program.
-// Using two calls to decimate two sample streams will not work.
-// Check the resulting bandwidth for your decimation, as it will
-// generally be much less than the maximum.
-int quisk_iDecimate(complex * cSamples, int nSamples, int idecim)
+// An interpolating FIR filter raises the sample rate by "interp".  The zero-stuffed samples
+// are not stored.  Output sample p of each group of interp outputs uses only coefficients
+// p, p + interp, p + 2 * interp, ..., so each output costs taps / interp multiplies; this
+// is the polyphase form of the interpolator.  The coefficients are rearranged by phase and
+// multiplied by interp to restore the gain lost to the zeros.  The delay line is linearized
+// as for the decimator.
+
+void quisk_interp_fir_init(struct quisk_interp_fir * filter, double * coef, int taps, int interp)
+{	// Initialize an interpolating FIR filter.  The coefficients are copied, and the pointer
+	// coef is saved in filter->proto so the caller can tell when the filter changes.
+	int i, j, p, ptaps;
+
+	quisk_interp_fir_free(filter);
+	ptaps = (taps + interp - 1) / interp;
+	filter->coef = (double *)malloc(interp * ptaps * sizeof(double));
+	for (p = 0; p < interp; p++) {
+		for (j = 0; j < ptaps; j++) {
+			i = j * interp + p;
+			filter->coef[p * ptaps + j] = i < taps ? coef[i] * interp : 0;
+		}
+	}
+	filter->dBuf = (double *)malloc(2 * ptaps * sizeof(double));
+	filter->cBuf = (complex *)malloc(2 * ptaps * sizeof(complex));
+	for (i = 0; i < 2 * ptaps; i++) {
+		filter->dBuf[i] = 0;
+		filter->cBuf[i] = 0;
+	}
+	filter->proto = coef;
+	filter->taps = taps;
+	filter->interp = interp;
+	filter->ptaps = ptaps;
+	filter->index = 0;
+}
+
+void quisk_interp_fir_free(struct quisk_interp_fir * filter)
 {
-	static int old_idecim = 0;		// previous value of idecim
-
-	if (idecim != old_idecim) {		// Initialization
-		old_idecim = idecim;
-		if (idecim <= 1)	// Set the correct decimation filter based on rate reduction.
-			idecim_scheme = None;
-		else if (idecim <= 4)
-			idecim_scheme = Four;
-		else if (idecim == 5)
-			idecim_scheme = Five;
-		else if (idecim <= 8)
-			idecim_scheme = Eight;
-		else if (idecim % 5 == 0) {		// good for 10, 15, ..., 40
-			if (idecim / 5 <= 4)
-				idecim_scheme = FiveFour;
-			else
-				idecim_scheme = FiveEight;
+	if (filter->coef)
+		free(filter->coef);
+	if (filter->dBuf)
+		free(filter->dBuf);
+	if (filter->cBuf)
+		free(filter->cBuf);
+	filter->coef = NULL;
+	filter->dBuf = NULL;
+	filter->cBuf = NULL;
+	filter->proto = NULL;
+	filter->taps = 0;
+}
+
+int quisk_interp_fir(struct quisk_interp_fir * filter, complex * cSamples, int nSamples)
+{	// Interpolate the samples in place.  The array must have room for nSamples * interp
+	// samples.  Return the new number of samples.
+	int i, j, p, ptaps, interp, index, nout;
+	double accI, accQ;
+	double * coef;
+	complex * pt, * in;
+
+	interp = filter->interp;
+	ptaps = filter->ptaps;
+	index = filter->index;
+	nout = nSamples * interp;
+	// Move the input to the end of the array.  Output group i is written before input i + 1
+	// is read, and it ends before that input starts.
+	in = cSamples + nout - nSamples;
+	memmove(in, cSamples, nSamples * sizeof(complex));
+	for (i = 0; i < nSamples; i++) {
+		if (--index < 0)		// the newest sample is at index
+			index = ptaps - 1;
+		filter->cBuf[index] = filter->cBuf[index + ptaps] = in[i];
+		pt = filter->cBuf + index;	// pt[j] is the input sample delayed by j
+		for (p = 0; p < interp; p++) {
+			coef = filter->coef + p * ptaps;
+			accI = accQ = 0;
+			for (j = 0; j < ptaps; j++) {
+				accI += creal(pt[j]) * coef[j];
+				accQ += cimag(pt[j]) * coef[j];
+			}
+			cSamples[i * interp + p] = accI + I * accQ;
 		}
-		else if (idecim % 4 == 0)
-			idecim_scheme = FourEight;
-		else if (idecim % 3 == 0)
-			idecim_scheme = ThreeEight;
-		else if (idecim % 2 == 0)
-			idecim_scheme = TwoEight;
-		else		// There is no good scheme, and this filter is inadequate
-			idecim_scheme = Eight;
-	}
-	switch (idecim_scheme) {
-		case None:
-			break;
-		case Four:
-			nSamples = iDecimateFour(cSamples, nSamples, idecim);
-			break;
-		case Five:
-			nSamples = iDecimateFive(cSamples, nSamples, idecim);
-			break;
-		case Eight:
-			nSamples = iDecimateEight(cSamples, nSamples, idecim);
-			break;
-		case FiveFour:
-			nSamples = iDecimateFive(cSamples, nSamples, 5);
-			nSamples = iDecimateFour(cSamples, nSamples, idecim / 5);
-			break;
-		case FiveEight:
-			nSamples = iDecimateFive(cSamples, nSamples, 5);
-			nSamples = iDecimateEight(cSamples, nSamples, idecim / 5);
-			break;
-		case FourEight:
-			nSamples = iDecimateFour(cSamples, nSamples, 4);
-			nSamples = iDecimateEight(cSamples, nSamples, idecim / 4);
-			break;
-		case ThreeEight:
-			nSamples = iDecimateFour(cSamples, nSamples, 3);
-			nSamples = iDecimateEight(cSamples, nSamples, idecim / 3);
-			break;
-		case TwoEight:
-			nSamples = iDecimateFour(cSamples, nSamples, 2);
-			nSamples = iDecimateEight(cSamples, nSamples, idecim / 2);
+	}
+	filter->index = index;
+	return nout;
+}
+
+int quisk_interp_fir_play(struct quisk_interp_fir * filter, double * dSamples, int nSamples, complex * cSamples)
+{	// Interpolate the real samples in dSamples, and write them to both channels of the
+	// play samples cSamples.  Return the new number of samples.
+	int i, j, p, ptaps, interp, index;
+	double acc;
+	double * coef, * pt;
+
+	interp = filter->interp;
+	ptaps = filter->ptaps;
+	index = filter->index;
+	for (i = 0; i < nSamples; i++) {
+		if (--index < 0)		// the newest sample is at index
+			index = ptaps - 1;
+		filter->dBuf[index] = filter->dBuf[index + ptaps] = dSamples[i];
+		pt = filter->dBuf + index;	// pt[j] is the input sample delayed by j
+		for (p = 0; p < interp; p++) {
+			coef = filter->coef + p * ptaps;
+			acc = 0;
+			for (j = 0; j < ptaps; j++)
+				acc += pt[j] * coef[j];
+			cSamples[i * interp + p] = acc + I * acc;	// monophonic sound, two channels
+		}
+	}
+	filter->index = index;
+	return nSamples * interp;
+}
+
+double quisk_bessel_i0(double x)
+{	// Modified Bessel function of the first kind, order zero
+	int k;
+	double sum, term;
+
+	sum = term = 1.0;
+	for (k = 1; k < 100; k++) {
+		term *= (x / 2.0 / k) * (x / 2.0 / k);
+		sum += term;
+		if (term < sum * 1e-17)
 			break;
-		default:		// should not happen
-			nSamples = iDecimateEight(cSamples, nSamples, idecim);
+	}
+	return sum;
+}
+
+static double cic_response(double freq, int decim, int order)
+{	// Return the magnitude response of a CIC filter; freq is a fraction of its output rate
+	if (freq == 0)
+		return 1.0;
+	return pow(sin(M_PI * freq) / (decim * sin(M_PI * freq / decim)), order);
+}
+
+static double * design_decim(int * ptaps, double passband, double atten, int decim, int half_band, int cic_decim, int cic_order)
+{	// Design a lowpass filter to decimate by "decim" using a Kaiser window.  The passband
+	// edge is a fraction of the input sample rate, and atten is the stopband attenuation in dB.  If cic_decim is not zero, the filter
+	// follows a CIC filter, and it is convolved with [-a, 1 + 2a, -a] to correct the CIC
+	// droop at the passband edge.  For a half-band filter decim must be 2.  Return a
+	// malloc'd array of coefficients, and the number of taps in *ptaps.
+	int i, taps;
+	double * coef, * lowpass;
+	double stop, cutoff, beta, d, m, sum, a;
+
+	stop = 1.0 / decim - passband;		// start of the frequencies that alias into the passband
+	cutoff = 0.5 / decim;
+	if (cic_decim)		// the compensation adds gain to the stopband
+		atten += 6.0;
+	taps = (int)ceil((atten - 7.95) / (14.36 * (stop - passband))) + 1;
+	if (half_band)		// half-band filters have 4 * n + 3 taps
+		taps = taps / 4 * 4 + 3;
+	else if (taps % 2 == 0)		// use an odd number of taps
+		taps++;
+	beta = 0.1102 * (atten - 8.7);
+	lowpass = (double *)malloc(taps * sizeof(double));
+	m = (taps - 1) / 2;
+	sum = 0;
+	for (i = 0; i < taps; i++) {
+		d = i - m;
+		if (d == 0)
+			lowpass[i] = 2.0 * cutoff;
+		else if (half_band && i % 2 == (int)m % 2)	// zero at even distance from the center
+			lowpass[i] = 0;
+		else
+			lowpass[i] = sin(2.0 * M_PI * cutoff * d) / (M_PI * d);
+		lowpass[i] *= quisk_bessel_i0(beta * sqrt(1.0 - (d / m) * (d / m))) / quisk_bessel_i0(beta);
+		sum += lowpass[i];
+	}
+	for (i = 0; i < taps; i++)		// unity gain at DC
+		lowpass[i] /= sum;
+	if ( ! cic_decim) {
+		*ptaps = taps;
+		return lowpass;
+	}
+	a = (1.0 / cic_response(passband, cic_decim, cic_order) - 1.0) / (2.0 * (1.0 - cos(2.0 * M_PI * passband)));
+	coef = (double *)malloc((taps + 2) * sizeof(double));
+	for (i = 0; i < taps + 2; i++) {
+		coef[i] = 0;
+		if (i < taps)
+			coef[i] -= a * lowpass[i];
+		if (i >= 1 && i <= taps)
+			coef[i] += (1.0 + 2.0 * a) * lowpass[i - 1];
+		if (i >= 2)
+			coef[i] -= a * lowpass[i - 2];
+	}
+	free(lowpass);
+	*ptaps = taps + 2;
+	return coef;
+}
+
+static double * cached_design(int * ptaps, double passband, double atten, int decim, int half_band, int cic_decim, int cic_order)
+{	// Return the design from the cache, or design the filter and add it to the cache.
+	// The coefficients belong to the cache and must not be freed.  This is called from the
+	// sound thread, the worker threads and the GUI thread.
+	struct designed_fir * pt;
+
+	LOCK();
+	for (pt = design_cache; pt; pt = pt->next) {
+		if (pt->passband == passband && pt->atten == atten && pt->decim == decim &&
+				pt->half_band == half_band && pt->cic_decim == cic_decim && pt->cic_order == cic_order)
 			break;
 	}
+	if ( ! pt) {
+		pt = (struct designed_fir *)malloc(sizeof(struct designed_fir));
+		pt->passband = passband;
+		pt->atten = atten;
+		pt->decim = decim;
+		pt->half_band = half_band;
+		pt->cic_decim = cic_decim;
+		pt->cic_order = cic_order;
+		pt->coef = design_decim(&pt->taps, passband, atten, decim, half_band, cic_decim, cic_order);
+		pt->next = design_cache;
+		design_cache = pt;
+	}
+	UNLOCK();
+	*ptaps = pt->taps;
+	return pt->coef;
+}
+
+double * quisk_interp_coef(int interp, int * ptaps)
+{	// Return the lowpass filter to interpolate by "interp" after the samples are zero-stuffed.
+	// The passband is DECIM_PASSBAND times the sample rate before interpolation.  The filter
+	// has unity gain at DC, so the caller multiplies the samples by interp.  The coefficients
+	// are from the cache and must not be freed.
+	if (interp < 2) {
+		*ptaps = 0;
+		return NULL;
+	}
+	return cached_design(ptaps, DECIM_PASSBAND / interp, INTERP_ATTEN, interp, interp == 2, 0, 0);
+}
+
+static void add_designed_stage(struct quisk_decimator * dec, double passband, int decim, int half_band, int cic_decim, int cic_order)
+{
+	int taps;
+	double * coef;
+
+	coef = cached_design(&taps, passband, DECIM_ATTEN, decim, half_band, cic_decim, cic_order);
+	quisk_decim_fir_init(dec->stage + dec->nstages++, coef, taps, decim);
+}
+
+static void plan_decimation(struct quisk_decimator * dec, int idecim)
+{	// Plan the cascade of stages to decimate by idecim
+	int halves, odd, nhalf, post, fact, cic, order, rate, i;
+
+	for (i = 0; i < dec->nstages; i++)
+		quisk_decim_fir_free(dec->stage + i);
+	dec->nstages = 0;
+	dec->cic.decim = 0;
+	if (idecim <= 1)
+		return;
+	halves = 0;		// the number of factors of two
+	for (odd = idecim; odd % 2 == 0; odd /= 2)
+		halves++;
+	nhalf = halves < 3 ? halves : 3;		// the number of stages that decimate by two
+	while (idecim >> nhalf > (1 << (CIC_BITS / QUISK_MAX_CIC_ORDER)) && nhalf < halves && nhalf < QUISK_MAX_DECIM_STAGES - 1)
+		nhalf++;		// limit the CIC bit growth
+	// The CIC aliases are rejected if the decimation after the CIC is at least four.
+	// With fewer halves, the compensating filter decimates by an odd factor "fact".
+	post = 1 << nhalf;
+	fact = 1;
+	if (post < 4) {
+		for (i = 3; i < odd; i += 2) {
+			if (odd % i == 0 && post * i >= 4) {
+				fact = i;
+				break;
+			}
+		}
+	}
+	cic = idecim / post / fact;
+	// Rates are in units of the final sample rate
+	rate = idecim;
+	if (cic > 1 && post * fact >= 4) {	// Use a CIC filter and a compensating filter
+		order = QUISK_MAX_CIC_ORDER;
+		while (order > 1 && order * log((double)cic) / log(2.0) > CIC_BITS)
+			order--;
+		quisk_decim_cic_init(&dec->cic, cic, order);
+		rate /= cic;
+		if (fact == 1) {
+			fact = 2;
+			nhalf--;
+		}
+		add_designed_stage(dec, DECIM_PASSBAND / rate, fact, 0, cic, order);
+		rate /= fact;
+	}
+	else if (rate > post) {		// Use one FIR filter for the odd factor
+		add_designed_stage(dec, DECIM_PASSBAND / rate, rate / post, 0, 0, 0);
+		rate = post;
+	}
+	for (i = 0; i < nhalf; i++) {
+		add_designed_stage(dec, DECIM_PASSBAND / rate, 2, 1, 0, 0);
+		rate /= 2;
+	}
+#if DEBUG
+	printf("Decimation %d: CIC %d order %d", idecim, dec->cic.decim, dec->cic.order);
+	for (i = 0; i < dec->nstages; i++)
+		printf(", %d taps by %d", dec->stage[i].taps, dec->stage[i].decim);
+	printf("\n");
+#endif
+}
+
+// Decimate: Lower the sample rate by idecim.  Any integer is allowed.  The decimator
+// is planned on the first call and whenever idecim changes.
+int quisk_decimate(struct quisk_decimator * dec, complex * cSamples, int nSamples, int idecim)
+{
+	int i;
+
+	if (idecim != dec->idecim) {		// Initialization
+		dec->idecim = idecim;
+		plan_decimation(dec, idecim);
+	}
+	if (dec->cic.decim > 1)
+		nSamples = quisk_decim_cic(&dec->cic, cSamples, nSamples);
+	for (i = 0; i < dec->nstages; i++)
+		nSamples = quisk_decim_fir(dec->stage + i, cSamples, nSamples);
 	return nSamples;	// return the new number of samples
 }
+
+// Decimate the main receive samples.  This uses one static decimator, so use
+// quisk_decimate() with your own struct quisk_decimator for other sample streams.
+int quisk_iDecimate(complex * cSamples, int nSamples, int idecim)
+{
+	static struct quisk_decimator decimator;
+
+	return quisk_decimate(&decimator, cSamples, nSamples, idecim);
+}
+
+// Resample by an arbitrary ratio, for example from the 49019.5 Hz audio of an SDR-IQ at
+// 196078 Hz to the play rate of 48000 Hz.  The resampler is a bank of RESAMPLE_PHASES
+// polyphase filters made from one lowpass prototype, and each output sample interpolates
+// linearly between the two phases nearest to its position between the input samples.
+// The passband is DECIM_PASSBAND of the lower sample rate.  The quality sets the stopband
+// attenuation, and so the number of taps used for each output sample:
+//	0: linear interpolation between two input samples (2 taps)
+//	1: 50 dB (8 taps)
+//	2: 80 dB (13 taps)
+//	3: 100 dB (17 taps)
+// All state is in the struct, so any number of resamplers may be used at the same time.
+
+#define RESAMPLE_PHASES		128
+
+int quisk_resample_quality = 2;		// the quality from the config file
+
+static const double resample_atten[QUISK_RESAMPLE_QUALITIES] = {0.0, 50.0, 80.0, 100.0};
+
+void quisk_resample_init(struct quisk_resampler * rs, double ratio, int quality)
+{	// Initialize a resampler to make one output sample for each "ratio" input samples
+	int i, k, p, ptaps, nproto;
+	double r, pass, stop, cutoff, atten, beta, s, m, sum;
+	double * proto;
+
+	quisk_resample_free(rs);
+	rs->ratio = ratio;
+	rs->quality = quality;		// save the quality before it is limited
+	if (quality < 0)
+		quality = 0;
+	else if (quality >= QUISK_RESAMPLE_QUALITIES)
+		quality = QUISK_RESAMPLE_QUALITIES - 1;
+	r = ratio > 1.0 ? ratio : 1.0;
+	pass = DECIM_PASSBAND / r;		// frequencies as a fraction of the input rate
+	stop = (1.0 - DECIM_PASSBAND) / r;
+	cutoff = 0.5 / r;
+	atten = resample_atten[quality];
+	beta = 0.1102 * (atten - 8.7);
+	if (quality == 0)
+		ptaps = 2;
+	else
+		ptaps = (int)ceil((atten - 7.95) / (14.36 * (stop - pass))) + 1;
+	// The prototype h(s) is sampled at s = i / RESAMPLE_PHASES for s from zero to ptaps
+	nproto = ptaps * RESAMPLE_PHASES + 1;
+	proto = (double *)malloc(nproto * sizeof(double));
+	m = ptaps / 2.0;
+	sum = 0;
+	for (i = 0; i < nproto; i++) {
+		s = (double)i / RESAMPLE_PHASES - m;
+		if (quality == 0)		// a triangle
+			proto[i] = 1.0 - fabs(s);
+		else if (s == 0)
+			proto[i] = 2.0 * cutoff;
+		else
+			proto[i] = sin(2.0 * M_PI * cutoff * s) / (M_PI * s);
+		if (quality > 0 && fabs(s) < m)
+			proto[i] *= quisk_bessel_i0(beta * sqrt(1.0 - (s / m) * (s / m))) / quisk_bessel_i0(beta);
+		else if (quality > 0)
+			proto[i] = 0;
+		sum += proto[i];
+	}
+	// Phase p has coefficients h(k + p / RESAMPLE_PHASES) with unity gain at DC.  There
+	// is one extra phase to interpolate between the last phase and the next tap.
+	rs->coef = (double *)malloc((RESAMPLE_PHASES + 1) * ptaps * sizeof(double));
+	for (p = 0; p <= RESAMPLE_PHASES; p++) {
+		for (k = 0; k < ptaps; k++) {
+			i = k * RESAMPLE_PHASES + p;
+			rs->coef[p * ptaps + k] = i < nproto ? proto[i] * RESAMPLE_PHASES / sum : 0;
+		}
+	}
+	free(proto);
+	rs->dBuf = (double *)malloc(2 * ptaps * sizeof(double));
+	for (i = 0; i < 2 * ptaps; i++)
+		rs->dBuf[i] = 0;
+	rs->ptaps = ptaps;
+	rs->index = 0;
+	rs->time = 1.0;
+}
+
+void quisk_resample_free(struct quisk_resampler * rs)
+{
+	if (rs->coef)
+		free(rs->coef);
+	if (rs->dBuf)
+		free(rs->dBuf);
+	rs->coef = NULL;
+	rs->dBuf = NULL;
+	rs->ratio = 0;
+	rs->ptaps = 0;
+}
+
+int quisk_resample_play(struct quisk_resampler * rs, double * dSamples, int nSamples, complex * cSamples)
+{	// Resample the real samples in dSamples, and write them to both channels of the play
+	// samples cSamples.  There are at most nSamples / ratio + 1 output samples.  Return
+	// the number of output samples.
+	int i, k, p, ptaps, index, nout;
+	double d, frac, acc0, acc1;
+	double * pt, * coef0, * coef1;
+
+	ptaps = rs->ptaps;
+	index = rs->index;
+	nout = 0;
+	for (i = 0; i < nSamples; i++) {
+		if (--index < 0)		// the newest sample is at index
+			index = ptaps - 1;
+		rs->dBuf[index] = rs->dBuf[index + ptaps] = dSamples[i];
+		pt = rs->dBuf + index;	// pt[k] is the input sample delayed by k
+		rs->time -= 1.0;		// the time of the next output after the newest input
+		while (rs->time <= 0) {	// the output is between the newest two inputs
+			d = (1.0 + rs->time) * RESAMPLE_PHASES;
+			p = (int)d;
+			if (p >= RESAMPLE_PHASES)
+				p = RESAMPLE_PHASES - 1;
+			frac = d - p;
+			coef0 = rs->coef + p * ptaps;
+			coef1 = coef0 + ptaps;
+			acc0 = acc1 = 0;
+			for (k = 0; k < ptaps; k++) {
+				acc0 += pt[k] * coef0[k];
+				acc1 += pt[k] * coef1[k];
+			}
+			d = acc0 + frac * (acc1 - acc0);
+			cSamples[nout++] = d + I * d;	// monophonic sound, two channels
+			rs->time += rs->ratio;
+		}
+	}
+	rs->index = index;
+	return nout;
+}
@@ -0,0 +1,609 @@
+#include <Python.h>
+#include <stdlib.h>
+#include <math.h>
+#include <complex.h>	// Use native C99 complex type for fftw3
+#include "quisk.h"
+
+#ifdef MS_WINDOWS
+#include <windows.h>
+#else
+#include <pthread.h>
+#endif
+
+// Design the I and Q audio filters, and keep each design in a cache.
+//
+// Each filter is a lowpass prototype of bandwidth bw that is tuned to center to make a
+// pair of quadrature filters.  The prototype is one of:
+//	sinc	A periodic sinc with a Blackman window and taps + 1 coefficients.  This is the
+//			original Quisk filter.
+//	kaiser	A sinc with a Kaiser window that has the same transition width and stopband as
+//			the sinc filter, and uses fewer taps.
+//	remez	A Parks-McClellan equiripple filter with the same transition width and
+//			stopband, and a passband ripple of DESIGN_RIPPLE dB.  It uses the fewest taps.
+//	fm		The FM audio filter with de-emphasis from the inverse DFT of its response.
+// The transition width of the Blackman window is about DESIGN_TRANSITION * rate / taps,
+// and its stopband is about DESIGN_ATTEN dB.
+//
+// Designs are found in the cache by (rate, taps, bw, center, kind), so a filter
+// button only designs a filter the first time it is used.  The GUI can also start a
+// native thread to design all the filters it will need before they are used.  The
+// cache is protected by a lock because both threads use it.
+
+#define DESIGN_TRANSITION	5.5		// transition width of the sinc filter in units of rate / taps
+#define DESIGN_ATTEN		74.0	// stopband attenuation in dB
+#define DESIGN_RIPPLE		0.1		// passband ripple of the remez filter in dB
+#define DESIGN_MAX			256		// maximum number of designs in the cache
+#define REMEZ_GRID			16		// grid points for each coefficient
+#define REMEZ_ITERATIONS	60
+
+enum {
+	DESIGN_SINC,
+	DESIGN_KAISER,
+	DESIGN_REMEZ,
+	DESIGN_FM,
+	DESIGN_KINDS
+} ;
+
+static const char * design_names[DESIGN_KINDS] = {"sinc", "kaiser", "remez", "fm"} ;
+
+struct filter_design {
+	double rate, bw, center;
+	int taps;			// taps requested
+	int kind;
+	int size;			// number of coefficients
+	double * filtI;
+	double * filtQ;
+	struct filter_design * next;
+} ;
+
+struct design_key {
+	double rate, taps, bw, center;
+	int kind;
+} ;
+
+static struct filter_design * design_list;		// most recent first
+static int design_count;
+static void * prewarm_thread;
+static struct design_key * prewarm_keys;
+static int prewarm_count;
+static volatile int prewarm_quit;
+
+#ifdef MS_WINDOWS
+static CRITICAL_SECTION lock;
+static int lock_init;
+#define LOCK()			EnterCriticalSection(&lock)
+#define UNLOCK()		LeaveCriticalSection(&lock)
+#else
+static pthread_mutex_t lock = PTHREAD_MUTEX_INITIALIZER;
+#define LOCK()			pthread_mutex_lock(&lock)
+#define UNLOCK()		pthread_mutex_unlock(&lock)
+#endif
+
+static double blackman(double k, double N)
+{
+	return 0.42 + 0.5 * cos(2. * M_PI * k / N) + 0.08 * cos(4. * M_PI * k / N);
+}
+
+static complex * design_sinc(int * psize, double rate, int N, double bw)
+{	// The original Quisk filter with N + 1 taps
+	int i, k;
+	double K;
+	complex * proto;
+
+	N = N / 2 * 2;
+	K = floor(bw * N / rate);	// integer division as in the original Python
+	proto = (complex *)malloc((N + 1) * sizeof(complex));
+	for (i = 0, k = -N / 2; k <= N / 2; i++, k++) {
+		if (k == 0)
+			proto[i] = K / N;
+		else
+			proto[i] = 1.0 / N * sin(M_PI * k * K / N) / sin(M_PI * k / N);
+		proto[i] *= blackman(k, N);
+	}
+	*psize = N + 1;
+	return proto;
+}
+
+static complex * design_kaiser(int * psize, double rate, int N)
+{	// A Kaiser window filter with the same transition width as the sinc filter.  The
+	// cutoff at bw / 2 is added by the caller.
+	int i, taps;
+	double trans, beta, d, m;
+	complex * proto;
+
+	trans = DESIGN_TRANSITION / N;		// transition width as a fraction of the rate
+	taps = (int)ceil((DESIGN_ATTEN - 7.95) / (14.36 * trans)) + 1;
+	if (taps % 2 == 0)		// use an odd number of taps
+		taps++;
+	beta = 0.1102 * (DESIGN_ATTEN - 8.7);
+	proto = (complex *)malloc((taps + 1) * sizeof(complex));
+	m = (taps - 1) / 2;
+	for (i = 0; i < taps; i++) {
+		d = i - m;
+		proto[i] = quisk_bessel_i0(beta * sqrt(1.0 - (d / m) * (d / m))) / quisk_bessel_i0(beta);
+	}
+	*psize = taps;
+	return proto;
+}
+
+static double remez_response(double x, int n, double * xk, double * ad, double * yk)
+{	// Evaluate the Chebyshev sum at x = cos(w) by barycentric interpolation through the
+	// n points xk with values yk
+	int i;
+	double d, num, den;
+
+	num = den = 0;
+	for (i = 0; i < n; i++) {
+		d = x - xk[i];
+		if (fabs(d) < 1e-14)
+			return yk[i];
+		d = ad[i] / d;
+		num += d * yk[i];
+		den += d;
+	}
+	return num / den;
+}
+
+static void remez_weights(int n, double * xk, double * ad)
+{	// Calculate the barycentric weights of the n points xk.  The factor of two keeps the
+	// products near one.
+	int i, j;
+	double prod;
+
+	for (i = 0; i < n; i++) {
+		prod = 1.0;
+		for (j = 0; j < n; j++)
+			if (j != i)
+				prod *= 2.0 * (xk[i] - xk[j]);
+		ad[i] = 1.0 / prod;
+	}
+}
+
+static double * design_remez(int taps, double fpass, double fstop, double weight, double * pdelta)
+{	// Design a symmetric lowpass filter with an odd number of taps by the Parks-McClellan
+	// (Remez exchange) algorithm.  The passband edge fpass and stopband edge fstop are
+	// fractions of the sample rate.  The stopband error is weighted by weight.  Return a
+	// malloc'd array of coefficients, and the passband deviation in *pdelta.
+	int i, j, k, g, r, ngrid, npass, next, sign, iter;
+	int * ext, * cand;
+	double * grid, * des, * wt, * err, * xk, * ad, * yk, * coef, * resp, * costab;
+	double delta, num, den, emax, df;
+
+	r = (taps + 1) / 2;		// number of cosine terms
+	df = 0.5 / (REMEZ_GRID * r);
+	npass = (int)(fpass / df) + 1;
+	ngrid = npass + (int)((0.5 - fstop) / df) + 1;
+	grid = (double *)malloc(ngrid * sizeof(double));
+	des = (double *)malloc(ngrid * sizeof(double));
+	wt = (double *)malloc(ngrid * sizeof(double));
+	err = (double *)malloc(ngrid * sizeof(double));
+	for (g = 0; g < ngrid; g++) {
+		if (g < npass) {
+			grid[g] = g == npass - 1 ? fpass : g * df;
+			des[g] = 1.0;
+			wt[g] = 1.0;
+		}
+		else {
+			grid[g] = g == npass ? fstop : fstop + (g - npass) * df;
+			if (grid[g] > 0.5)
+				grid[g] = 0.5;
+			des[g] = 0.0;
+			wt[g] = weight;
+		}
+		grid[g] = cos(2.0 * M_PI * grid[g]);	// use x = cos(w)
+	}
+	ext = (int *)malloc((r + 1) * sizeof(int));
+	cand = (int *)malloc(ngrid * sizeof(int));
+	xk = (double *)malloc((r + 1) * sizeof(double));
+	ad = (double *)malloc((r + 1) * sizeof(double));
+	yk = (double *)malloc((r + 1) * sizeof(double));
+	for (i = 0; i <= r; i++)		// start with equally spaced extremal frequencies
+		ext[i] = (int)((double)i * (ngrid - 1) / r);
+	delta = 0;
+	for (iter = 0; iter < REMEZ_ITERATIONS; iter++) {
+		for (i = 0; i <= r; i++)
+			xk[i] = grid[ext[i]];
+		remez_weights(r + 1, xk, ad);
+		num = den = 0;
+		sign = 1;
+		for (i = 0; i <= r; i++) {
+			num += ad[i] * des[ext[i]];
+			den += sign * ad[i] / wt[ext[i]];
+			sign = -sign;
+		}
+		delta = num / den;
+		sign = 1;
+		for (i = 0; i <= r; i++) {
+			yk[i] = des[ext[i]] - sign * delta / wt[ext[i]];
+			sign = -sign;
+		}
+		emax = 0;
+		for (g = 0; g < ngrid; g++) {
+			err[g] = wt[g] * (des[g] - remez_response(grid[g], r + 1, xk, ad, yk));
+			if (emax < fabs(err[g]))
+				emax = fabs(err[g]);
+		}
+		if (emax - fabs(delta) <= fabs(delta) * 1e-6)
+			break;
+		// Find the local extrema of the error in each band.  Keep the larger of neighboring
+		// extrema with the same sign, so the signs alternate.
+		next = 0;
+		for (g = 0; g < ngrid; g++) {
+			if (g > 0 && g != npass && fabs(err[g - 1]) > fabs(err[g]) && err[g - 1] * err[g] > 0)
+				continue;
+			if (g < ngrid - 1 && g != npass - 1 && fabs(err[g + 1]) >= fabs(err[g]) && err[g + 1] * err[g] > 0)
+				continue;
+			if (next > 0 && err[cand[next - 1]] * err[g] >= 0) {
+				if (fabs(err[g]) > fabs(err[cand[next - 1]]))
+					cand[next - 1] = g;
+				continue;
+			}
+			cand[next++] = g;
+		}
+		if (next < r + 1)		// should not happen; keep the last solution
+			break;
+		// Remove the smallest extrema until r + 1 are left.  An extremum inside the list
+		// is removed with its smaller neighbor so the signs still alternate.
+		while (next > r + 1) {
+			j = 0;
+			for (k = 1; k < next; k++)
+				if (fabs(err[cand[k]]) < fabs(err[cand[j]]))
+					j = k;
+			if (j > 0 && j < next - 1 && next == r + 2)		// remove the smaller end instead
+				j = fabs(err[cand[0]]) < fabs(err[cand[next - 1]]) ? 0 : next - 1;
+			if (j == 0 || j == next - 1) {
+				memmove(cand + j, cand + j + 1, (next - j - 1) * sizeof(int));
+				next--;
+			}
+			else {
+				if (fabs(err[cand[j - 1]]) < fabs(err[cand[j + 1]]))
+					j--;
+				memmove(cand + j, cand + j + 2, (next - j - 2) * sizeof(int));	// remove j and j + 1
+				next -= 2;
+			}
+		}
+		i = 0;
+		for (k = 0; k <= r; k++)
+			ext[k] = cand[i + k];
+	}
+	// Sample the response at taps frequencies and find the coefficients
+	resp = (double *)malloc(r * sizeof(double));
+	for (k = 0; k < r; k++)
+		resp[k] = remez_response(cos(2.0 * M_PI * k / taps), r + 1, xk, ad, yk);
+	costab = (double *)malloc(taps * sizeof(double));
+	for (k = 0; k < taps; k++)
+		costab[k] = cos(2.0 * M_PI * k / taps);
+	coef = (double *)malloc(taps * sizeof(double));
+	for (j = 0; j < taps; j++) {
+		num = resp[0];
+		g = j - (r - 1);		// distance from the center
+		if (g < 0)
+			g += taps;
+		for (k = 1, i = g; k < r; k++) {
+			num += 2.0 * resp[k] * costab[i];
+			i += g;
+			if (i >= taps)
+				i -= taps;
+		}
+		coef[j] = num / taps;
+	}
+	*pdelta = fabs(delta);
+	free(costab);
+	free(resp);
+	free(yk);
+	free(ad);
+	free(xk);
+	free(cand);
+	free(ext);
+	free(err);
+	free(wt);
+	free(des);
+	free(grid);
+	return coef;
+}
+
+static complex * design_minimum(int * psize, double rate, int N, double bw)
+{	// A Parks-McClellan filter with the transition width and stopband of the sinc filter.
+	// Start with the estimated number of taps, and add taps until the ripple is met.
+	int i, taps;
+	double trans, fpass, fstop, dpass, dstop, delta;
+	double * coef;
+	complex * proto;
+
+	trans = DESIGN_TRANSITION / N;
+	fpass = (bw / rate - trans) / 2.0;
+	fstop = (bw / rate + trans) / 2.0;
+	if (fpass < trans / 4.0 || fstop > 0.49)	// Not a useful lowpass filter
+		return NULL;
+	dpass = (pow(10.0, DESIGN_RIPPLE / 20.0) - 1.0) / (pow(10.0, DESIGN_RIPPLE / 20.0) + 1.0);
+	dstop = pow(10.0, -DESIGN_ATTEN / 20.0);
+	taps = (int)ceil((-20.0 * log10(sqrt(dpass * dstop)) - 13.0) / (14.6 * trans)) + 1;
+	coef = NULL;
+	for (i = 0; i < 10; i++) {
+		taps |= 1;		// use an odd number of taps
+		if (coef)
+			free(coef);
+		coef = design_remez(taps, fpass, fstop, dpass / dstop, &delta);
+		if (delta <= dpass)
+			break;
+		taps += taps / 20 + 2;
+	}
+	proto = (complex *)malloc((taps + 1) * sizeof(complex));
+	for (i = 0; i < taps; i++)
+		proto[i] = coef[i];
+	free(coef);
+	*psize = taps;
+	return proto;
+}
+
+static complex * design_fm(int * psize, double rate, int N, double bw, double center)
+{	// The FM audio filter has a passband with de-emphasis of -6 dB per octave
+	int j, k, m, N2, K2;
+	double freq;
+	double * passb;
+	complex x;
+	complex * proto;
+
+	N = N / 2 * 2;
+	N2 = N / 2;				// Half the number of points
+	K2 = (int)(bw * N / rate / 2);	// Half the bandwidth in points
+	if (K2 < 1)
+		K2 = 1;
+	passb = (double *)malloc((N + 1) * sizeof(double));	// desired passband response
+	proto = (complex *)malloc((N + 1) * sizeof(complex));	// inverse DFT of the passband
+	for (j = 0; j <= N; j++)
+		passb[j] = 0;
+	for (j = -K2; j <= K2; j++) {
+		freq = center - bw / 2.0 * j / K2;
+		passb[j + N2] = center / freq * 0.3;
+	}
+	for (k = -N2 + 1; k <= N2; k++) {		// Take inverse DFT of passband response
+		x = 0;
+		for (m = -K2; m <= K2; m++)
+			x += passb[m + N2] * cexp(I * 2.0 * M_PI * m * k / N);
+		proto[k + N2] = x / N;
+	}
+	proto[0] = proto[N];		// this value is missing
+	for (k = -N2; k <= N2; k++)
+		proto[k + N2] *= blackman(k, N);
+	free(passb);
+	*psize = N + 1;
+	return proto;
+}
+
+static struct filter_design * design_filter(double rate, int taps, double bw, double center, int kind)
+{	// Design a filter and return it, or return NULL for an invalid request
+	int i, k, size;
+	double tune, d;
+	complex z;
+	complex * proto;
+	struct filter_design * fd;
+
+	if (rate <= 0 || taps < 2 || bw <= 0)
+		return NULL;
+	proto = NULL;
+	if (kind == DESIGN_REMEZ)
+		proto = design_minimum(&size, rate, taps, bw);
+	if (kind == DESIGN_KAISER || (kind == DESIGN_REMEZ && ! proto)) {
+		proto = design_kaiser(&size, rate, taps);
+		for (i = 0, k = -size / 2; i < size; i++, k++) {	// multiply the window by the sinc
+			d = bw / rate;
+			if (k)
+				proto[i] *= sin(M_PI * d * k) / (M_PI * k);
+			else
+				proto[i] *= d;
+		}
+	}
+	else if (kind == DESIGN_FM) {
+		proto = design_fm(&size, rate, taps, bw, center);
+	}
+	else if ( ! proto) {
+		proto = design_sinc(&size, rate, taps, bw);
+	}
+	if (kind == DESIGN_KAISER || kind == DESIGN_REMEZ) {
+		// The receive filter multiplies the newest sample by filter[0], and the sample
+		// delayed by k by filter[size - k], so filter[0] must be zero for a symmetric
+		// response.  The Blackman window is zero there.  Add a zero to the other designs.
+		memmove(proto + 1, proto, size * sizeof(complex));
+		proto[0] = 0;
+		size++;
+	}
+	fd = (struct filter_design *)malloc(sizeof(struct filter_design));
+	fd->rate = rate;
+	fd->taps = taps;
+	fd->bw = bw;
+	fd->center = center;
+	fd->kind = kind;
+	fd->size = size;
+	fd->filtI = (double *)malloc(size * sizeof(double));
+	fd->filtQ = (double *)malloc(size * sizeof(double));
+	// Make a bandpass filter by tuning the low pass filter to the center frequency.
+	// Make two quadrature filters.
+	tune = 2. * M_PI * center / rate;
+	for (i = 0, k = -size / 2; i < size; i++, k++) {
+		z = proto[i];
+		if (tune) {
+			z *= 2.0 * cexp(-I * tune * k);
+			fd->filtI[i] = creal(z);
+			fd->filtQ[i] = cimag(z);
+		}
+		else {
+			fd->filtI[i] = fd->filtQ[i] = creal(z);
+		}
+	}
+	free(proto);
+	return fd;
+}
+
+static struct filter_design * find_design(double rate, int taps, double bw, double center, int kind)
+{	// Find a design in the cache.  Call with the lock held.
+	struct filter_design * fd;
+
+	for (fd = design_list; fd; fd = fd->next)
+		if (fd->rate == rate && fd->taps == taps && fd->bw == bw && fd->center == center && fd->kind == kind)
+			return fd;
+	return NULL;
+}
+
+static void add_design(struct filter_design * fd)
+{	// Add a design to the cache, and remove the oldest design if the cache is full.  Call
+	// with the lock held.
+	struct filter_design * pt;
+
+	fd->next = design_list;
+	design_list = fd;
+	if (++design_count <= DESIGN_MAX)
+		return;
+	for (pt = design_list; pt->next->next; pt = pt->next)
+		;
+	free(pt->next->filtI);
+	free(pt->next->filtQ);
+	free(pt->next);
+	pt->next = NULL;
+	design_count--;
+}
+
+static void get_design(double rate, int taps, double bw, double center, int kind)
+{	// Make sure the design is in the cache
+	struct filter_design * fd;
+
+	LOCK();
+	fd = find_design(rate, taps, bw, center, kind);
+	UNLOCK();
+	if (fd)
+		return;
+	fd = design_filter(rate, taps, bw, center, kind);
+	if ( ! fd)
+		return;
+	LOCK();
+	if (find_design(rate, taps, bw, center, kind)) {	// another thread made the same design
+		free(fd->filtI);
+		free(fd->filtQ);
+		free(fd);
+	}
+	else {
+		add_design(fd);
+	}
+	UNLOCK();
+}
+
+static int design_kind(const char * name)
+{	// Return the design kind for a name, or -1 with a Python exception
+	int i;
+
+	for (i = 0; i < DESIGN_KINDS; i++)
+		if ( ! strcmp(name, design_names[i]))
+			return i;
+	PyErr_Format(QuiskError, "Unknown filter design \"%s\"", name);
+	return -1;
+}
+
+static void prewarm_main(void * unused)
+{	// Design each filter in prewarm_keys
+	int i;
+	struct design_key * key;
+
+	for (i = 0; i < prewarm_count && ! prewarm_quit; i++) {
+		key = prewarm_keys + i;
+		get_design(key->rate, (int)key->taps, key->bw, key->center, key->kind);
+	}
+}
+
+void quisk_filter_prewarm_stop(void)
+{	// Stop the thread that designs filters ahead of time
+	if ( ! prewarm_thread)
+		return;
+	prewarm_quit = 1;
+	quisk_thread_join(prewarm_thread);
+	prewarm_thread = NULL;
+	free(prewarm_keys);
+	prewarm_keys = NULL;
+}
+
+PyObject * quisk_design_filter(PyObject * self, PyObject * args)
+{	// Return a tuple of lists (filterI, filterQ) of the filter coefficients for a filter of
+	// bandwidth bw tuned to center.  The kind is "sinc", "kaiser", "remez" or "fm".
+	int i, taps, kind;
+	double rate, bw, center;
+	char * name = "sinc";
+	PyObject * filtI, * filtQ;
+	struct filter_design * fd;
+
+	if (!PyArg_ParseTuple (args, "didd|s", &rate, &taps, &bw, &center, &name))
+		return NULL;
+	kind = design_kind(name);
+	if (kind < 0)
+		return NULL;
+#ifdef MS_WINDOWS
+	if ( ! lock_init) {
+		lock_init = 1;
+		InitializeCriticalSection(&lock);
+	}
+#endif
+Py_BEGIN_ALLOW_THREADS
+	get_design(rate, taps, bw, center, kind);
+Py_END_ALLOW_THREADS
+	LOCK();
+	fd = find_design(rate, taps, bw, center, kind);
+	if ( ! fd) {
+		UNLOCK();
+		PyErr_SetString(QuiskError, "Invalid filter design");
+		return NULL;
+	}
+	filtI = PyList_New(fd->size);
+	filtQ = PyList_New(fd->size);
+	for (i = 0; i < fd->size; i++) {
+		PyList_SET_ITEM(filtI, i, PyFloat_FromDouble(fd->filtI[i]));
+		PyList_SET_ITEM(filtQ, i, PyFloat_FromDouble(fd->filtQ[i]));
+	}
+	UNLOCK();
+	return Py_BuildValue("NN", filtI, filtQ);
+}
+
+PyObject * quisk_prewarm_filters(PyObject * self, PyObject * args)
+{	// Start a native thread to design filters before they are needed.  The argument is a
+	// sequence of (rate, taps, bw, center, kind) as for design_filter().
+	int i, n;
+	char * name;
+	PyObject * seq, * item;
+	struct design_key * keys;
+
+	if (!PyArg_ParseTuple (args, "O", &seq))
+		return NULL;
+	if (PySequence_Check(seq) != 1) {
+		PyErr_SetString (QuiskError, "Filter list is not a sequence");
+		return NULL;
+	}
+	n = PySequence_Size(seq);
+	keys = (struct design_key *)malloc((n + 1) * sizeof(struct design_key));
+	for (i = 0; i < n; i++) {
+		item = PySequence_GetItem(seq, i);
+		name = "sinc";
+		if ( ! item || ! PyArg_ParseTuple(item, "dddd|s", &keys[i].rate, &keys[i].taps,
+				&keys[i].bw, &keys[i].center, &name) || (keys[i].kind = design_kind(name)) < 0) {
+			Py_XDECREF(item);
+			free(keys);
+			return NULL;
+		}
+		Py_DECREF(item);
+	}
+#ifdef MS_WINDOWS
+	if ( ! lock_init) {
+		lock_init = 1;
+		InitializeCriticalSection(&lock);
+	}
+#endif
+Py_BEGIN_ALLOW_THREADS
+	quisk_filter_prewarm_stop();
+Py_END_ALLOW_THREADS
+	prewarm_keys = keys;
+	prewarm_count = n;
+	prewarm_quit = 0;
+	prewarm_thread = quisk_thread_start(prewarm_main, NULL);
+	if ( ! prewarm_thread) {		// no thread; the filters are designed when needed
+		free(keys);
+		prewarm_keys = NULL;
+	}
+	Py_INCREF (Py_None);
+	return Py_None;
+}
@@ -0,0 +1,192 @@
+#include <Python.h>
+#include <stdlib.h>
+#include <math.h>
+#include <complex.h>	// Use native C99 complex type for fftw3
+#include "quisk.h"
+
+// The capture front end converts the raw frames from a sound card or the UDP receiver
+// to complex samples with a range of +/- CLIP32.  It is shared by ALSA, PortAudio,
+// DirectX and UDP capture, and it does all the work on each sample in one pass:
+//	1. Convert the I and Q channels to 32-bit range, and count the overrange samples.
+//	2. Multiply by frontend_gain and add frontend_offset (option QUISK_FE_GAIN).
+//	3. Remove DC with a high pass filter; R.G. Lyons page 553 (option QUISK_FE_DC_REMOVE).
+//	4. Delay the channel_Delay channel by one sample (option QUISK_FE_CORRECT).
+//	5. Correct the amplitude and phase if doAmplPhase (option QUISK_FE_CORRECT).
+//	6. Invert the spectrum (option QUISK_FE_INVERT).
+// The frames are done in blocks of FE_BLOCK.  The conversion for each format is a simple
+// loop into a small array that stays in the cache, and it can be vectorized.  The DC
+// filter is recursive, so steps 2 to 6 are a second loop over the small array.  Steps that
+// are not used have parameters that make no change, so that loop has no tests.  The filter
+// and delay state is kept in the sound_dev.
+
+#define FE_BLOCK	256
+
+static int convert(struct sound_dev * dev, int format, const void * buf, int frames, double * dI, double * dQ)
+{	// Convert frames to doubles in dI and dQ.  Return the number of overrange samples.
+	int i, over, nch, chI, chQ;
+	const short * s16;
+	const unsigned char * s24, * p;
+	const int * s32;
+	const float * f32;
+
+	nch = dev->num_channels;
+	chI = dev->channel_I;
+	chQ = dev->channel_Q;
+	over = 0;
+	switch (format) {
+	case QUISK_FMT_S16:
+		s16 = (const short *)buf;
+		for (i = 0; i < frames; i++) {
+			dI[i] = s16[i * nch + chI];
+			dQ[i] = s16[i * nch + chQ];
+		}
+		for (i = 0; i < frames; i++) {
+			over += fabs(dI[i]) >= CLIP16;	// assume overrange returns max int
+			over += fabs(dQ[i]) >= CLIP16;
+			dI[i] *= 65536.0;
+			dQ[i] *= 65536.0;
+		}
+		break;
+	case QUISK_FMT_S24:		// little-endian; the same as a 32-bit int with a zero low byte
+		s24 = (const unsigned char *)buf;
+		for (i = 0; i < frames; i++) {
+			p = s24 + (i * nch + chI) * 3;
+			dI[i] = (int)((unsigned int)p[0] << 8 | (unsigned int)p[1] << 16 | (unsigned int)p[2] << 24);
+			p = s24 + (i * nch + chQ) * 3;
+			dQ[i] = (int)((unsigned int)p[0] << 8 | (unsigned int)p[1] << 16 | (unsigned int)p[2] << 24);
+		}
+		for (i = 0; i < frames; i++) {
+			over += fabs(dI[i]) >= CLIP32;
+			over += fabs(dQ[i]) >= CLIP32;
+		}
+		break;
+	case QUISK_FMT_S32:
+		s32 = (const int *)buf;
+		for (i = 0; i < frames; i++) {
+			dI[i] = s32[i * nch + chI];
+			dQ[i] = s32[i * nch + chQ];
+		}
+		for (i = 0; i < frames; i++) {
+			over += fabs(dI[i]) >= CLIP32;
+			over += fabs(dQ[i]) >= CLIP32;
+		}
+		break;
+	case QUISK_FMT_FLOAT:
+		f32 = (const float *)buf;
+		for (i = 0; i < frames; i++) {
+			dI[i] = f32[i * nch + chI];
+			dQ[i] = f32[i * nch + chQ];
+		}
+		for (i = 0; i < frames; i++) {
+			over += fabs(dI[i]) >= 1.0;
+			over += fabs(dQ[i]) >= 1.0;
+			dI[i] *= CLIP32;
+			dQ[i] *= CLIP32;
+		}
+		break;
+	}
+	return over;
+}
+
+int quisk_frontend(struct sound_dev * dev, int format, const void * buf, int frames, complex * cSamples)
+{	// Convert and correct the frames in buf, and write them to cSamples.  The options are
+	// in dev->frontend.  Return the number of samples.
+	int i, n, done, options, bytes;
+	double gain, offset, dc_pole, dc_zero, delayI, delayQ, ampA, ampC, ampD;
+	double re, im, cI, cQ, dcI, dcQ, save;
+	double * pt;
+	double dI[FE_BLOCK], dQ[FE_BLOCK];
+
+	options = dev->frontend;
+	switch (format) {
+	case QUISK_FMT_S16:
+		bytes = 2;
+		break;
+	case QUISK_FMT_S24:
+		bytes = 3;
+		break;
+	default:
+		bytes = 4;
+		break;
+	}
+	// Parameters that make no change when an option is not used
+	if (options & QUISK_FE_GAIN) {
+		gain = dev->frontend_gain;
+		offset = dev->frontend_offset;
+	}
+	else {
+		gain = 1.0;
+		offset = 0.0;
+	}
+	if (options & QUISK_FE_DC_REMOVE) {
+		dc_pole = 0.95;
+		dc_zero = 1.0;
+	}
+	else {
+		dc_pole = 0.0;
+		dc_zero = 0.0;
+	}
+	delayI = delayQ = 0;
+	ampA = ampD = 1.0;
+	ampC = 0.0;
+	if (options & QUISK_FE_CORRECT) {
+		if (dev->channel_Delay >= 0) {
+			delayI = dev->channel_Delay == dev->channel_I;	// 1.0 to delay I
+			delayQ = dev->channel_Delay == dev->channel_Q;
+		}
+		if (dev->doAmplPhase) {
+			ampA = dev->AmPhAAAA;
+			ampC = dev->AmPhAAAA * dev->AmPhCCCC;	// the same as correct_sample() in sound.c
+			ampD = dev->AmPhDDDD;
+		}
+	}
+	if (options & QUISK_FE_INVERT) {	// conjugate
+		ampC = - ampC;
+		ampD = - ampD;
+	}
+	dcI = creal(dev->dc_remove);
+	dcQ = cimag(dev->dc_remove);
+	save = dev->save_sample;
+	for (done = 0; done < frames; done += n) {
+		n = frames - done;
+		if (n > FE_BLOCK)
+			n = FE_BLOCK;
+		dev->overrange += convert(dev, format,
+			(const unsigned char *)buf + done * dev->num_channels * bytes, n, dI, dQ);
+		pt = (double *)(cSamples + done);	// the I and Q of each sample
+		if (delayI == 0 && delayQ == 0) {	// the usual case; no delay
+			for (i = 0; i < n; i++) {
+				// gain and DC removal
+				cI = dI[i] * gain + offset + dcI * dc_pole;
+				cQ = dQ[i] * gain + offset + dcQ * dc_pole;
+				re = cI - dcI * dc_zero;
+				im = cQ - dcQ * dc_zero;
+				dcI = cI;
+				dcQ = cQ;
+				// amplitude and phase correction, and inversion
+				pt[2 * i] = re * ampA;
+				pt[2 * i + 1] = re * ampC + im * ampD;
+			}
+		}
+		else {
+			for (i = 0; i < n; i++) {
+				cI = dI[i] * gain + offset + dcI * dc_pole;
+				cQ = dQ[i] * gain + offset + dcQ * dc_pole;
+				re = cI - dcI * dc_zero;
+				im = cQ - dcQ * dc_zero;
+				dcI = cI;
+				dcQ = cQ;
+				// delay I or Q by one sample
+				cI = save + delayI * (re - save) + delayQ * (im - save);
+				re += delayI * (save - re);
+				im += delayQ * (save - im);
+				save = cI;
+				pt[2 * i] = re * ampA;
+				pt[2 * i + 1] = re * ampC + im * ampD;
+			}
+		}
+	}
+	dev->dc_remove = dcI + I * dcQ;
+	dev->save_sample = save;
+	return frames;
+}
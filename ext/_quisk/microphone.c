@@ -142,16 +142,14 @@ static void get_wav(complex * buffer, int count)
 #if USE_GET_SIN
 static void get_sin(complex * buffer, int count)
 {	// replace mic samples with a sin wave
-	static complex phase = 0;
-	static complex vector = CLIP32;
-	int i;
+	static struct quisk_nco nco;
+	static int isInit = 0;
 
-	if (phase == 0)
-		phase = cexp((I * 2.0 * M_PI * 1000.0) / quisk_sound_state.mic_sample_rate);
-	for (i = 0; i < count; i++) {
-		vector *= phase;
-		buffer[i] = vector;
+	if ( ! isInit) {
+		isInit = 1;
+		quisk_nco_init(&nco, 2.0 * M_PI * 1000.0 / quisk_sound_state.mic_sample_rate, CLIP32);
 	}
+	quisk_nco_get(&nco, buffer, count);
 }
 #endif
 
@@ -165,8 +163,9 @@ static void tx_filter(complex * filtered, int count)
 	static int bufIQindex, bufCindex;
 	static double gainA = MIC_AVG_GAIN, gainB = 1;
 	static double a_0, a_1, b_1, x_1, y_1;
-	static complex cX[16], cY[16];
-	static complex tuneUpPhase, tuneUpVector, tuneDownPhase, tuneDownVector;
+	static complex cX[IIR_ORDER + 1], cY[IIR_ORDER + 1];
+	static double tuneUpDelta, tuneDownDelta;
+	static struct quisk_nco tuneUpNco, tuneDownNco;
 
 	if (!filtered) {		// initialization
 		www = tan(M_PI * TX_FILTER_1 / quisk_sound_state.mic_sample_rate);
@@ -177,31 +176,32 @@ static void tx_filter(complex * filtered, int count)
 		x_1 = y_1 = 0;
 		bufIQindex = 0;
 		bufCindex = 0;
-		tuneUpVector = tuneDownVector = 1;
 		for (i = 0; i < txFilterIQSize; i++)
 			txFilterBufI[i] = txFilterBufQ[i] = 0;
-		for (i = 0; i < 17; i++)
+		for (i = 0; i <= IIR_ORDER; i++)
 			cX[i] = cY[i] = 0;
 		if (rxMode == 2) {			// LSB
 			fltI = txFilterQ;
 			fltQ = txFilterI;
-			tuneUpPhase   = cexp(I * 2.0 * M_PI  * 13650.0/ quisk_sound_state.mic_sample_rate);
-			tuneDownPhase = cexp(I * 2.0 * M_PI  * 12000.0/ quisk_sound_state.mic_sample_rate);
+			tuneUpDelta   = 2.0 * M_PI  * 13650.0/ quisk_sound_state.mic_sample_rate;
+			tuneDownDelta = 2.0 * M_PI  * 12000.0/ quisk_sound_state.mic_sample_rate;
 		}
 		else if (rxMode == 3) {		// USB
 			fltI = txFilterI;
 			fltQ = txFilterQ;
-			tuneUpPhase   = cexp(I * 2.0 * M_PI  * 10350.0/ quisk_sound_state.mic_sample_rate);
-			tuneDownPhase = cexp(I * 2.0 * M_PI  * 12000.0/ quisk_sound_state.mic_sample_rate);
+			tuneUpDelta   = 2.0 * M_PI  * 10350.0/ quisk_sound_state.mic_sample_rate;
+			tuneDownDelta = 2.0 * M_PI  * 12000.0/ quisk_sound_state.mic_sample_rate;
 		}
 		else {
 			fltI = fltQ = NULL;
-			tuneUpPhase = 0;
+			tuneUpDelta = tuneDownDelta = 0;
 		}
 		// For UDP and USB/LSB, the center of the passband is at zero hertz, and a
 		// correction of 1650 Hertz is made in the transmit frequency tuning.
 		if (quisk_sound_state.tx_audio_port == 0)	// Test for UDP
-			tuneDownPhase = tuneUpPhase;	// For no UDP, leave audio at same frequency.
+			tuneDownDelta = tuneUpDelta;	// For no UDP, leave audio at same frequency.
+		quisk_nco_init(&tuneUpNco, tuneUpDelta, 1.0);
+		quisk_nco_init(&tuneDownNco, -tuneDownDelta, 1.0);
 		return;
 	}
 #if USE_GET_SIN
@@ -257,8 +257,7 @@ static void tx_filter(complex * filtered, int count)
 #endif
 #if 1
 		// Tune the data up to higher frequency
-		csample *= tuneUpVector;
-		tuneUpVector *= tuneUpPhase;
+		csample *= quisk_nco_next(&tuneUpNco);
 #endif
 
 #if 1
@@ -313,8 +312,7 @@ static void tx_filter(complex * filtered, int count)
 #endif
 #if 1
 		// Tune the data back down to frequency
-		csample *= tuneDownVector;
-		tuneDownVector /= tuneDownPhase;
+		csample *= quisk_nco_next(&tuneDownNco);
 #endif
 #if 1
 		// Normalize final amplitude
@@ -487,7 +485,7 @@ PyObject * quisk_get_tx_filter(PyObject * self, PyObject * args)
 	complex cx;
 	double scale;
 	double * average, * fft_window, * bufI, * bufQ;
-	fftw_complex * samples, * pt;		// complex data for fft
+	fftw_complex * samples;			// complex data for fft
 	fftw_plan plan;						// fft plan
 	double phase, delta;
 
@@ -495,8 +493,8 @@ PyObject * quisk_get_tx_filter(PyObject * self, PyObject * args)
 		return NULL;
 
 	// Create space for the fft of size data_width
-	pt = samples = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * data_width);
-	plan = fftw_plan_dft_1d(data_width, pt, pt, FFTW_FORWARD, FFTW_MEASURE);
+	samples = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * data_width);
+	plan = quisk_fft_plan(data_width, FFTW_FORWARD, 1);
 	average = (double *) malloc(sizeof(double) * (data_width + txFilterIQSize));
 	fft_window = (double *) malloc(sizeof(double) * data_width);
 	bufI = (double *) malloc(sizeof(double) * txFilterIQSize);
@@ -535,7 +533,7 @@ PyObject * quisk_get_tx_filter(PyObject * self, PyObject * args)
 
 	for (i = 0; i < data_width; i++)	// multiply by window
 		samples[i] *= fft_window[i];
-	fftw_execute(plan);		// Calculate FFT
+	fftw_execute_dft(plan, samples, samples);		// Calculate FFT
 	// Normalize and convert to log10
 	scale = 0.3 / data_width / scale;
 	for (k = 0; k < data_width; k++) {
@@ -561,7 +559,6 @@ PyObject * quisk_get_tx_filter(PyObject * self, PyObject * args)
 	free(bufI);
 	free(average);
 	free(fft_window);
-	fftw_destroy_plan(plan);
 	fftw_free(samples);
 
 	return tuple2;
@@ -613,23 +610,18 @@ static void transmit_mic_carrier(complex * cSamples, int count, double level)
 static void transmit_mic_imd(complex * cSamples, int count, double level)
 {	// send a 2-tone test signal instead of mic samples
 	int i;
-	complex v;
-	static complex phase1=0, phase2;		// Phase increment
-	static complex vector1;
-	static complex vector2;
-
-	if (phase1 == 0) {		// initialize
-		phase1 = cexp((I * 2.0 * M_PI * IMD_TONE_1) / quisk_sound_state.mic_sample_rate);
-		phase2 = cexp((I * 2.0 * M_PI * IMD_TONE_2) / quisk_sound_state.mic_sample_rate);
-		vector1 = CLIP16 / 2.0;
-		vector2 = CLIP16 / 2.0;
-	}
-	for (i = 0; i < count; i++) {	// transmit a carrier equal to the number of samples
-		vector1 *= phase1;
-		vector2 *= phase2;
-		v = level * (vector1 + vector2);
-		cSamples[i] = v;
+	static struct quisk_nco nco1, nco2;
+	static int isInit = 0;
+
+	if ( ! isInit) {		// initialize
+		isInit = 1;
+		quisk_nco_init(&nco1, 2.0 * M_PI * IMD_TONE_1 / quisk_sound_state.mic_sample_rate, CLIP16 / 2.0);
+		quisk_nco_init(&nco2, 2.0 * M_PI * IMD_TONE_2 / quisk_sound_state.mic_sample_rate, CLIP16 / 2.0);
 	}
+	quisk_nco_get(&nco1, cSamples, count);		// transmit two tones equal to the number of samples
+	quisk_nco_add(&nco2, cSamples, count);
+	for (i = 0; i < count; i++)
+		cSamples[i] *= level;
 	transmit_udp(cSamples, count);
 }
 
@@ -0,0 +1,192 @@
+#include <Python.h>
+#include <stdlib.h>
+#include <math.h>
+#include <complex.h>	// Use native C99 complex type for fftw3
+#include "quisk.h"
+
+// A numerically controlled oscillator (NCO) for tuning and tones.
+//
+// The usual loop "x *= vector; vector *= phase;" makes each sample depend on the
+// previous one, so it can not be vectorized, and the amplitude of vector drifts
+// because of rounding.  Instead, a table holds the QUISK_NCO_BLOCK phasors
+// exp(j * delta * k) for k = 0 to QUISK_NCO_BLOCK - 1.  The output for a block is
+// vector * table[k], and these multiplies are independent.  The vector is advanced
+// once per block by exp(j * delta * QUISK_NCO_BLOCK) and renormalized to the
+// amplitude, so there is no drift.
+//
+// Call quisk_nco_init() before first use.  To change the frequency from the GUI
+// thread, record the new delta and call quisk_nco_set_delta() from the sound thread.
+
+void quisk_nco_init(struct quisk_nco * nco, double delta, double amplitude)
+{	// Initialize the NCO with phase zero.  Delta is the phase change per sample in
+	// radians, 2 pi freq / sample_rate.
+	nco->amplitude = amplitude;
+	nco->vector = amplitude;
+	nco->index = 0;
+	nco->delta = delta + 1.0;		// force a new table
+	quisk_nco_set_delta(nco, delta);
+}
+
+void quisk_nco_set_delta(struct quisk_nco * nco, double delta)
+{	// Change the frequency, but keep the phase and amplitude
+	int k;
+
+	if (delta == nco->delta)
+		return;
+	if (nco->index) {		// start a new block at the current phase
+		nco->vector *= nco->table[nco->index];
+		nco->index = 0;
+	}
+	nco->delta = delta;
+	for (k = 0; k < QUISK_NCO_BLOCK; k++)
+		nco->table[k] = cexp(I * delta * k);
+	nco->block_step = cexp(I * delta * QUISK_NCO_BLOCK);
+}
+
+static void nco_next_block(struct quisk_nco * nco)
+{	// Advance the vector to the next block and renormalize
+	double d;
+
+	nco->vector *= nco->block_step;
+	d = cabs(nco->vector);
+	if (d > 0)
+		nco->vector *= nco->amplitude / d;
+	nco->index = 0;
+}
+
+complex quisk_nco_next(struct quisk_nco * nco)
+{	// Return the next phasor.  Use this for loops that must process one sample at a time.
+	complex cx;
+
+	cx = nco->vector * nco->table[nco->index];
+	if (++nco->index >= QUISK_NCO_BLOCK)
+		nco_next_block(nco);
+	return cx;
+}
+
+// The block loops use real arithmetic on the table.  A C99 complex multiply must check
+// for infinities, and that prevents the compiler from vectorizing the loop.
+
+void quisk_nco_get(struct quisk_nco * nco, complex * cSamples, int nSamples)
+{	// Replace the samples with the NCO output
+	int i, k, n;
+	double vr, vi, * tab, * out;
+
+	for (i = 0; i < nSamples; i += n) {
+		n = QUISK_NCO_BLOCK - nco->index;
+		if (n > nSamples - i)
+			n = nSamples - i;
+		vr = creal(nco->vector);
+		vi = cimag(nco->vector);
+		tab = (double *)(nco->table + nco->index);
+		out = (double *)(cSamples + i);
+		for (k = 0; k < n * 2; k += 2) {
+			out[k]     = vr * tab[k] - vi * tab[k + 1];
+			out[k + 1] = vr * tab[k + 1] + vi * tab[k];
+		}
+		nco->index += n;
+		if (nco->index >= QUISK_NCO_BLOCK)
+			nco_next_block(nco);
+	}
+}
+
+void quisk_nco_add(struct quisk_nco * nco, complex * cSamples, int nSamples)
+{	// Add the NCO output to the samples
+	int i, k, n;
+	double vr, vi, * tab, * out;
+
+	for (i = 0; i < nSamples; i += n) {
+		n = QUISK_NCO_BLOCK - nco->index;
+		if (n > nSamples - i)
+			n = nSamples - i;
+		vr = creal(nco->vector);
+		vi = cimag(nco->vector);
+		tab = (double *)(nco->table + nco->index);
+		out = (double *)(cSamples + i);
+		for (k = 0; k < n * 2; k += 2) {
+			out[k]     += vr * tab[k] - vi * tab[k + 1];
+			out[k + 1] += vr * tab[k + 1] + vi * tab[k];
+		}
+		nco->index += n;
+		if (nco->index >= QUISK_NCO_BLOCK)
+			nco_next_block(nco);
+	}
+}
+
+void quisk_nco_mix(struct quisk_nco * nco, complex * cSamples, int nSamples)
+{	// Multiply the samples by the NCO output; this tunes the samples by delta
+	int i, k, n;
+	double vr, vi, pr, pi, sr, si, * tab, * out;
+
+	for (i = 0; i < nSamples; i += n) {
+		n = QUISK_NCO_BLOCK - nco->index;
+		if (n > nSamples - i)
+			n = nSamples - i;
+		vr = creal(nco->vector);
+		vi = cimag(nco->vector);
+		tab = (double *)(nco->table + nco->index);
+		out = (double *)(cSamples + i);
+		for (k = 0; k < n * 2; k += 2) {
+			pr = vr * tab[k] - vi * tab[k + 1];
+			pi = vr * tab[k + 1] + vi * tab[k];
+			sr = out[k];
+			si = out[k + 1];
+			out[k]     = sr * pr - si * pi;
+			out[k + 1] = sr * pi + si * pr;
+		}
+		nco->index += n;
+		if (nco->index >= QUISK_NCO_BLOCK)
+			nco_next_block(nco);
+	}
+}
+
+PyObject * quisk_measure_nco(PyObject * self, PyObject * args)
+{	// Compare the recursive phasor loop with the NCO.  Tune a block of samples
+	// repeatedly for "seconds" each, and return the samples per second and the final
+	// amplitude error of each method.
+	int i, n, count;
+	double seconds, t0, rate_loop, rate_nco, err_loop, err_nco;
+	complex vector, phase;
+	complex * samples;
+	struct quisk_nco nco;
+
+	seconds = 1.0;
+	if (!PyArg_ParseTuple (args, "|d", &seconds))
+		return NULL;
+	n = 4096;
+	samples = (complex *)malloc(n * sizeof(complex));
+	for (i = 0; i < n; i++)
+		samples[i] = 1.0;
+	// The recursive phasor loop used before
+	phase = cexp(I * 2.0 * M_PI * 12345.0 / 96000.0);
+	vector = 1;
+Py_BEGIN_ALLOW_THREADS
+	count = 0;
+	t0 = QuiskTimeSec();
+	while (QuiskTimeSec() - t0 < seconds) {
+		for (i = 0; i < n; i++) {
+			samples[i] *= vector;
+			vector *= phase;
+		}
+		count++;
+	}
+	rate_loop = (double)count * n / (QuiskTimeSec() - t0);
+Py_END_ALLOW_THREADS
+	err_loop = fabs(cabs(vector) - 1.0);
+	// The NCO
+	for (i = 0; i < n; i++)
+		samples[i] = 1.0;
+	quisk_nco_init(&nco, 2.0 * M_PI * 12345.0 / 96000.0, 1.0);
+Py_BEGIN_ALLOW_THREADS
+	count = 0;
+	t0 = QuiskTimeSec();
+	while (QuiskTimeSec() - t0 < seconds) {
+		quisk_nco_mix(&nco, samples, n);
+		count++;
+	}
+	rate_nco = (double)count * n / (QuiskTimeSec() - t0);
+Py_END_ALLOW_THREADS
+	err_nco = fabs(cabs(quisk_nco_next(&nco)) - 1.0);
+	free(samples);
+	return Py_BuildValue("dddd", rate_loop, rate_nco, err_loop, err_nco);
+}
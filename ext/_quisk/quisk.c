@@ -23,51 +23,59 @@
 
 // DC correction for ADC samples from UDP
 #define DC_OFFSET_ADC		160880.0
-#define FM_FILTER_DEMPH		300.0		// Frequency of FM lowpass de-emphasis filter
-
-// Interpolation filter
-double interpFilterCoef[INTERP_FILTER_TAPS] = {
--0.0014520724581619038, 0.001465077835702283, 0.0016872049554487805, 0.002231589757636616,
-0.002968733413841478, 0.003814111604268629, 0.004701377925622313, 0.005563735642891225,
-0.006329349313192236, 0.00692563503945522, 0.00728031065507179, 0.007324031007188439,
-0.007001538274824099, 0.006269549743028705, 0.005109362626336052, 0.0035251497078111612,
-0.0015532783824581805, -7.42007695505918E-4, -0.003261456038073849, -0.00588052913811741,
--0.008445715457113093, -0.010788117896010696, -0.012724127539638374, -0.014072167012043064,
--0.014655432422717352, -0.014320398913272279, -0.012939708244425117, -0.010428725793659156,
--0.00674649422603162, -0.001908771663085817, 0.004016522608274192, 0.010900987627517972,
-0.018565817817064456, 0.026782245665652966, 0.03528488587061357, 0.04377887008351154,
-0.05195918785452774, 0.05951705401787405, 0.06616030228971032, 0.0716318254603302,
-0.07570134752536944, 0.07821336538322851, 0.07906313690411886, 0.07821336538322851,
-0.07570134752536944, 0.0716318254603302, 0.06616030228971032, 0.05951705401787405,
-0.05195918785452774, 0.04377887008351154, 0.03528488587061357, 0.026782245665652966,
-0.018565817817064456, 0.010900987627517972, 0.004016522608274192, -0.001908771663085817,
--0.00674649422603162, -0.010428725793659156, -0.012939708244425117, -0.014320398913272279,
--0.014655432422717352, -0.014072167012043064, -0.012724127539638374, -0.010788117896010696,
--0.008445715457113093, -0.00588052913811741, -0.003261456038073849, -7.42007695505918E-4,
-0.0015532783824581805, 0.0035251497078111612, 0.005109362626336052, 0.006269549743028705,
-0.007001538274824099, 0.007324031007188439, 0.00728031065507179, 0.00692563503945522,
-0.006329349313192236, 0.005563735642891225, 0.004701377925622313, 0.003814111604268629,
-0.002968733413841478, 0.002231589757636616, 0.0016872049554487805, 0.001465077835702283,
--0.0014520724581619038};
 
 static int fft_error;			// fft error count
 static int count_fft;			// how many fft's have occurred (for average)
-enum fft_status {EMPTY,			// fft_data is currently unused
-	FILLING,			// now writing samples to this fft
-	READY};				// ready to perform fft
-typedef struct fftd {
-	fftw_complex * samples;		// complex data for fft
-	fftw_plan plan;			// fft plan for fftW
-	int index;			// position of next fft sample
-	enum fft_status status;		// whether the fft is busy
-	struct fftd * next;			// the next data block to use
-} fft_data;
-static fft_data * FFT1, * FFT2, * FFT3;	// data for three fft's		WB4JFI ADD third FFT
-static fft_data * ptWriteFft;		// Write the current samples to this fft
+static struct quisk_fft_ring * fftRing;	// sample history passed from the sound thread to the GUI
+static fftw_complex * fft_block;	// block of samples from the ring for the FFT
+static fftw_plan fft_plan;		// in-place fft plan for fft_block
 static double * fft_avg;		// Array to average the FFT
+static int avgShift;			// fft_avg adds blocks of 2**avgShift neighboring bins
 static double * fft_window;		// Window for FFT data
-
-static PyObject * QuiskError;		// Exception for this module
+static double meter;			// RMS s-meter
+
+#define ZOOM_PASSBAND	0.6		// usable bandwidth of the zoom-FFT as a fraction of its sample rate
+#define ZOOM_CHUNK		8192	// samples read from the ring at once for the zoom-FFT
+
+static int use_zoom_fft;		// Use the zoom-FFT when the graph is zoomed in
+static int zoomDecim;			// decimation for the zoom-FFT, or zero for the full FFT
+static double zoomDeltaf;		// zoom center frequency
+static int zoomRate;			// sample rate of the zoom-FFT input
+static int zoomAverage;			// number of zoom-FFT's to average
+static int zoomHop;				// decimated samples from one zoom-FFT block to the next
+static struct quisk_nco zoomNco;	// tune zoomDeltaf to zero
+static struct quisk_decimator zoomDecimator;
+static complex * zoomSamples;	// decimated samples waiting for the zoom-FFT
+static int zoomCount;			// number of samples in zoomSamples
+
+// The spectrum thread reads the sample ring, calculates and averages the FFT's, and
+// converts them to graph data in dB.  It publishes each finished frame in one of two
+// frame buffers, and get_graph() copies it for the GUI.  The thread only writes a
+// frame after the GUI has taken the last one, so the GUI never reads a frame that is
+// being written.  The frame counts increase without limit.
+#define SPECTRUM_POLL_USEC	5000	// time to wait for more samples
+
+struct spectrum_frame {
+	double * data;		// graph data: data_width dB values, or data_width complex raw samples
+	double * peak;		// graph data with peak hold
+	int use_fft;		// the type of data
+	double smeter;		// s-meter in dB
+} ;
+
+static void * spectrumThread;	// handle of the spectrum thread, or NULL
+static volatile int spectrumQuit;
+static struct spectrum_frame frames[2];
+static volatile unsigned int frames_published;	// written by the spectrum thread
+static volatile unsigned int frames_taken;		// written by the GUI
+static volatile int graphUseFft = 1;	// requests from the GUI: use the FFT or return raw data
+static volatile double graphZoom = 1.0;	// zoom and center frequency
+static volatile double graphDeltaf;
+static volatile double peakDecay = 9999;	// peak hold falls by this many dB per frame
+static double * peakHold;		// peak hold state
+static int peakReset = 1;		// start the peak hold again
+static void StopSpectrumThread(void);
+
+PyObject * QuiskError;			// Exception for this module
 static PyObject * pyApp;		// Application instance
 static int fft_size;			// size of fft, e.g. 1024
 int data_width;					// number of points to return as graph data; fft_size * n
@@ -80,110 +88,32 @@ static int graphX;			// Origin of first X value for graph data
 static int graphY;			// Origin of 0 dB for graph data
 static int average_count;		// Number of FFT's to average for graph
 static double graphScale;		// Scale factor for graph
-static complex testtonePhase;		// Phase increment for test tone
-static double audioVolume;		// Audio output level, 0.0 to 1.0
-static complex tunePhase;		// Phase increment for tuning frequency
-static double cFilterI[MAX_FILTER_SIZE];	// Digital filter coefficients for receive
-static double cFilterQ[MAX_FILTER_SIZE];	// Digital filter coefficients
-static double bufFilterI[MAX_FILTER_SIZE];	// Digital filter sample buffer
-static double bufFilterQ[MAX_FILTER_SIZE];	// Digital filter sample buffer
-static complex bufFilterC[MAX_FILTER_SIZE];	// Digital filter sample buffer
-static int sizeFilter;			// Number of coefficients for filters
-static int indexFilter;			// Index of current filter data in buffer
+static double testtoneDelta;		// Phase change per sample for test tone, or zero
 static int isFDX;			// Are we in full duplex mode?
 static int filter_bandwidth;	// Current filter bandwidth in Hertz
 
-static double * fmFilterI;		// FM audio filter
-static double * fmFilterBufI;
-static int fmFilterSize = 0;
-
 static double sidetoneVolume;		// Audio output level of the CW sidetone, 0.0 to 1.0
 static int keyupDelay;			// Play silence after sidetone ends
-static complex sidetonePhase;		// Phase increment for sidetone
+static double sidetoneDelta;		// Phase change per sample for sidetone
 
-static int agcInUse;			// 0 for no AGC; else the AGC method 1, 2
-static double agcAttack, agcRelease;	// AGC attack and release parameters
-static double agcGain;			// Volume level control for audio output
-static int quisk_invert_spectrum = 0;	// Invert the input RF spectrum
+int quisk_invert_spectrum = 0;	// Invert the input RF spectrum
 
 static double Smeter;			// Measured RMS signal strength
 static int rx_tune_freq;		// Receive tuning frequency as +/- sample_rate / 2
 int quisk_tx_tune_freq;			// Transmit tuning frequency as +/- sample_rate / 2
 static int rit_freq;					// RIT frequency in Hertz
 
-#define RX_UDP_SIZE		1442		// Expected size of UDP samples packet
 static int rx_udp_socket = INVALID_SOCKET;		// Socket for receiving ADC samples from UDP
 static int rx_udp_started = 0;		// Have we received any data yet?
 int quisk_use_rx_udp = 0;			// Are we using rx_udp_socket?
 static double rx_udp_gain_correct = 0;		// For decimation by 5, correct by 4096 / 5**5
 static double rx_udp_clock;			// Clock frequency for UDP samples
 static int rx_udp_read_blocks = 0;	// Number of blocks to read for each read call
+static struct sound_dev rx_udp_dev;	// Capture front end options for UDP samples
+static int rx_udp_jitter;			// Depth of the jitter buffer in packets
+static int rx_udp_gap_fill;			// Fill lost packets with zeros (0) or interpolate (1)
+static int rx_udp_rcvbuf;			// Socket receive buffer size in bytes
 
-static int is_little_endian;		// Test byte order; is it little-endian?
-
-
-static int fDecimate(double * dSamples, int nSamples, double fdecim)
-{  // Decimate to a lower sample rate by a fraction
-#if 1
-		// fractional decimation with linear interpolation
-		int n, nout, avail;
-		static double dindex = 0;
-		static double lastsample = 0;
-		double slast, samp, s1, s2;
-
-		slast = dSamples[nSamples - 1];		// save last sample
-		if (dindex < 0) {	// use last sample
-			n = -1;
-			s1 = lastsample;
-			s2 = dSamples[0];
-			samp = s1 * (1.0 - dindex + n) + s2 * (dindex - n);
-			avail = 1;
-			dindex += fdecim;
-		}
-		else {
-			avail = 0;
-			samp = 0;
-		}
-		nout = 0;
-		n = (int)(floor(dindex) + 0.1);
-		// Calculate any subsequent samples
-		while (n < nSamples - 1) {
-			s1 = dSamples[n];
-			s2 = dSamples[n + 1];
-			if (avail) {		// record delayed sample
-				dSamples[nout++] = samp;
-			}
-			samp = s1 * (1.0 - dindex + n) + s2 * (dindex - n);
-			avail = 1;
-			dindex += fdecim;
-			n = (int)(floor(dindex) + 0.1);
-		}
-		if (avail) {
-			dSamples[nout++] = samp;	// record last sample
-		}
-		lastsample = slast;
-		dindex -= nSamples;
-		//if (dindex < -1)
-		//	printf("dindex %.2f, i %d\n", dindex, i);
-		return nout;
-#else
-		// fractional decimation with nearest neighbor
-		int n, nout;
-		static double dindex = 0;
-if (! dSamples) {dindex = 0; return 0;}
-		n = (int)(dindex + 0.5);
-		for (nout = 0; n < nSamples; ) {
-			dSamples[nout++] = dSamples[n];
-if (prnt) printf ("fD  %d %d %.3f  %.3f\n", nout-1, n, dindex, dSamples[n]);
-			dindex += fdecim;
-			n = (int)(dindex + 0.5);
-		}
-		dindex -= nSamples;
-		//if (dindex + 0.5 < 0)
-		//	printf("dindex %.2f, i %d\n", dindex, i);
-		return nout;
-#endif
-}
 
 #define QUISK_NB_HWINDOW_SECS	500.E-6	// half-size of blanking window in seconds
 static void NoiseBlanker(complex * cSamples, int nSamples)
@@ -346,25 +276,17 @@ int quisk_process_samples(complex * cSamples, int nSamples)
 {
 // Called when samples are available.
 // Samples range from about 2^16 to a max of 2^31.
-	int i, j, k, nout, filter_srate;
-	double d, di, accI, accQ, agc_level, agcPeak, www, nnn, a_0, a_1, b_1;
-	complex cx;
-	double dsamples[SAMP_BUFFER_SIZE];
-
-	static complex testtoneVector = 21474836.47;	// -40 dB
-	static complex tuneVector = 1;
-	static complex sidetoneVector = BIG_VOLUME;
+	int i, nout;
+	double d, di, t0;
+
+	static struct quisk_nco testtoneNco;
+	static struct quisk_nco sidetoneNco;
+	static int ncoIsInit = 0;
 	static double dOutCounter = 0;		// Cumulative net output samples for sidetone etc.
 	static int sidetoneIsOn = 0;		// The status of the sidetone
 	static double sidetoneEnvelope;		// Shape the rise and fall times of the sidetone
 	static double keyupEnvelope = 1.0;	// Shape the rise time on key up
 	static int playSilence;
-	static complex fm_1 = 10;			// Sample delayed by one
-	static complex fm_2 = 10;			// Sample delayed by two
-	static int indexFmFilter = 0;		// index into FM filter
-	static int indexInterpFilter = 0;	// index into interpolation filter
-	static double interpFilterBuf[INTERP_FILTER_TAPS];		// Interpolation audio filter
-	static double x_1, y_1;				// FM de-emphasis filter
 
 #if DEBUG
 	if (quisk_sound_state.interupts < 10 || quisk_sound_state.interupts % 1000 == 0)
@@ -372,6 +294,11 @@ int quisk_process_samples(complex * cSamples, int nSamples)
 #endif
 	if (nSamples <= 0)
 		return nSamples;
+	if ( ! ncoIsInit) {
+		ncoIsInit = 1;
+		quisk_nco_init(&testtoneNco, testtoneDelta, 21474836.47);	// -40 dB
+		quisk_nco_init(&sidetoneNco, sidetoneDelta, BIG_VOLUME);
+	}
 
 	if (quisk_is_key_down() && !isFDX) {	// The key is down; replace this data block
 		dOutCounter += (double)nSamples * quisk_sound_state.playback_rate /
@@ -384,17 +311,18 @@ int quisk_process_samples(complex * cSamples, int nSamples)
 			if (! sidetoneIsOn) {			// turn on sidetone
 				sidetoneIsOn = 1;
 				sidetoneEnvelope = 0;
-				sidetoneVector = BIG_VOLUME;
+				quisk_nco_init(&sidetoneNco, sidetoneDelta, BIG_VOLUME);
 			}
+			quisk_nco_set_delta(&sidetoneNco, sidetoneDelta);
+			quisk_nco_get(&sidetoneNco, cSamples, nout);
 			for (i = 0 ; i < nout; i++) {
 				if (sidetoneEnvelope < 1.0) {
 					sidetoneEnvelope += 1. / (quisk_sound_state.playback_rate * 5e-3);	// 5 milliseconds
 					if (sidetoneEnvelope > 1.0)
 						sidetoneEnvelope = 1.0;
 				}
-				d = creal(sidetoneVector) * sidetoneVolume * sidetoneEnvelope;
+				d = creal(cSamples[i]) * sidetoneVolume * sidetoneEnvelope;
 				cSamples[i] = d + I * d;
-				sidetoneVector *= sidetonePhase;
 			}
 		}
 		else {			// Otherwise play silence
@@ -409,6 +337,7 @@ int quisk_process_samples(complex * cSamples, int nSamples)
 				quisk_sound_state.sample_rate;
 		nout = (int)dOutCounter;			// number of samples to output
 		dOutCounter -= nout;
+		quisk_nco_get(&sidetoneNco, cSamples, nout);
 		for (i = 0; i < nout; i++) {
 			sidetoneEnvelope -= 1. / (quisk_sound_state.playback_rate * 5e-3);	// 5 milliseconds
 			if (sidetoneEnvelope < 0) {
@@ -416,9 +345,8 @@ int quisk_process_samples(complex * cSamples, int nSamples)
 				sidetoneEnvelope = 0;
 				break;		// sidetone is zero
 			}
-			d = creal(sidetoneVector) * sidetoneVolume * sidetoneEnvelope;
+			d = creal(cSamples[i]) * sidetoneVolume * sidetoneEnvelope;
 			cSamples[i] = d + I * d;
-			sidetoneVector *= sidetonePhase;
 		}
 		for ( ; i < nout; i++) {	// continue with playSilence, even if zero
 			cSamples[i] = 0;
@@ -438,247 +366,31 @@ int quisk_process_samples(complex * cSamples, int nSamples)
 	}
 	// We are done replacing sound with a sidetone or silence.  Filter and
 	// demodulate the samples as radio sound.
+	t0 = QuiskTimeSec();
 
-	// Add a test tone to the data
-	if (testtonePhase) {
-		for (i = 0; i < nSamples; i++) {
-			cSamples[i] += testtoneVector;
-			testtoneVector *= testtonePhase;
-		}
-	}
-	// Invert spectrum
-	if (quisk_invert_spectrum) {
-		for (i = 0; i < nSamples; i++) {
-			cSamples[i] = conj(cSamples[i]);
-			}
+	// Add a test tone to the data.  The spectrum was inverted when the samples were read,
+	// so the test tone is inverted too.
+	if (testtoneDelta) {
+		quisk_nco_set_delta(&testtoneNco, quisk_invert_spectrum ? -testtoneDelta : testtoneDelta);
+		quisk_nco_add(&testtoneNco, cSamples, nSamples);
 	}
 
 	NoiseBlanker(cSamples, nSamples);
 
-	// Check for space, then put samples into the fft input array.
-	// Thanks to WB4JFI for the code to add a third FFT buffer, July 2010 (but changed to linked list).
-	if (ptWriteFft->status == EMPTY) {
-		ptWriteFft->status = FILLING;
-		ptWriteFft->index = 0;
-	}
-	if (ptWriteFft->status == FILLING) {		// write samples to fft data array
-		for (i = 0; i < nSamples; i++) {
-			ptWriteFft->samples[ptWriteFft->index] = cSamples[i];
-			if (++(ptWriteFft->index) >= fft_size) {	// check sample count
-				ptWriteFft->status = READY;				// ready to run fft
-				ptWriteFft = ptWriteFft->next;			// next data block
-				if (ptWriteFft->status == EMPTY) {	// continue writing samples
-					ptWriteFft->status = FILLING;
-					ptWriteFft->index = 0;
-				}
-				else {				// no place to write samples
-					fft_error++;
-					break;
-				}
-			}
-		}
-	}
+	// Put samples into the fft ring; the GUI thread reads them in get_graph().
+	quisk_fft_ring_write(fftRing, cSamples, nSamples);
+	fft_error = fftRing->overflows;
+	t0 = quisk_stage_end(QUISK_STAGE_FRONT, t0);
 
 	// No need to tune and demodulate if we don't play sound
 	if (quisk_sound_state.dev_play_name[0] == 0)
 		return 0;
-	// Tune the data to frequency
-	if (tunePhase) {
-		for (i = 0; i < nSamples; i++) {
-			cSamples[i] *= tuneVector;
-			tuneVector *= tunePhase;
-		}
-	}
-
-	if (rxMode == 6) {		// External filter and demodulate
-		d = quisk_sound_state.double_filter_decim * quisk_sound_state.int_filter_decim /
-				quisk_sound_state.int_filter_interp;	// total decimation needed
-		nSamples = quisk_extern_demod(cSamples, nSamples, d);
-		// Find the peak signal amplitude
-		agcPeak = 0;
-		for (i = 0; i < nSamples; i++) {
-			di = creal(cSamples[i]);
-			if (agcPeak < di)
-				agcPeak = di;
-			di = cimag(cSamples[i]);
-			if (agcPeak < di)
-				agcPeak = di;
-		}
-		goto start_agc;
-	}
-
-	// Perhaps write sample data to the soundcard output without decimation
-	if (TEST_AUDIO == 1) {		// Copy I channel capture to playback
-		di = 1.e4 * audioVolume;
-		for (i = 0; i < nSamples; i++)
-			cSamples[i] = creal(cSamples[i]) * di;
-		return nSamples;
-	}
-	else if (TEST_AUDIO == 2) {	// Copy Q channel capture to playback
-		di = 1.e4 * audioVolume;
-		for (i = 0; i < nSamples; i++)
-			cSamples[i] = cimag(cSamples[i]) * di;
-		return nSamples;
-	}
-
-	// Decimate: Lower the sample rate.
-	nSamples = quisk_iDecimate (cSamples, nSamples, quisk_sound_state.int_filter_decim);
-
-	/* Filter the signal */
-	if (sizeFilter) {
-		if (rxMode == 4 || rxMode == 5)	{	// AM and FM: Use same filter for I and Q
-			for (i = 0; i < nSamples; i++) {
-				bufFilterC[indexFilter] = cSamples[i];
-				cx = 0;
-				j = indexFilter;
-				for (k = 0; k < sizeFilter; k++) {
-					cx += bufFilterC[j] * cFilterI[k];
-					if (++j >= sizeFilter)
-						j = 0;
-				}
-				cSamples[i] = cx;
-				if (++indexFilter >= sizeFilter)
-					indexFilter = 0;
-			}
-		}
-		else {			// CW and SSB: Use filters for 90 degree phase shift
-			for (i = 0; i < nSamples; i++) {
-				cx = cSamples[i];
-				bufFilterI[indexFilter] = creal(cx);
-				bufFilterQ[indexFilter] = cimag(cx);
-				accI = accQ = 0;
-				j = indexFilter;
-				for (k = 0; k < sizeFilter; k++) {
-					accI += bufFilterI[j] * cFilterI[k];
-					accQ += bufFilterQ[j] * cFilterQ[k];
-					if (++j >= sizeFilter)
-						j = 0;
-				}
-				cSamples[i] = accI + I * accQ;
-				if (++indexFilter >= sizeFilter)
-					indexFilter = 0;
-			}
-		}
-	}
-	// Demodulate signal, copy capture buffer cSamples to play buffer dsamples.
-	// filter_srate is the sample rate after decimation.
-	filter_srate = quisk_sound_state.sample_rate / quisk_sound_state.int_filter_decim;
-	for (i = 0; i < nSamples; i++) {
-		cx = cSamples[i];
-		switch(rxMode) {
-		case 0:		// lower sideband
-		case 2:
-			di = creal(cx) + cimag(cx);
-			break;
-		case 1:		// upper sideband
-		case 3:
-		default:
-			di = creal(cx) - cimag(cx);
-			break;
-		case 4:		// AM
-			di = cabs(cx);
-			break;
-		case 5:		// FM
-			di = creal(fm_1) * (cimag(cx) - cimag(fm_2)) -
-			     cimag(fm_1) * (creal(cx) - creal(fm_2));
-			d = creal(fm_1) * creal(fm_1) + cimag(fm_1) * cimag(fm_1);
-			if (d == 0)	// I don't think this can happen
-				di = 0;
-			else
-				di = di / d * filter_srate;
-			fm_2 = fm_1;	// fm_2 is sample cSamples[i - 2]
-			fm_1 = cx;		// fm_1 is sample cSamples[i - 1]
-			break;
-		}
-		dsamples[i] = di;
-	}
-	// For FM, filter the audio
-	if (rxMode == 5 && fmFilterSize) {
-		www = tan(M_PI * FM_FILTER_DEMPH / filter_srate);	// filter_srate might change
-		nnn = 1.0 / (1.0 + www);
-		a_0 = www * nnn;
-		a_1 = a_0;
-		b_1 = nnn * (www - 1.0);
-		for (i = 0; i < nSamples; i++) {
-			fmFilterBufI[indexFmFilter] =  dsamples[i];
-			accI = 0;
-			j = indexFmFilter;
-			for (k = 0; k < fmFilterSize; k++) {
-				accI += fmFilterBufI[j] * fmFilterI[k];
-				if (++j >= fmFilterSize)
-					j = 0;
-			}
-			//dsamples[i] = accI;
-			if (++indexFmFilter >= fmFilterSize)
-				indexFmFilter = 0;
-			// FM de-emphasis
-			dsamples[i] = y_1 = accI * a_0 + x_1 * a_1 - y_1 * b_1;
-			x_1 = accI;
-		}
-	}
-	// Perhaps interpolate the samples back to the play rate
-	if (quisk_sound_state.int_filter_interp > 1) {
-		k = quisk_sound_state.int_filter_interp;
-		// from samples a, b, c  make  a, 0, 0, b, 0, 0, c, 0, 0
-		nSamples *= k;
-		for (i = nSamples - 1; i >= 0; i--) {
-			if (i % k == 0)
-				dsamples[i] = dsamples[i / k] * k;
-			else
-				dsamples[i] = 0;
-		}
-		for (i = 0; i < nSamples; i++) {	// low pass filter
-			interpFilterBuf[indexInterpFilter] =  dsamples[i];
-			accI = 0;
-			j = indexInterpFilter;
-			for (k = 0; k < INTERP_FILTER_TAPS; k++) {
-				accI += interpFilterBuf[j] * interpFilterCoef[k];
-				if (++j >= INTERP_FILTER_TAPS)
-					j = 0;
-			}
-			dsamples[i] = accI;
-			if (++indexInterpFilter >= INTERP_FILTER_TAPS)
-				indexInterpFilter = 0;
-		}
-	}
-	// Perhaps decimate (lower the sample rate) by an additional fraction
-	if (quisk_sound_state.double_filter_decim != 1.0) {
-		nSamples = fDecimate(dsamples, nSamples, quisk_sound_state.double_filter_decim);
-	}
-	// Find the peak signal amplitude, copy sound to output cSamples
-	agcPeak = 0;
-	for (i = 0; i < nSamples; i++) {
-		d = dsamples[i];
-		cSamples[i] = d + I * d;	// monophonic sound, two channels
-		d = fabs(d);
-		if (agcPeak < d)
-			agcPeak = d;
-	}
-	// Perhaps change volume using automatic gain control, AGC.
-	// The maximum signal is about 2^31, namely 2e9.
-start_agc:
-	agc_level = 1400. * audioVolume;	// For no AGC
-	if (agcInUse) {
-		if (agcInUse == 1) {
-			// Brick wall agc; make all signals the same volume 2e9.
-			// Then multiply by volume control.
-			di = agcPeak * agcGain;	// Current level if not changed
-			if (agcPeak < 1.0)
-				;
-			else if (di <= 2.e9)	// Current level is below the soundcard max, increase gain
-				agcGain += (2.e9 / agcPeak - agcGain) * agcRelease;
-			else			// decrease gain
-				agcGain += (2.e9 / agcPeak - agcGain) * agcAttack;
-			agc_level = agcGain * audioVolume;		// change volume
-		}
-		else if (agcInUse == 2) {
-			// Set gain with the volume control, but limit max signal to 2e9
-			agcGain += (10000. * audioVolume - agcGain) * agcRelease;
-			if (agcPeak * agcGain > 2.e9)	// check maximum level
-				agcGain += (2.e9 / agcPeak - agcGain) * agcAttack;
-			agc_level = agcGain;
-		}
-	}
+	// Start the sub-receivers on a copy of the samples
+	quisk_rx_process_subs(cSamples, nSamples);
+	// Tune, filter and demodulate the main receiver, and add the sub-receiver audio
+	nSamples = quisk_rx_process(quisk_rx_get(0), cSamples, nSamples);
+	quisk_rx_mix_subs(cSamples, nSamples);
+	quisk_stage_end(QUISK_STAGE_RX, t0);
 
 	if (keyupEnvelope < 1.0) {		// raise volume slowly after the key goes up
 		di = 1. / (quisk_sound_state.playback_rate * 5e-3);		// 5 milliseconds
@@ -686,23 +398,21 @@ start_agc:
 			keyupEnvelope += di;
 			if (keyupEnvelope > 1.0)
 				keyupEnvelope = 1.0;
-			cSamples[i] *= keyupEnvelope * agc_level;
+			cSamples[i] *= keyupEnvelope;
 		}
 	}
-	else {		// apply AGC
-		for (i = 0; i < nSamples; i++)
-			cSamples[i] *= agc_level;
-	}
 	return nSamples;
 }
 
 static PyObject * get_state(PyObject * self, PyObject * args)
 {
 	int unused = 0;
+	struct quisk_udp_stats udp;
 
 	if (args && !PyArg_ParseTuple (args, ""))	// args=NULL internal call
 		return NULL;
-	return  Py_BuildValue("iiiiisisiiiiiiiii",
+	quisk_udp_rx_get_stats(&udp);
+	return  Py_BuildValue("iiiiisisiiiiiiiiiiiiiiiiii",
 		quisk_sound_state.rate_min,
 		quisk_sound_state.rate_max,
 		quisk_sound_state.sample_rate,
@@ -719,7 +429,16 @@ static PyObject * get_state(PyObject * self, PyObject * args)
 		quisk_sound_state.interupts,
 		fft_error,
 		mic_max_display,
-		quisk_sound_state.data_poll_usec
+		quisk_sound_state.data_poll_usec,
+		fftRing ? fftRing->nslots : 0,			// fft ring depth
+		fftRing ? quisk_fft_ring_used(fftRing) : 0,	// full blocks now
+		fftRing ? fftRing->max_used : 0,		// maximum full blocks
+		fftRing ? fftRing->blocks_dropped : 0,		// blocks of samples discarded
+		udp.depth,					// UDP jitter buffer depth
+		udp.buffered,				// UDP packets in the jitter buffer now
+		udp.lost,					// UDP packets lost and filled
+		udp.late,					// UDP packets too late to use
+		udp.reordered				// UDP packets out of order
 		);
 }
 
@@ -754,9 +473,9 @@ static PyObject * add_tone(PyObject * self, PyObject * args)
 	if (!PyArg_ParseTuple (args, "i", &freq))
 		return NULL;
 	if (freq && sample_rate)
-		testtonePhase = cexp((I * 2.0 * M_PI * freq) / sample_rate);
+		testtoneDelta = 2.0 * M_PI * freq / sample_rate;
 	else
-		testtonePhase = 0;
+		testtoneDelta = 0;
 	Py_INCREF (Py_None);
 	return Py_None;
 }
@@ -792,6 +511,9 @@ static PyObject * open_rx_udp(PyObject * self, PyObject * args)
 	}
 #endif
 	quisk_use_rx_udp = 1;
+	rx_udp_jitter = QuiskGetConfigLong("rx_udp_jitter_packets", 8);
+	rx_udp_gap_fill = QuiskGetConfigLong("rx_udp_gap_fill", 1);
+	rx_udp_rcvbuf = QuiskGetConfigLong("rx_udp_rcvbuf", 1048576);
 	rx_udp_socket = socket(PF_INET, SOCK_DGRAM, 0);
 	if (rx_udp_socket != INVALID_SOCKET) {
 		Addr.sin_family = AF_INET;
@@ -824,6 +546,7 @@ static PyObject * close_rx_udp(PyObject * self, PyObject * args)
 	if (!PyArg_ParseTuple (args, ""))
 		return NULL;
 
+	quisk_udp_rx_stop();		// stop the receive thread
 	if (rx_udp_socket != INVALID_SOCKET) {
 		shutdown(rx_udp_socket, QUISK_SHUT_RD);
 		send(rx_udp_socket, (char *)&msg, 2, 0);
@@ -845,11 +568,7 @@ static PyObject * close_rx_udp(PyObject * self, PyObject * args)
 
 int quisk_read_rx_udp(complex * samp)	// Read samples from UDP
 {		// Size of complex sample array is SAMP_BUFFER_SIZE
-	ssize_t bytes;
 	unsigned char buf[1500];	// Maximum Ethernet is 1500 bytes.
-	static unsigned char seq0;	// must be 8 bits
-	int i, count, nSamples, xr, xi, index;
-	unsigned char * ptxr, * ptxi;
 	struct timeval tm = {0, 5000};
 	fd_set fds;
 
@@ -874,9 +593,11 @@ int quisk_read_rx_udp(complex * samp)	// Read samples from UDP
 		FD_ZERO (&fds);
 		FD_SET (rx_udp_socket, &fds);
 		if (select (rx_udp_socket + 1, &fds, NULL, NULL, &tm) == 1) {	// see if data is available
-			bytes = recv(rx_udp_socket, buf, 1500,  0);	// throw away the first block
-			seq0 = buf[0] + 1;	// Next expected sequence number
+			recv(rx_udp_socket, buf, 1500,  0);	// throw away the first block
 			rx_udp_started = 1;
+			// a thread receives the packets from now on
+			if ( ! quisk_udp_rx_start(rx_udp_socket, rx_udp_jitter, rx_udp_gap_fill, rx_udp_rcvbuf))
+				strncpy(quisk_sound_state.err_msg, "Failed to start the UDP receive thread", QUISK_SC_SIZE);
 		}
 		else {		// send our return address to the sample source
 			buf[0] = buf[1] = 0x72;	// UDP command "register return address"
@@ -884,78 +605,18 @@ int quisk_read_rx_udp(complex * samp)	// Read samples from UDP
 			return 0;
 		}
 	}
-	nSamples = 0;
-	for (count = 0; count < rx_udp_read_blocks; count++) {		// read several UDP blocks
-		bytes = recv(rx_udp_socket, buf, 1500,  0);	// blocking read
-		if (bytes != RX_UDP_SIZE) {		// Known size of sample block
-			quisk_sound_state.read_error++;
-			continue;
-		}
-		// buf[0] is the sequence number
-		// buf[1] is the status:
-		//		bit 0:  key up/down state
-		//		bit 1:	set for ADC overrange (clip)
-		if (buf[0] != seq0) {
-			// printf("Drop %d %d\n", seq0, buf[0]);
-			quisk_sound_state.read_error++;
-		}
-		seq0 = buf[0] + 1;		// Next expected sequence number
-		quisk_set_key_down(buf[1] & 0x01);	// bit zero is key state
-		if (buf[1] & 0x02)					// bit one is ADC overrange
-			quisk_sound_state.overrange++;
-		index = 2;
-		ptxr = (unsigned char *)&xr;
-		ptxi = (unsigned char *)&xi;
-		// convert 24-bit samples to 32-bit samples; int must be 32 bits.
-		if (is_little_endian) {
-			while (index < bytes) {
-				xr = xi = 0;
-				memcpy (ptxr + 1, buf + index, 3);
-				index += 3;
-				memcpy (ptxi + 1, buf + index, 3);
-				index += 3;
-				samp[nSamples++] = xr + xi * I;
-				xr = xi = 0;
-				memcpy (ptxr + 1, buf + index, 3);
-				index += 3;
-				memcpy (ptxi + 1, buf + index, 3);
-				index += 3;
-				samp[nSamples++] = xr + xi * I;
-	//if (nSamples == 2) printf("%12d %12d\n", xr, xi);
-			}
-		}
-		else {		// big-endian
-			while (index < bytes) {
-				*(ptxr    ) = buf[index + 2];
-				*(ptxr + 1) = buf[index + 1];
-				*(ptxr + 2) = buf[index    ];
-				*(ptxr + 3) = 0;
-				index += 3;
-				*(ptxi    ) = buf[index + 2];
-				*(ptxi + 1) = buf[index + 1];
-				*(ptxi + 2) = buf[index    ];
-				*(ptxi + 3) = 0;
-				index += 3;
-				samp[nSamples++] = xr + xi * I;
-				*(ptxr    ) = buf[index + 2];
-				*(ptxr + 1) = buf[index + 1];
-				*(ptxr + 2) = buf[index    ];
-				*(ptxr + 3) = 0;
-				index += 3;
-				*(ptxi    ) = buf[index + 2];
-				*(ptxi + 1) = buf[index + 1];
-				*(ptxi + 2) = buf[index    ];
-				*(ptxi + 3) = 0;
-				index += 3;
-				samp[nSamples++] = xr + xi * I;
-			}
-		}
-	}
-	for (i = 0; i < nSamples; i++) {	// correct for DC offset of ADC
-		samp[i] *= rx_udp_gain_correct;
-		samp[i] += (1.0 + 1.0I) * DC_OFFSET_ADC;  //(150000.0 + audioVolume * 20000.0);
-	}
-	return nSamples;
+	rx_udp_dev.num_channels = 2;
+	rx_udp_dev.channel_I = 0;
+	rx_udp_dev.channel_Q = 1;
+	rx_udp_dev.frontend = QUISK_FE_GAIN;
+	if (quisk_invert_spectrum)
+		rx_udp_dev.frontend |= QUISK_FE_INVERT;
+	rx_udp_dev.frontend_gain = rx_udp_gain_correct;
+	rx_udp_dev.frontend_offset = DC_OFFSET_ADC;
+	// Take the packets in order from the jitter buffer.  The receive thread checks the
+	// size and sequence number of each packet.  Convert the 24-bit little-endian samples to
+	// 32-bit samples, and correct the gain and the DC offset of the ADC.
+	return quisk_udp_rx_read(&rx_udp_dev, samp, rx_udp_read_blocks);
 }
 
 static PyObject * open_sound(PyObject * self, PyObject * args)
@@ -979,12 +640,15 @@ static PyObject * open_sound(PyObject * self, PyObject * args)
 	quisk_sound_state.playback_rate = QuiskGetConfigLong("playback_rate", 48000);
 	quisk_mic_preemphasis = QuiskGetConfigDouble("mic_preemphasis", 0.6);
 	quisk_mic_clip = QuiskGetConfigDouble("mic_clip", 3.0);
+	quisk_resample_quality = QuiskGetConfigLong("resample_quality", 2);
 	strncpy(quisk_sound_state.dev_capt_name, capt, QUISK_SC_SIZE);
 	strncpy(quisk_sound_state.dev_play_name, play, QUISK_SC_SIZE);
 	strncpy(quisk_sound_state.mic_dev_name, mname, QUISK_SC_SIZE);
 	strncpy(quisk_sound_state.name_of_mic_play, mpname, QUISK_SC_SIZE);
 	strncpy(quisk_sound_state.mic_ip, mip, IP_SIZE);
 	fft_error = 0;
+	if (fftRing)	// the sound thread is not running
+		fftRing->overflows = fftRing->blocks_dropped = fftRing->max_used = 0;
 	quisk_open_sound();
 	quisk_open_mic();
 	sample_rate = quisk_sound_state.sample_rate;
@@ -997,6 +661,9 @@ static PyObject * close_sound(PyObject * self, PyObject * args)
 		return NULL;
 	quisk_close_mic();
 	quisk_close_sound();
+	quisk_workers_stop();
+	StopSpectrumThread();
+	quisk_filter_prewarm_stop();
 	quisk_close_key();
 	Py_INCREF (Py_None);
 	return Py_None;
@@ -1059,87 +726,24 @@ static PyObject * invert_spectrum(PyObject * self, PyObject * args)
 
 static PyObject * set_agc(PyObject * self, PyObject * args)
 {  /* Change the AGC parameters */
-	if (!PyArg_ParseTuple (args, "idd", &agcInUse, &agcAttack, &agcRelease))
+	int in_use;
+	double attack, release;
+
+	if (!PyArg_ParseTuple (args, "idd", &in_use, &attack, &release))
 		return NULL;
-	agcGain = 0.0;
+	quisk_rx_set_agc(in_use, attack, release);
 	Py_INCREF (Py_None);
 	return Py_None;
 }
 
 static PyObject * set_filters(PyObject * self, PyObject * args)
-{  // Enter the coefficients of the I and Q digital filters.  The storage for
-   // filters is not malloc'd because filters may be changed while being used.
+{  // Enter the coefficients of the I and Q digital filters of the main receiver.
 	PyObject * filterI, * filterQ;
-	int i, size;
-	PyObject * obj;
-	char buf98[98];
 
 	if (!PyArg_ParseTuple (args, "OOi", &filterI, &filterQ, &filter_bandwidth))
 		return NULL;
-	if (PySequence_Check(filterI) != 1) {
-		PyErr_SetString (QuiskError, "Filter I is not a sequence");
-		return NULL;
-	}
-	if (PySequence_Check(filterQ) != 1) {
-		PyErr_SetString (QuiskError, "Filter Q is not a sequence");
-		return NULL;
-	}
-	size = PySequence_Size(filterI);
-	if (size != PySequence_Size(filterQ)) {
-		PyErr_SetString (QuiskError, "The size of filters I and Q must be equal");
-		return NULL;
-	}
-	if (size >= MAX_FILTER_SIZE) {
-		snprintf(buf98, 98, "Filter size must be less than %d", MAX_FILTER_SIZE);
-		PyErr_SetString (QuiskError, buf98);
-		return NULL;
-	}
-	for (i = 0; i < size; i++) {
-		obj = PySequence_GetItem(filterI, i);
-		cFilterI[i] = PyFloat_AsDouble(obj);
-		Py_XDECREF(obj);
-		obj = PySequence_GetItem(filterQ, i);
-		cFilterQ[i] = PyFloat_AsDouble(obj);
-		Py_XDECREF(obj);
-	}
-	indexFilter = 0;
-	sizeFilter = size;
-	Py_INCREF (Py_None);
-	return Py_None;
-}
-
-PyObject * set_fm_filters(PyObject * self, PyObject * args)
-{  // Enter the coefficients of the audio filter for FM
-   // Storage space is malloc'd.
-	PyObject * filterI;
-	int i, size;
-	PyObject * obj;
-
-	if (!PyArg_ParseTuple (args, "O", &filterI))
-		return NULL;
-	if (PySequence_Check(filterI) != 1) {
-		PyErr_SetString (PyExc_TypeError, "FM filter is not a sequence");
+	if (quisk_rx_set_filters(quisk_rx_get(0), filterI, filterQ))
 		return NULL;
-	}
-
-	if (fmFilterSize) {
-		free (fmFilterI);
-		free (fmFilterBufI);
-		fmFilterSize = 0;
-	}
-	size = PySequence_Size(filterI);
-    if (size) {
-		fmFilterSize = size;
-		i = size * sizeof(double);
-		fmFilterI =    (double *)malloc(i);
-		fmFilterBufI = (double *)malloc(i);
-		memset(fmFilterBufI, 0, i);
-		for (i = 0; i < size; i++) {
-			obj = PySequence_GetItem(filterI, i);
-			fmFilterI[i] = PyFloat_AsDouble(obj);
-			Py_XDECREF(obj);
-		}
-	}
 	Py_INCREF (Py_None);
 	return Py_None;
 }
@@ -1156,6 +760,7 @@ static PyObject * set_rx_mode(PyObject * self, PyObject * args)
 {
 	if (!PyArg_ParseTuple (args, "i", &rxMode))
 		return NULL;
+	quisk_rx_get(0)->mode = rxMode;
 	quisk_set_tx_mode();
 	Py_INCREF (Py_None);
 	return Py_None;
@@ -1165,10 +770,7 @@ static PyObject * set_tune(PyObject * self, PyObject * args)
 {  /* Change the tuning frequency */
 	if (!PyArg_ParseTuple (args, "ii", &rx_tune_freq, &quisk_tx_tune_freq))
 		return NULL;
-	if (rx_tune_freq)
-		tunePhase = cexp((I * -2.0 * M_PI * rx_tune_freq) / sample_rate);
-	else
-		tunePhase = 0;
+	quisk_rx_get(0)->tune_freq = rx_tune_freq;
 	Py_INCREF (Py_None);
 	return Py_None;
 }
@@ -1179,7 +781,7 @@ static PyObject * set_sidetone(PyObject * self, PyObject * args)
 
 	if (!PyArg_ParseTuple (args, "did", &sidetoneVolume, &rit_freq, &delay))
 		return NULL;
-	sidetonePhase = cexp((I * 2.0 * M_PI * abs(rit_freq)) / quisk_sound_state.playback_rate);
+	sidetoneDelta = 2.0 * M_PI * abs(rit_freq) / quisk_sound_state.playback_rate;
 	keyupDelay = (int)(quisk_sound_state.playback_rate *1e-3 * delay + 0.5);
 	Py_INCREF (Py_None);
 	return Py_None;
@@ -1187,8 +789,11 @@ static PyObject * set_sidetone(PyObject * self, PyObject * args)
 
 static PyObject * set_volume(PyObject * self, PyObject * args)
 {
-	if (!PyArg_ParseTuple (args, "d", &audioVolume))
+	double volume;
+
+	if (!PyArg_ParseTuple (args, "d", &volume))
 		return NULL;
+	quisk_rx_get(0)->volume = volume;
 	Py_INCREF (Py_None);
 	return Py_None;
 }
@@ -1204,47 +809,37 @@ static PyObject * set_key_down(PyObject * self, PyObject * args)
 	return Py_None;
 }
 
-static PyObject * get_graph(PyObject * self, PyObject * args)
-{
-	int i, j, k, n;
-	fft_data * ptFft;
-	PyObject * tuple2;
-	double d2, scale, zoom, deltaf;
-	complex c;
-	static double meter = 0;	// RMS s-meter
-	static int use_fft = 1;		// Use the FFT, or return raw data
+static double * GetOutputBuffer(PyObject * obj, int count)
+{	// Return the data of a writable buffer such as array.array('d') or a NumPy array of
+	// doubles, or set an exception and return NULL.  The buffer must hold at least count
+	// doubles.  This lets the GUI reuse one buffer instead of making a Python float for
+	// each value.
+	void * buffer;
+	Py_ssize_t length;
 
-	if (!PyArg_ParseTuple (args, "idd", &k, &zoom, &deltaf))
+	if (PyObject_AsWriteBuffer(obj, &buffer, &length) != 0)
+		return NULL;
+	if (length < (Py_ssize_t)(count * sizeof(double))) {
+		PyErr_Format(QuiskError, "Output buffer is too small; it needs %d doubles", count);
 		return NULL;
-	if (k != use_fft) {		// change in data return type; re-initialize
-		use_fft = k;
-		count_fft = 0;
-	}
-	// Look for an fft ready to run.
-	for (i = 0, ptFft = ptWriteFft; i < 3; i++, ptFft = ptFft->next) {
-		if (ptFft->status == READY)
-			break;
-	}
-	if (i >= 3) {	// no fft was ready
-		Py_INCREF(Py_None);
-		return Py_None;
 	}
-	if ( ! use_fft) {		// return raw data, not FFT
-		tuple2 = PyTuple_New(data_width);
-		for (i = 0; i < data_width; i++)
-			PyTuple_SetItem(tuple2, i,
-				PyComplex_FromDoubles(creal(ptFft->samples[i]), cimag(ptFft->samples[i])));
-		ptFft->status = EMPTY;
-		return tuple2;
-	}
-	// Continue with FFT calculation
-	for (i = 0; i < fft_size; i++)	// multiply by window
-		ptFft->samples[i] *= fft_window[i];
-	fftw_execute(ptFft->plan);	// Calculate FFT
+	return (double *)buffer;
+}
+
+static void FftAverage(double srate, double tune)
+{	// Calculate the FFT of fft_block, add its power in the filter bandwidth to the s-meter,
+	// and add its magnitude to fft_avg in order of frequency.  The samples have rate
+	// srate, and tune is the transmit frequency relative to their center.
+	int i, j, k, n;
+	double d2, scale;
+	complex c;
+	fftw_complex * samples = fft_block;
+
+	fftw_execute_dft(fft_plan, samples, samples);	// Calculate FFT
 	// Create RMS s-meter value at known bandwidth
 	// d2 is the number of FFT bins required for the bandwidth
-	// i is the starting bin number from  - sample_rate / 2 to + sample_rate / 2
-	d2 = (double)filter_bandwidth * fft_size / sample_rate;
+	// i is the starting bin number from  - srate / 2 to + srate / 2
+	d2 = (double)filter_bandwidth * fft_size / srate;
 	n = (int)(floor(d2) + 0.01);		// number of whole bins to add
 	switch(rxMode) {
 	case 0:		// CWL:  signal centered in bandwidth
@@ -1252,179 +847,486 @@ static PyObject * get_graph(PyObject * self, PyObject * args)
 	case 4:		// AM
 	case 5:		// FM
 	default:
-		i = (int)((double)quisk_tx_tune_freq * fft_size / sample_rate - d2 / 2 + 0.5);
+		i = (int)(tune * fft_size / srate - d2 / 2 + 0.5);
 		break;
 	case 2:		// LSB:  bandwidth is below tx frequency
-		i = (int)((double)quisk_tx_tune_freq * fft_size / sample_rate - d2 + 0.5);
+		i = (int)(tune * fft_size / srate - d2 + 0.5);
 		break;
 	case 3:		// USB:  bandwidth is above tx frequency
-		i = (int)((double)quisk_tx_tune_freq * fft_size / sample_rate + 0.5);
+		i = (int)(tune * fft_size / srate + 0.5);
 		break;
 	}
 	if (i > - fft_size / 2 && i + n + 1 < fft_size / 2) {	// too close to edge?
 		scale = 1.0 / 2147483647.0 / fft_size;
 		for (j = 0; j < n; i++, j++) {
 			if (i < 0)
-				c = ptFft->samples[fft_size + i];	// negative frequencies
+				c = samples[fft_size + i];	// negative frequencies
 			else
-				c = ptFft->samples[i];				// positive frequencies
+				c = samples[i];				// positive frequencies
 			c *= scale;					// scale to correct amplitude
 			meter += c * conj(c);		// add square of amplitude
 		}
 		if (i < 0)			// add fractional next bin
-			c = ptFft->samples[fft_size + i];
+			c = samples[fft_size + i];
 		else
-			c = ptFft->samples[i];
+			c = samples[i];
 		c *= scale;
 		meter += c * conj(c) * (d2 - n);	// fractional part of next bin
 	}
 	// Average the fft data into the graph in order of frequency
 	k = 0;
-	for (i = fft_size / 2; i < fft_size; i++)			// Negative frequencies
-		fft_avg[k++] += cabs(ptFft->samples[i]);
-	for (i = 0; i < fft_size / 2; i++)					// Positive frequencies
-		fft_avg[k++] += cabs(ptFft->samples[i]);
-	ptFft->status = EMPTY;
-	if (++count_fft < average_count) {
-		Py_INCREF(Py_None);	// No data yet
-		return Py_None;
+	if (avgShift) {		// add each block of bins into one point
+		for (i = fft_size / 2; i < fft_size; i++)			// Negative frequencies
+			fft_avg[k++ >> avgShift] += cabs(samples[i]);
+		for (i = 0; i < fft_size / 2; i++)					// Positive frequencies
+			fft_avg[k++ >> avgShift] += cabs(samples[i]);
+	}
+	else {
+		for (i = fft_size / 2; i < fft_size; i++)			// Negative frequencies
+			fft_avg[k++] += cabs(samples[i]);
+		for (i = 0; i < fft_size / 2; i++)					// Positive frequencies
+			fft_avg[k++] += cabs(samples[i]);
+	}
+}
+
+// The zoom-FFT gives more resolution when the graph is zoomed in.  Instead of adding
+// neighboring bins of the full FFT, the samples are tuned so that deltaf is at zero
+// Hertz, decimated by zoomDecim, and an FFT of fft_size is calculated on the narrow
+// stream.  The bins are then zoomDecim times narrower.  The decimator passband is
+// ZOOM_PASSBAND of the decimated rate, so the decimation is the largest integer that
+// keeps the zoomed graph within the passband.  Blocks overlap so that the graph
+// refresh rate is the same as for the full FFT.
+
+static void ZoomStart(void)
+{	// Start a new zoom-FFT, or return to the full FFT if zoomDecim is zero
+	int i, samps;
+
+	count_fft = 0;
+	meter = 0;
+	avgShift = 0;
+	for (i = 0; i < fft_size; i++)
+		fft_avg[i] = 0;
+	zoomCount = 0;
+	if ( ! zoomDecim)
+		return;
+	quisk_nco_init(&zoomNco, -2.0 * M_PI * zoomDeltaf / zoomRate, 1.0);
+	zoomDecimator.idecim = 0;		// plan new filters with empty delay lines
+	samps = average_count * fftRing->hop / zoomDecim;	// decimated samples for each graph
+	zoomAverage = (int)((double)samps / fft_size + 0.5);
+	if (zoomAverage < 1)
+		zoomAverage = 1;
+	zoomHop = samps / zoomAverage;
+	if (zoomHop < 1)
+		zoomHop = 1;
+	else if (zoomHop > fft_size)
+		zoomHop = fft_size;
+}
+
+static int ZoomFft(void)
+{	// Read new samples from the ring, tune zoomDeltaf to zero, decimate by zoomDecim, and
+	// calculate an FFT for each block.  Return 1 when zoomAverage FFT's are averaged, or
+	// 0 if more samples are needed.
+	static complex chunk[ZOOM_CHUNK];
+	int i, n;
+
+	while (1) {
+		while (zoomCount >= fft_size) {
+			for (i = 0; i < fft_size; i++)	// multiply by window
+				fft_block[i] = zoomSamples[i] * fft_window[i];
+			FftAverage((double)zoomRate / zoomDecim, quisk_tx_tune_freq - zoomDeltaf);
+			zoomCount -= zoomHop;
+			memmove(zoomSamples, zoomSamples + zoomHop, zoomCount * sizeof(complex));
+			if (++count_fft >= zoomAverage)
+				return 1;
+		}
+		n = quisk_fft_ring_read_stream(fftRing, chunk, ZOOM_CHUNK);
+		if (n < 0) {		// samples were lost; start a new block
+			zoomCount = 0;
+			continue;
+		}
+		if (n == 0)
+			return 0;
+		quisk_nco_mix(&zoomNco, chunk, n);
+		n = quisk_decimate(&zoomDecimator, chunk, n, zoomDecim);
+		memcpy(zoomSamples + zoomCount, chunk, n * sizeof(complex));
+		zoomCount += n;
+	}
+}
+
+static void PublishFrame(struct spectrum_frame * frame)
+{	// Give the finished frame to the GUI
+	QUISK_MEMORY_BARRIER();		// finish the frame before the count
+	frames_published++;
+}
+
+static int SpectrumFrame(void)
+{	// Calculate the next graph frame from the sample ring, and publish it for get_graph().
+	// Return 1 if a frame was published, or 0 if more samples are needed or the GUI has
+	// not taken the last frame.  Only one thread may call this.
+	int i, j, k, n, navg, use_fft, blocks;
+	double d2, scale, zoom, deltaf, t0;
+	struct spectrum_frame * frame;
+	static int last_use_fft = 1;
+
+	if (frames_published != frames_taken)	// the GUI may still be reading the last frame
+		return 0;
+	frame = frames + ((frames_published + 1) & 1);		// the frame the GUI is not using
+	use_fft = graphUseFft;
+	zoom = graphZoom;
+	deltaf = graphDeltaf;
+	if (use_fft != last_use_fft) {		// change in data return type; re-initialize
+		last_use_fft = use_fft;
+		count_fft = 0;
+	}
+	frame->use_fft = use_fft;
+	if ( ! use_fft) {		// return raw data, not FFT
+		if ( ! quisk_fft_ring_read(fftRing, fft_block, NULL))	// no block was ready
+			return 0;
+		memcpy(frame->data, fft_block, data_width * sizeof(complex));
+		PublishFrame(frame);
+		return 1;
+	}
+	t0 = QuiskTimeSec();
+	// Use the zoom-FFT if the graph is zoomed in enough to decimate
+	k = use_zoom_fft ? (int)(ZOOM_PASSBAND / zoom) : 0;
+	if (k < 2)
+		k = 0;
+	if (k != zoomDecim || deltaf != zoomDeltaf || sample_rate != zoomRate) {
+		zoomDecim = k;
+		zoomDeltaf = deltaf;
+		zoomRate = sample_rate;
+		ZoomStart();
+		peakReset = 1;		// the frequency axis changed
+	}
+	if (zoomDecim) {
+		i = ZoomFft();
+		quisk_stage_end(QUISK_STAGE_FFT, t0);
+		if ( ! i)
+			return 0;
+		navg = zoomAverage;
+		zoom *= zoomDecim;		// the graph is this fraction of the zoom-FFT
+		deltaf = 0;				// and is centered
+	}
+	else {
+		if (count_fft == 0) {
+			// A large FFT has many bins for each pixel.  Add blocks of bins as they are
+			// averaged, so the graph is made from a shorter array.  A block is at most an
+			// eighth of a pixel, so the pixel edges are still accurate.
+			n = (int)(zoom * (double)fft_size / data_width);
+			for (avgShift = 0; 16 << avgShift <= n; avgShift++)
+				;
+		}
+		while (count_fft < average_count) {
+			// Copy the next block multiplied by the window
+			if ( ! quisk_fft_ring_read(fftRing, fft_block, fft_window)) {	// no fft was ready
+				quisk_stage_end(QUISK_STAGE_FFT, t0);
+				return 0;
+			}
+			FftAverage(sample_rate, quisk_tx_tune_freq);
+			count_fft++;
+		}
+		quisk_stage_end(QUISK_STAGE_FFT, t0);
+		navg = average_count;
 	}
 	// We have averaged enough fft's to return the graph data.
 	// Average the fft data of size fft_size into the size of data_width.
 	n = (int)(zoom * (double)fft_size / data_width + 0.5);
 	if (n < 1)
 		n = 1;
+	blocks = (n + (1 << avgShift) / 2) >> avgShift;		// number of blocks for each pixel
+	if (blocks < 1)
+		blocks = 1;
 	for (i = 0; i < data_width; i++) {	// For each graph pixel
 		// find k, the starting index into the FFT data
 		k = (int)(fft_size * (
 			deltaf / sample_rate + zoom * ((double)i / data_width - 0.5) + 0.5) + 0.1);
+		k >>= avgShift;
 		d2 = 0.0;
-		for (j = 0; j < n; j++, k++)
-			if (k >= 0 && k < fft_size)
+		for (j = 0; j < blocks; j++, k++)
+			if (k >= 0 && k < fft_size >> avgShift)
 				d2 += fft_avg[k];
 		fft_avg[i] = d2;
 	}
-	Smeter = meter / average_count;		// record the new s-meter value
+	d2 = meter / navg;		// record the new s-meter value
 	meter = 0;
-	if (Smeter > 0)
-		Smeter = 10.0 * log10(Smeter);
+	if (d2 > 0)
+		d2 = 10.0 * log10(d2);
 	else
-		Smeter = -140.0;
-	Smeter += 4.25969;		// Origin of this correction is unknown
+		d2 = -140.0;
+	frame->smeter = d2 + 4.25969;		// Origin of this correction is unknown
 	count_fft = 0;
-	tuple2 = PyTuple_New(data_width);
-	scale = 1.0 / average_count / fft_size;	// Divide by sample count
+	scale = 1.0 / navg / fft_size;	// Divide by sample count
 	scale /= pow(2.0, 31);			// Normalize to max == 1
-	for (i = 0, k = 0; k < data_width; k++, i++) {
+	for (k = 0; k < data_width; k++) {
 		d2 = log10(fft_avg[k] * scale);
 		if (d2 < -10)
 			d2 = -10;
-		PyTuple_SetItem(tuple2, i, PyFloat_FromDouble(20.0 * d2));
+		frame->data[k] = 20.0 * d2;
 	}
-	for (i = 0; i < fft_size; i++)
+	// The peak hold graph falls by at most peakDecay dB for each frame
+	d2 = peakDecay;
+	for (k = 0; k < data_width; k++) {
+		if (peakReset || peakHold[k] - d2 < frame->data[k])
+			peakHold[k] = frame->data[k];
+		else
+			peakHold[k] -= d2;
+		frame->peak[k] = peakHold[k];
+	}
+	peakReset = 0;
+	n = ((fft_size - 1) >> avgShift) + 1;	// clear the blocks that were used
+	if (n < data_width)
+		n = data_width;
+	for (i = 0; i < n; i++)
 		fft_avg[i] = 0;
-	return tuple2;
+	PublishFrame(frame);
+	return 1;
 }
 
-static PyObject * get_filter(PyObject * self, PyObject * args)
+static void SpectrumThread(void * unused)
+{	// Calculate graph frames until told to quit
+	while ( ! spectrumQuit) {
+		if ( ! SpectrumFrame())
+			QuiskSleepMicrosec(SPECTRUM_POLL_USEC);
+	}
+}
+
+static void StopSpectrumThread(void)
 {
-	int i, j, k, n;
-	int freq, time;
-	PyObject * tuple2;
-	complex cx;
-	double d2, scale, accI, accQ;
-	double * average, * bufI, * bufQ;
-	fft_data * FFT;
-	fftw_complex * pt;
-	double phase, delta;
+	if (spectrumThread) {
+		spectrumQuit = 1;
+		quisk_thread_join(spectrumThread);
+		spectrumThread = NULL;
+	}
+}
 
-	if (!PyArg_ParseTuple (args, ""))
+static PyObject * get_graph(PyObject * self, PyObject * args)
+{	// Return the graph data as a tuple, or write it into the optional buffer and return
+	// the buffer.  Return None if there is no new data.  For the FFT the data is data_width
+	// doubles, and for raw data it is data_width complex samples as pairs of doubles.  The
+	// optional peakbuf of data_width doubles receives the graph data with peak hold.
+	// The spectrum thread calculates the frames; without it, they are calculated here.
+	int k, i;
+	unsigned int seen;
+	PyObject * tuple2, * pybuf = NULL, * pypeak = NULL;
+	double zoom, deltaf;
+	double * outbuf = NULL, * peakbuf = NULL;
+	struct spectrum_frame * frame;
+
+	if (!PyArg_ParseTuple (args, "idd|OO", &k, &zoom, &deltaf, &pybuf, &pypeak))
 		return NULL;
-
-	// Create space for the fft of size data_width
-	FFT = (fft_data *)malloc(sizeof(fft_data));
-	FFT->status = EMPTY;
-	FFT->index = 0;
-	pt = FFT->samples = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * data_width);
-	FFT->plan = fftw_plan_dft_1d(data_width, pt, pt, FFTW_FORWARD, FFTW_MEASURE);
-	average = (double *) malloc(sizeof(double) * (data_width + sizeFilter));
-	bufI = (double *) malloc(sizeof(double) * sizeFilter);
-	bufQ = (double *) malloc(sizeof(double) * sizeFilter);
-
-	for (i = 0; i < data_width + sizeFilter; i++)
-		average[i] = 0.5;	// Value for freq == 0
-	for (freq = 1; freq < data_width / 2.0 - 10.0; freq++) {
-		delta = 2 * M_PI / data_width * freq;
-		phase = 0;
-		// generate some initial samples to fill the filter pipeline
-		for (time = 0; time < data_width + sizeFilter; time++) {
-			average[time] += cos(phase);	// current sample
-			phase += delta;
-			if (phase > 2 * M_PI)
-				phase -= 2 * M_PI;
+	if (pybuf && pybuf != Py_None) {
+		outbuf = GetOutputBuffer(pybuf, k ? data_width : data_width * 2);
+		if ( ! outbuf)
+			return NULL;
+	}
+	if (k && pypeak && pypeak != Py_None) {
+		peakbuf = GetOutputBuffer(pypeak, data_width);
+		if ( ! peakbuf)
+			return NULL;
+	}
+	graphUseFft = k;	// requests for the next frame
+	graphZoom = zoom;
+	graphDeltaf = deltaf;
+	if ( ! spectrumThread) {	// Calculate the frame now.  Release the GIL so the sound thread can run.
+Py_BEGIN_ALLOW_THREADS
+		SpectrumFrame();
+Py_END_ALLOW_THREADS
+	}
+	seen = frames_published;
+	if (seen == frames_taken) {		// no new frame
+		Py_INCREF(Py_None);
+		return Py_None;
+	}
+	QUISK_MEMORY_BARRIER();			// read the count before the frame
+	frame = frames + (seen & 1);
+	if (frame->use_fft != k) {		// the frame is the wrong type; discard it
+		frames_taken = seen;
+		Py_INCREF(Py_None);
+		return Py_None;
+	}
+	if ( ! k) {		// raw data
+		if (outbuf) {
+			memcpy(outbuf, frame->data, data_width * sizeof(complex));
+			Py_INCREF(pybuf);
+			tuple2 = pybuf;
+		}
+		else {
+			tuple2 = PyTuple_New(data_width);
+			for (i = 0; i < data_width; i++)
+				PyTuple_SetItem(tuple2, i,
+					PyComplex_FromDoubles(frame->data[2 * i], frame->data[2 * i + 1]));
 		}
 	}
-	// now filter the signal
-	n = 0;
-	for (time = 0; time < data_width + sizeFilter; time++) {
-		d2 = average[time];
-		bufI[n] = d2;
-		bufQ[n] = d2;
-		accI = accQ = 0;
-		j = n;
-		for (k = 0; k < sizeFilter; k++) {
-			accI += bufI[j] * cFilterI[k];
-			accQ += bufQ[j] * cFilterQ[k];
-			if (++j >= sizeFilter)
-				j = 0;
+	else {
+		Smeter = frame->smeter;
+		if (peakbuf)
+			memcpy(peakbuf, frame->peak, data_width * sizeof(double));
+		if (outbuf) {
+			memcpy(outbuf, frame->data, data_width * sizeof(double));
+			Py_INCREF(pybuf);
+			tuple2 = pybuf;
+		}
+		else {
+			tuple2 = PyTuple_New(data_width);
+			for (i = 0; i < data_width; i++)
+				PyTuple_SetItem(tuple2, i, PyFloat_FromDouble(frame->data[i]));
 		}
-		cx = accI + I * accQ;	// Filter output
-		if (++n >= sizeFilter)
-			n = 0;
-		if (time >= sizeFilter)
-			FFT->samples[time - sizeFilter] = cx;
-	}
-
-	for (i = 0; i < data_width; i++)	// multiply by window
-		FFT->samples[i] *= fft_window[i];
-	fftw_execute(FFT->plan);		// Calculate FFT
-	// Normalize and convert to log10
-	scale = 1. / data_width;
-	for (k = 0; k < data_width; k++) {
-		cx = FFT->samples[k];
-		average[k] = cabs(cx) * scale;
-		if (average[k] <= 1e-7)		// limit to -140 dB
-			average[k] = -7;
-		else
-			average[k] = log10(average[k]);
 	}
-	// Return the graph data
-	tuple2 = PyTuple_New(data_width);
-	i = 0;
-	// Negative frequencies:
-	for (k = data_width / 2; k < data_width; k++, i++)
-		PyTuple_SetItem(tuple2, i, PyFloat_FromDouble(20.0 * average[k]));
-
-	// Positive frequencies:
-	for (k = 0; k < data_width / 2; k++, i++)
-		PyTuple_SetItem(tuple2, i, PyFloat_FromDouble(20.0 * average[k]));
-
-	free(bufQ);
-	free(bufI);
-	free(average);
-	fftw_destroy_plan(FFT->plan);
-	fftw_free(FFT->samples);
-	free(FFT);
+	QUISK_MEMORY_BARRIER();			// finish with the frame before the count
+	frames_taken = seen;
+	return tuple2;
+}
 
+static PyObject * get_filter(PyObject * self, PyObject * args)
+{	// Return the filter response as a tuple, or write it into the optional buffer of
+	// data_width doubles and return the buffer.  The response is the FFT of the impulse
+	// response of the I and Q filters, and it is saved until the filter changes.  For AM
+	// and FM the I and Q filters are the same real filter, and only filter I is used.
+	int i, k, sizeFilter, is_real;
+	PyObject * tuple2, * pybuf = NULL;
+	double d2;
+	double * outbuf = NULL;
+	double * cFilterI, * cFilterQ;
+	fftw_complex * samples;
+	struct quisk_rx * rx;
+	static double * response;		// the saved response in order of frequency
+	static int response_width;
+	static int response_serial = -1;
+
+	if (!PyArg_ParseTuple (args, "|O", &pybuf))
+		return NULL;
+	rx = quisk_rx_get(0);		// the main receiver
+	if (pybuf && pybuf != Py_None) {
+		outbuf = GetOutputBuffer(pybuf, data_width);
+		if ( ! outbuf)
+			return NULL;
+	}
+	if (response_serial != rx->filter_serial || response_width != data_width) {
+		response_serial = rx->filter_serial;
+		response_width = data_width;
+		if (response)
+			free(response);
+		response = (double *) malloc(sizeof(double) * data_width);
+		sizeFilter = rx->sizeFilter;
+		cFilterI = rx->cFilterI;
+		cFilterQ = rx->cFilterQ;
+		for (is_real = 1, i = 0; i < sizeFilter; i++) {
+			if (cFilterI[i] != cFilterQ[i]) {
+				is_real = 0;
+				break;
+			}
+		}
+		if (is_real)	// the Q filter would add 3 dB to the gain
+			cFilterQ = NULL;
+		// The impulse response at delay i is filter[taps - i], because filter[0] multiplies
+		// the newest sample.  A filter longer than the FFT wraps around, so the FFT bins are
+		// still exact samples of the frequency response.
+		samples = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * data_width);
+		for (i = 0; i < data_width; i++)
+			samples[i] = 0;
+		if (sizeFilter > 0)
+			samples[0] = cFilterQ ? cFilterI[0] + I * cFilterQ[0] : cFilterI[0];
+		for (i = 1, k = 1; i < sizeFilter; i++) {
+			samples[k] += cFilterQ ? cFilterI[sizeFilter - i] + I * cFilterQ[sizeFilter - i] : cFilterI[sizeFilter - i];
+			if (++k >= data_width)
+				k = 0;
+		}
+		fftw_execute_dft(quisk_fft_plan(data_width, FFTW_FORWARD, 1), samples, samples);
+		// Convert to dB in order of frequency
+		i = 0;
+		for (k = data_width / 2; k < data_width * 3 / 2; k++, i++) {
+			d2 = cabs(samples[k % data_width]);
+			if (d2 <= 1e-7)		// limit to -140 dB
+				response[i] = -140.0;
+			else
+				response[i] = 20.0 * log10(d2);
+		}
+		fftw_free(samples);
+	}
+	// Return the graph data
+	if (outbuf) {
+		memcpy(outbuf, response, data_width * sizeof(double));
+		Py_INCREF(pybuf);
+		tuple2 = pybuf;
+	}
+	else {
+		tuple2 = PyTuple_New(data_width);
+		for (i = 0; i < data_width; i++)
+			PyTuple_SetItem(tuple2, i, PyFloat_FromDouble(response[i]));
+	}
 	return tuple2;
 }
 
-static PyObject * Xdft(PyObject * pyseq, int inverse, int window)
+static PyObject * waterfall_row(PyObject * self, PyObject * args)
+{	// Convert a row of graph data in dB to a string of RGB pixels for the waterfall.
+	// The data is a buffer of doubles or a sequence of numbers.  The palette is a string
+	// of 256 RGB entries, and the palette index is (data + offset) * scale.
+	PyObject * pydata, * obj, * row;
+	const char * palette;
+	const void * inbuf;
+	Py_ssize_t length;
+	int i, n, size, index, palette_size;
+	double offset, scale, d;
+	char * pixels;
+
+	if (!PyArg_ParseTuple (args, "Os#dd", &pydata, &palette, &palette_size, &offset, &scale))
+		return NULL;
+	if (palette_size != 256 * 3) {
+		PyErr_SetString (QuiskError, "The waterfall palette must have 256 RGB entries");
+		return NULL;
+	}
+	inbuf = NULL;
+	if ( ! PyString_Check(pydata) && ! PyUnicode_Check(pydata) && PyObject_CheckReadBuffer(pydata)) {
+		if (PyObject_AsReadBuffer(pydata, &inbuf, &length) != 0)
+			return NULL;
+		size = length / sizeof(double);
+	}
+	else if (PySequence_Check(pydata) != 1) {
+		PyErr_SetString (QuiskError, "Waterfall data is not a sequence");
+		return NULL;
+	}
+	else {
+		size = PySequence_Size(pydata);
+	}
+	row = PyString_FromStringAndSize(NULL, size * 3);
+	if ( ! row)
+		return NULL;
+	pixels = PyString_AS_STRING(row);
+	for (i = 0, n = 0; i < size; i++) {
+		if (inbuf) {
+			d = ((const double *)inbuf)[i];
+		}
+		else {
+			obj = PySequence_GetItem(pydata, i);
+			d = obj ? PyFloat_AsDouble(obj) : -1.0;
+			Py_XDECREF(obj);
+			if (d == -1.0 && PyErr_Occurred()) {
+				Py_DECREF(row);
+				return NULL;
+			}
+		}
+		index = (int)((d + offset) * scale);
+		if (index < 0)
+			index = 0;
+		else if (index > 255)
+			index = 255;
+		index *= 3;
+		pixels[n++] = palette[index];
+		pixels[n++] = palette[index + 1];
+		pixels[n++] = palette[index + 2];
+	}
+	return row;
+}
+
+static PyObject * Xdft(PyObject * pyseq, int inverse, int window, PyObject * pybuf)
 {  // Native spectral order is 0 Hz to (Fs - 1).  Change this to
    // - (Fs - 1)/2 to + Fs/2.  For even Fs==32, there are 15 negative
    // frequencies, a zero, and 16 positive frequencies.  For odd Fs==31,
    // there are 15 negative and positive frequencies plus zero frequency.
    // Note that zero frequency is always index (Fs - 1) / 2.
+   // The input is a sequence of numbers, or a buffer of complex numbers stored as
+   // pairs of doubles.  If pybuf is a writable buffer, the result is written there as
+   // pairs of doubles and pybuf is returned; otherwise a list of complex is returned.
 	PyObject * obj;
 	int i, j, size;
 	static int fft_size = -1;			// size of fft data
@@ -1432,25 +1334,43 @@ static PyObject * Xdft(PyObject * pyseq, int inverse, int window)
 	static fftw_plan planF, planB;		// fft plan for fftW
 	static double * fft_window;			// window function
 	Py_complex pycx;					// Python C complex value
+	const void * inbuf = NULL;
+	Py_ssize_t length;
+	complex * outbuf = NULL;
 
-	if (PySequence_Check(pyseq) != 1) {
+	if ( ! PyString_Check(pyseq) && ! PyUnicode_Check(pyseq) && PyObject_CheckReadBuffer(pyseq)) {
+		if (PyObject_AsReadBuffer(pyseq, &inbuf, &length) != 0)
+			return NULL;
+		size = length / sizeof(complex);
+	}
+	else if (PySequence_Check(pyseq) != 1) {
 		PyErr_SetString (QuiskError, "DFT input data is not a sequence");
 		return NULL;
 	}
-	size = PySequence_Size(pyseq);
-	if (size <= 0)
+	else {
+		size = PySequence_Size(pyseq);
+	}
+	if (pybuf && pybuf != Py_None) {
+		outbuf = (complex *)GetOutputBuffer(pybuf, size * 2);
+		if ( ! outbuf)
+			return NULL;
+	}
+	if (size <= 0) {
+		if (outbuf) {
+			Py_INCREF(pybuf);
+			return pybuf;
+		}
 		return PyTuple_New(0);
+	}
 	if (size != fft_size) {		// Change in previous size; malloc new space
 		if (fft_size > 0) {
-			fftw_destroy_plan(planF);
-			fftw_destroy_plan(planB);
 			fftw_free(samples);
 			free (fft_window);
 		}
 		fft_size = size;	// Create space for one fft
 		samples = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * fft_size);
-		planF = fftw_plan_dft_1d(fft_size, samples, samples, FFTW_FORWARD, FFTW_MEASURE);
-		planB = fftw_plan_dft_1d(fft_size, samples, samples, FFTW_BACKWARD, FFTW_MEASURE);
+		planF = quisk_fft_plan(fft_size, FFTW_FORWARD, 1);
+		planB = quisk_fft_plan(fft_size, FFTW_BACKWARD, 1);
 		fft_window = (double *) malloc(sizeof(double) * (fft_size + 1));
 		//for (i = 0, j = -fft_size / 2; i < fft_size; i++, j++) {
 		for (i = 0; i <= size/2; i++) {
@@ -1464,7 +1384,14 @@ static PyObject * Xdft(PyObject * pyseq, int inverse, int window)
 		}
 	}
 	j = (size - 1) / 2;		// zero frequency in input
-	for (i = 0; i < size; i++) {
+	if (inbuf) {
+		for (i = 0; i < size; i++) {
+			samples[i] = ((const complex *)inbuf)[j];
+			if (++j >= size)
+				j = 0;
+		}
+	}
+	else for (i = 0; i < size; i++) {
 		obj = PySequence_GetItem(pyseq, j);
 		if (PyComplex_Check(obj)) {
 			pycx = PyComplex_AsCComplex(obj);
@@ -1488,7 +1415,7 @@ static PyObject * Xdft(PyObject * pyseq, int inverse, int window)
 		Py_XDECREF(obj);
 	}
 	if (inverse) {		// Normalize using 1/N
-		fftw_execute(planB);		// Calculate inverse FFT / N
+		fftw_execute_dft(planB, samples, samples);		// Calculate inverse FFT / N
 		if (window) {
 			for (i = 0; i < fft_size; i++)	// multiply by window / N
 				samples[i] *= fft_window[i] / size;
@@ -1503,7 +1430,17 @@ static PyObject * Xdft(PyObject * pyseq, int inverse, int window)
 			for (i = 0; i < fft_size; i++)	// multiply by window
 				samples[i] *= fft_window[i];
 	   }
-		fftw_execute(planF);		// Calculate FFT
+		fftw_execute_dft(planF, samples, samples);		// Calculate FFT
+	}
+	if (outbuf) {
+		j = (size - 1) / 2;		// zero frequency in input
+		for (i = 0; i < fft_size; i++) {
+			outbuf[j] = samples[i];
+			if (++j >= size)
+				j = 0;
+		}
+		Py_INCREF(pybuf);
+		return pybuf;
 	}
 	pyseq = PyList_New(fft_size);
 	j = (size - 1) / 2;		// zero frequency in input
@@ -1519,30 +1456,30 @@ static PyObject * Xdft(PyObject * pyseq, int inverse, int window)
 
 static PyObject * dft(PyObject * self, PyObject * args)
 {
-	PyObject * tuple2;
+	PyObject * tuple2, * pybuf = NULL;
 	int window;
 
 	window = 0;
-	if (!PyArg_ParseTuple (args, "O|i", &tuple2, &window))
+	if (!PyArg_ParseTuple (args, "O|iO", &tuple2, &window, &pybuf))
 		return NULL;
-	return Xdft(tuple2, 0, window);
+	return Xdft(tuple2, 0, window, pybuf);
 }
 
 static PyObject * idft(PyObject * self, PyObject * args)
 {
-	PyObject * tuple2;
+	PyObject * tuple2, * pybuf = NULL;
 	int window;
 
 	window = 0;
-	if (!PyArg_ParseTuple (args, "O|i", &tuple2, &window))
+	if (!PyArg_ParseTuple (args, "O|iO", &tuple2, &window, &pybuf))
 		return NULL;
-	return Xdft(tuple2, 1, window);
+	return Xdft(tuple2, 1, window, pybuf);
 }
 
 static PyObject * record_app(PyObject * self, PyObject * args)
 {  // Record the Python object for the application instance, malloc space for fft's.
 	int i, j;
-	fftw_complex * pt;
+	double d;
 
 	if (!PyArg_ParseTuple (args, "OOiiiil", &pyApp, &quisk_pyConfig, &data_width,
 		&fft_size, &average_count, &sample_rate, &quisk_mainwin_handle))
@@ -1550,49 +1487,33 @@ static PyObject * record_app(PyObject * self, PyObject * args)
 
 	Py_INCREF(quisk_pyConfig);
 
+	StopSpectrumThread();
 	rx_udp_clock = QuiskGetConfigDouble("rx_udp_clock", 122.88e6);
 	quisk_sound_state.sample_rate = sample_rate;	// also set by open_sound()
-	is_little_endian = 1;	// Test machine byte order
-	if (*(char *)&is_little_endian == 1)
-		is_little_endian = 1;
-	else
-		is_little_endian = 0;
 	strncpy (quisk_sound_state.err_msg, CLOSED_TEXT, QUISK_SC_SIZE);
+	quisk_rx_get(0);		// create the main receiver before the sound thread starts
 	count_fft = 0;
-	// Create space for the fft
-	if (FFT1) {
-		fftw_destroy_plan(FFT1->plan);
-		fftw_free(FFT1->samples);
-		free(FFT1);
-	}
-	FFT1 = (fft_data *)malloc(sizeof(fft_data));
-	FFT1->status = EMPTY;
-	pt = FFT1->samples = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * fft_size);
-	FFT1->plan = fftw_plan_dft_1d(fft_size, pt, pt, FFTW_FORWARD, FFTW_MEASURE);
-    ptWriteFft = FFT1;
-	// Create space to write samples while the first fft is in use
-	if (FFT2) {
-		fftw_destroy_plan(FFT2->plan);
-		fftw_free(FFT2->samples);
-		free(FFT2);
-	}
-	FFT2 = (fft_data *)malloc(sizeof(fft_data));
-	FFT2->status = EMPTY;
-	pt = FFT2->samples = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * fft_size);
-	FFT2->plan = fftw_plan_dft_1d(fft_size, pt, pt, FFTW_FORWARD, FFTW_MEASURE);
-	// Create space to write samples while the first and second fft is in use	// WB4JFI ADD
-	if (FFT3) {
-		fftw_destroy_plan(FFT3->plan);
-		fftw_free(FFT3->samples);
-		free(FFT3);
-	}
-	FFT3 = (fft_data *)malloc(sizeof(fft_data));
-	FFT3->status = EMPTY;
-	pt = FFT3->samples = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * fft_size);
-	FFT3->plan = fftw_plan_dft_1d(fft_size, pt, pt, FFTW_FORWARD, FFTW_MEASURE);
-	FFT1->next = FFT2;		// create pointers to the next data block
-	FFT2->next = FFT3;
-	FFT3->next = FFT1;
+	// Create the ring of sample history.  Successive FFT blocks overlap by fft_overlap.
+	if (fftRing) {
+		fftw_free(fft_block);
+		quisk_fft_ring_delete(fftRing);
+	}
+	d = QuiskGetConfigDouble("fft_overlap", 0.0);
+	if (d < 0.0)
+		d = 0.0;
+	else if (d > 0.9)
+		d = 0.9;
+	fftRing = quisk_fft_ring_new(fft_size, QuiskGetConfigLong("fft_ring_depth", 8),
+		fft_size - (int)(fft_size * d + 0.5));
+	fft_block = (fftw_complex *) fftw_malloc(sizeof(fftw_complex) * fft_size);
+	if (zoomSamples)
+		free(zoomSamples);
+	zoomSamples = (complex *)malloc(sizeof(complex) * (fft_size + ZOOM_CHUNK));
+	zoomDecim = 0;
+	use_zoom_fft = QuiskGetConfigLong("zoom_fft", 1);
+	// A large graph FFT can use several threads
+	fft_plan = quisk_fft_plan_threads(fft_size, FFTW_FORWARD, 1,
+		QuiskGetConfigLong("fft_threads", 1));
 	// Create space for the fft average and window
 	if (fft_avg)
 		free(fft_avg);
@@ -1608,6 +1529,34 @@ static PyObject * record_app(PyObject * self, PyObject * args)
 		else	// Hanning
 			fft_window[i] = 0.5 + 0.5 * cos(2. * M_PI * j / fft_size);
 	}
+	// Create the graph frames and start the spectrum thread
+	for (i = 0; i < 2; i++) {
+		if (frames[i].data) {
+			free(frames[i].data);
+			free(frames[i].peak);
+		}
+		frames[i].data = (double *) malloc(sizeof(double) * data_width * 2);
+		frames[i].peak = (double *) malloc(sizeof(double) * data_width);
+	}
+	if (peakHold)
+		free(peakHold);
+	peakHold = (double *) malloc(sizeof(double) * data_width);
+	peakReset = 1;
+	frames_published = frames_taken = 0;
+	spectrumQuit = 0;
+	if (QuiskGetConfigLong("spectrum_thread", 1))
+		spectrumThread = quisk_thread_start(SpectrumThread, NULL);
+	Py_INCREF (Py_None);
+	return Py_None;
+}
+
+static PyObject * set_peak_hold(PyObject * self, PyObject * args)
+{	// Set the peak hold decay in dB for each graph frame; use a large number for no peak hold
+	double d;
+
+	if (!PyArg_ParseTuple (args, "d", &d))
+		return NULL;
+	peakDecay = d;
 	Py_INCREF (Py_None);
 	return Py_None;
 }
@@ -1658,9 +1607,13 @@ static PyMethodDef QuiskMethods[] = {
 	{"dft", dft, METH_VARARGS, "Calculate the discrete Fourier transform."},
 	{"idft", idft, METH_VARARGS, "Calculate the inverse discrete Fourier transform."},
 	{"get_state", get_state, METH_VARARGS, "Return a count of read and write errors."},
-	{"get_graph", get_graph, METH_VARARGS, "Return a tuple of graph data."},
+	{"set_peak_hold", set_peak_hold, METH_VARARGS, "Set the peak hold decay in dB per graph."},
+	{"get_graph", get_graph, METH_VARARGS, "Return a tuple of graph data, or fill an optional buffer of doubles."},
+	{"waterfall_row", waterfall_row, METH_VARARGS, "Convert a row of graph data to RGB pixels for the waterfall."},
 	{"get_filter", get_filter, METH_VARARGS, "Return the frequency response of the receive filter."},
 	{"get_filter_rate", get_filter_rate, METH_VARARGS, "Return the sample rate used for the filters."},
+	{"design_filter", quisk_design_filter, METH_VARARGS, "Return the I and Q coefficients of a filter design."},
+	{"prewarm_filters", quisk_prewarm_filters, METH_VARARGS, "Design filters in a native thread before they are needed."},
 	{"get_tx_filter", quisk_get_tx_filter, METH_VARARGS, "Return the frequency response of the transmit filter."},
 	{"get_overrange", get_overrange, METH_VARARGS, "Return the count of overrange (clip) for the ADC."},
 	{"get_smeter", get_smeter, METH_VARARGS, "Return the S meter reading."},
@@ -1670,9 +1623,18 @@ static PyMethodDef QuiskMethods[] = {
 	{"set_ampl_phase", quisk_set_ampl_phase, METH_VARARGS, "Set the sound card amplitude and phase corrections."},
 	{"set_agc", set_agc, METH_VARARGS, "Set the AGC parameters."},
 	{"set_filters", set_filters, METH_VARARGS, "Set the receive audio I and Q channel filters."},
-	{"set_fm_filters", set_fm_filters, METH_VARARGS, "Set the FM audio filter."},
+	{"set_fm_filters", quisk_set_fm_filters, METH_VARARGS, "Set the FM audio filter."},
+	{"set_sub_receiver", quisk_set_sub_receiver, METH_VARARGS, "Set the frequency, mode, volume and audio channels of a sub-receiver."},
+	{"set_sub_filters", quisk_set_sub_filters, METH_VARARGS, "Set the receive audio I and Q channel filters of a sub-receiver."},
+	{"set_worker_threads", quisk_set_worker_threads, METH_VARARGS, "Start a pool of native worker threads."},
+	{"get_stage_times", quisk_get_stage_times, METH_VARARGS, "Return the time used by each processing stage."},
+	{"import_wisdom", quisk_import_wisdom, METH_VARARGS, "Read fftw wisdom from a file."},
+	{"export_wisdom", quisk_export_wisdom, METH_VARARGS, "Write fftw wisdom to a file."},
+	{"get_plan_stats", quisk_get_plan_stats, METH_VARARGS, "Return statistics for the fftw plan cache."},
 	{"set_noise_blanker", set_noise_blanker, METH_VARARGS, "Set the noise blanker level."},
 	{"set_tx_filters", quisk_set_tx_filters, METH_VARARGS, "Set the transmit audio I and Q channel filters."},
+	{"measure_nco", quisk_measure_nco, METH_VARARGS, "Measure the speed and accuracy of the tuning oscillator."},
+	{"benchmark", quisk_benchmark, METH_VARARGS, "Time a stage of the receive processing with synthetic samples."},
 	{"set_rx_mode", set_rx_mode, METH_VARARGS, "Set the receive mode: CWL, USB, AM, etc."},
 	{"set_spot_mode", quisk_set_spot_mode, METH_VARARGS, "Set the spot mode: 0, 1, ... or -1 for no spot"},
 	{"set_sidetone", set_sidetone, METH_VARARGS, "Set the sidetone volume and frequency."},
@@ -1695,6 +1657,8 @@ static PyMethodDef QuiskMethods[] = {
 	{"open_key", open_key, METH_VARARGS, "Open access to the state of the key (CW or PTT)."},
 	{"open_rx_udp", open_rx_udp, METH_VARARGS, "Open a UDP port for capture."},
 	{"close_rx_udp", close_rx_udp, METH_VARARGS, "Close the UDP port used for capture."},
+	{"open_file_source", quisk_open_file_source, METH_VARARGS, "Play I/Q samples from a WAV or raw file instead of a radio."},
+	{"close_file_source", quisk_close_file_source, METH_VARARGS, "Close the file used for I/Q samples."},
 	{"set_key_down", set_key_down, METH_VARARGS, "Change the key up/down state for method \"\""},
 	{NULL, NULL, 0, NULL}		/* Sentinel */
 };
@@ -1706,4 +1670,5 @@ PyMODINIT_FUNC init_quisk (void)
 	QuiskError = PyErr_NewException ("quisk.error", NULL, NULL);
 	Py_INCREF (QuiskError);
 	PyModule_AddObject (m, "error", QuiskError);
+	quisk_filter_init();
 }
@@ -17,14 +17,22 @@
 #define SAMP_BUFFER_SIZE	66000		// size of arrays used to capture samples
 #define IMD_TONE_1			1200		// frequency of IMD test tones
 #define IMD_TONE_2			1600
-#define INTERP_FILTER_TAPS	85			// interpolation filter
-double interpFilterCoef[INTERP_FILTER_TAPS];
 
 // Test the audio: 0 == No test; normal operation;
 // 1 == Copy real data to the output; 2 == copy imaginary data to the output;
 // 3 == Copy transmit audio to the output.
 #define TEST_AUDIO	0
 
+// Sample formats and options for the capture front end quisk_frontend() in frontend.c
+#define QUISK_FMT_S16		0		// 16-bit integers
+#define QUISK_FMT_S24		1		// 24-bit little-endian integers in three bytes
+#define QUISK_FMT_S32		2		// 32-bit integers
+#define QUISK_FMT_FLOAT		3		// floating point from -1.0 to +1.0
+#define QUISK_FE_GAIN		0x01	// multiply by frontend_gain and add frontend_offset
+#define QUISK_FE_DC_REMOVE	0x02	// remove DC
+#define QUISK_FE_CORRECT	0x04	// delay the channel_Delay channel, and correct the amplitude and phase
+#define QUISK_FE_INVERT		0x08	// invert the spectrum
+
 struct sound_dev {				// data for sound capture or playback device
 	char name[QUISK_SC_SIZE];	// string name of device
 	void * handle;				// Handle of open device, or NULL
@@ -52,6 +60,9 @@ struct sound_dev {				// data for sound capture or playback device
 	unsigned int chan_max;
 	complex dc_remove;			// filter to remove DC from samples
 	double save_sample;			// Used to delay the I or Q sample
+	int frontend;				// QUISK_FE_* options for the capture front end
+	double frontend_gain;		// gain and offset for QUISK_FE_GAIN
+	double frontend_offset;
 	char msg1[QUISK_SC_SIZE];	// string for information message
 } ;
 
@@ -86,21 +97,27 @@ struct sound_conf {
 	int mic_channel_I;		// channel number for microphone: 0, 1, ...
 	int mic_channel_Q;
 	int mic_interp;			// integer interpolation for mic playback
+	int mic_interp_taps;	// the mic interpolation filter
+	double * mic_interp_coef;
 	double mic_out_volume;
 	// These parameters specify decimation prior to main filters
 	int int_filter_decim;
 	// Decimation and interpolation after filters
 	double double_filter_decim;
 	int int_filter_interp;
+	int interp_taps;		// the interpolation filter designed for int_filter_interp
+	double * interp_coef;
 } ;
 
 extern struct sound_conf quisk_sound_state;
 extern int mic_max_display;		// display value of maximum microphone signal level
 extern int data_width;
 extern int quisk_use_rx_udp;	// is a UDP port used for capture (0 or 1)?
+extern int quisk_invert_spectrum;	// invert the input RF spectrum
 extern int rxMode;				// mode CWL, USB, etc.
 extern int quisk_tx_tune_freq;	// Transmit tuning frequency as +/- sample_rate / 2
 extern PyObject * quisk_pyConfig;		// Configuration module instance
+extern PyObject * QuiskError;			// Exception for this module
 extern long quisk_mainwin_handle;		// Handle of the main window
 extern double quisk_mic_preemphasis;	// Mic preemphasis 0.0 to 1.0; or -1.0
 extern double quisk_mic_clip;			// Mic clipping; try 3.0 or 4.0
@@ -142,6 +159,7 @@ void quisk_start_sound(void);
 int quisk_get_overrange(void);
 void quisk_mixer_set(char *, int, double, char *, int);
 int quisk_read_sound(void);
+int quisk_frontend(struct sound_dev *, int, const void *, int, complex *);
 int quisk_process_microphone(complex *, int);
 void quisk_open_mic(void);
 void quisk_close_mic(void);
@@ -154,8 +172,248 @@ void quisk_set_tx_mode(void);
 void ptimer(int);
 int quisk_extern_demod(complex *, int, double);
 int quisk_iDecimate(complex *, int, int);
+double quisk_bessel_i0(double);
 void quisk_set_decimation(void);
 
+// Decimating FIR filters; see filter.c.  Zero the structures before first use.
+#define QUISK_MAX_DECIM_STAGES	8
+struct quisk_decim_fir {		// One decimating FIR filter
+	double * coef;				// filter coefficients
+	int taps;					// number of coefficients
+	int decim;					// decimation factor
+	int counter;				// input samples since the last output
+	int index;					// position of the newest sample in cBuf
+	int form;					// general, symmetric or half-band
+	complex * cBuf;				// delay line of size 2 * taps; each sample is stored twice
+} ;
+
+struct quisk_interp_fir {		// A polyphase interpolating FIR filter
+	double * proto;				// the coefficients used to make the filter; not owned
+	double * coef;				// coefficients arranged by phase and multiplied by interp
+	int taps;					// number of coefficients
+	int interp;					// interpolation factor
+	int ptaps;					// number of coefficients in each phase
+	int index;					// position of the newest sample in the delay lines
+	double * dBuf;				// real delay line of size 2 * ptaps
+	complex * cBuf;				// complex delay line of size 2 * ptaps
+} ;
+
+#define QUISK_RESAMPLE_QUALITIES	4
+struct quisk_resampler {		// Resample by an arbitrary ratio with a polyphase filter bank
+	double ratio;				// input samples for each output sample
+	int quality;				// zero to QUISK_RESAMPLE_QUALITIES - 1
+	int ptaps;					// number of coefficients in each phase
+	double * coef;				// the coefficients of each phase
+	int index;					// position of the newest sample in dBuf
+	double * dBuf;				// delay line of size 2 * ptaps
+	double time;				// time of the next output in input samples after the newest input
+} ;
+
+#define QUISK_MAX_CIC_ORDER	5
+struct quisk_decim_cic {		// A CIC decimating filter using 64-bit integers
+	int decim;					// decimation factor
+	int order;					// number of integrators and combs
+	int counter;				// input samples since the last output
+	double scale;				// 1 / decim**order to give unity gain
+	unsigned long long integI[QUISK_MAX_CIC_ORDER];
+	unsigned long long integQ[QUISK_MAX_CIC_ORDER];
+	unsigned long long combI[QUISK_MAX_CIC_ORDER];
+	unsigned long long combQ[QUISK_MAX_CIC_ORDER];
+} ;
+
+struct quisk_decimator {		// Integer decimation by a cascade of filters
+	int idecim;					// total decimation
+	struct quisk_decim_cic cic;	// optional first stage if cic.decim > 1
+	int nstages;				// number of filters in use
+	struct quisk_decim_fir stage[QUISK_MAX_DECIM_STAGES];
+} ;
+
+void quisk_filter_init(void);
+void quisk_decim_fir_init(struct quisk_decim_fir *, double *, int, int);
+void quisk_decim_fir_free(struct quisk_decim_fir *);
+int quisk_decim_fir(struct quisk_decim_fir *, complex *, int);
+void quisk_decim_cic_init(struct quisk_decim_cic *, int, int);
+int quisk_decim_cic(struct quisk_decim_cic *, complex *, int);
+int quisk_decimate(struct quisk_decimator *, complex *, int, int);
+double * quisk_interp_coef(int, int *);
+void quisk_interp_fir_init(struct quisk_interp_fir *, double *, int, int);
+void quisk_interp_fir_free(struct quisk_interp_fir *);
+int quisk_interp_fir(struct quisk_interp_fir *, complex *, int);
+int quisk_interp_fir_play(struct quisk_interp_fir *, double *, int, complex *);
+void quisk_resample_init(struct quisk_resampler *, double, int);
+void quisk_resample_free(struct quisk_resampler *);
+int quisk_resample_play(struct quisk_resampler *, double *, int, complex *);
+extern int quisk_resample_quality;		// quality of the fractional resampler
+
+// Fast convolution (overlap-save) for long receive filters; see fast_conv.c
+struct quisk_fast_conv;
+int quisk_fast_conv_size(int);
+struct quisk_fast_conv * quisk_fast_conv_new(double *, double *, int, int);
+void quisk_fast_conv_delete(struct quisk_fast_conv *);
+void quisk_fast_conv_filter(struct quisk_fast_conv *, complex *, int, int);
+
+// Make memory writes visible to other threads in order
+#ifdef _MSC_VER		// volatile has acquire and release semantics on x86
+#include <intrin.h>
+#define QUISK_MEMORY_BARRIER()	_ReadWriteBarrier()
+#else
+#define QUISK_MEMORY_BARRIER()	__sync_synchronize()
+#endif
+#define QUISK_CACHE_LINE	64
+
+// Single producer, single consumer ring of sample history for the FFT; see fft_ring.c
+struct quisk_fft_ring {
+	int fft_size;				// number of samples in each block
+	int hop;					// samples from the start of one block to the next
+	int size;					// number of samples in the history, a power of two
+	int mask;					// size - 1
+	int limit;					// maximum samples between read_start and write_count
+	int nslots;					// number of blocks in the history
+	complex * samples;			// the sample history
+	char pad0[QUISK_CACHE_LINE];
+	// This is written only by the producer
+	volatile unsigned int write_count;		// number of samples written
+	char pad1[QUISK_CACHE_LINE];
+	// These are written only by the consumer
+	unsigned int read_start;	// sample number of the start of the next block
+	int blocks_read;			// statistics
+	int blocks_dropped;
+	int overflows;				// number of times the history was overwritten
+	int max_used;				// maximum number of full blocks
+	char pad2[QUISK_CACHE_LINE];
+} ;
+
+struct quisk_fft_ring * quisk_fft_ring_new(int, int, int);
+void quisk_fft_ring_delete(struct quisk_fft_ring *);
+void quisk_fft_ring_write(struct quisk_fft_ring *, complex *, int);
+int quisk_fft_ring_read(struct quisk_fft_ring *, complex *, double *);
+int quisk_fft_ring_read_stream(struct quisk_fft_ring *, complex *, int);
+int quisk_fft_ring_used(struct quisk_fft_ring *);
+
+// Numerically controlled oscillator for tuning and tones; see nco.c
+#define QUISK_NCO_BLOCK		64
+struct quisk_nco {
+	double delta;				// phase change per sample in radians
+	double amplitude;			// amplitude of the output
+	complex vector;				// phasor at the start of the current block
+	complex block_step;			// exp(j * delta * QUISK_NCO_BLOCK)
+	int index;					// position in the current block
+	complex table[QUISK_NCO_BLOCK];		// exp(j * delta * k)
+} ;
+
+void quisk_nco_init(struct quisk_nco *, double, double);
+void quisk_nco_set_delta(struct quisk_nco *, double);
+complex quisk_nco_next(struct quisk_nco *);
+void quisk_nco_get(struct quisk_nco *, complex *, int);
+void quisk_nco_add(struct quisk_nco *, complex *, int);
+void quisk_nco_mix(struct quisk_nco *, complex *, int);
+extern PyObject * quisk_measure_nco(PyObject * , PyObject *);
+
+// Time the receive processing with synthetic samples; see benchmark.c
+extern PyObject * quisk_benchmark(PyObject * , PyObject *);
+
+// Play I/Q samples from a file through pt_sample_read; see file_source.c
+extern PyObject * quisk_open_file_source(PyObject * , PyObject *);
+extern PyObject * quisk_close_file_source(PyObject * , PyObject *);
+
+// Receivers that demodulate the capture samples; see receiver.c
+#define QUISK_MAX_RX	8		// the main receiver plus sub-receivers
+struct quisk_rx {
+	int mode;					// CWL, USB, etc. as rxMode
+	int tune_freq;				// tuning frequency as +/- sample_rate / 2
+	double volume;				// audio output level, 0.0 to 1.0
+	int channels;				// sub-receiver audio: 1 for left, 2 for right, 3 for both
+	double agcGain;				// AGC gain
+	struct quisk_nco nco;		// tuning oscillator
+	struct quisk_decimator decimator;
+	double cFilterI[MAX_FILTER_SIZE];	// Digital filter coefficients
+	double cFilterQ[MAX_FILTER_SIZE];
+	double bufFilterI[MAX_FILTER_SIZE];	// Digital filter sample buffers
+	double bufFilterQ[MAX_FILTER_SIZE];
+	complex bufFilterC[MAX_FILTER_SIZE];
+	int sizeFilter;				// Number of coefficients for filters
+	int filter_serial;			// Changed for each new filter
+	int indexFilter;			// Index of current filter data in buffer
+	struct quisk_fast_conv * fastFilter;		// FFT filter for long filters, or NULL
+	struct quisk_fast_conv * fastFilterPending;	// New FFT filter from the GUI thread, or NULL
+	struct quisk_fast_conv * fastFilterRetired;	// Previous FFT filter for the GUI thread to free
+	int fastFilterNew;			// fastFilterPending is waiting for the sound thread
+	complex fm_1, fm_2;			// FM samples delayed by one and two
+	double * fmFilterBufI;		// FM audio filter buffer
+	int fmFilterBufSize;
+	int indexFmFilter;
+	double x_1, y_1;			// FM de-emphasis filter
+	struct quisk_interp_fir interp;		// Interpolation to the play rate
+	struct quisk_resampler resampler;	// Fractional decimation
+	complex * audio;			// sub-receiver audio waiting to be played
+	int audio_count;
+	complex * samples;			// sub-receiver work buffer
+} ;
+
+struct quisk_rx * quisk_rx_get(int);
+int quisk_rx_set_filters(struct quisk_rx *, PyObject *, PyObject *);
+void quisk_rx_set_agc(int, double, double);
+int quisk_rx_process(struct quisk_rx *, complex *, int);
+void quisk_rx_process_subs(complex *, int);
+void quisk_rx_mix_subs(complex *, int);
+extern PyObject * quisk_set_fm_filters(PyObject * , PyObject *);
+extern PyObject * quisk_set_sub_receiver(PyObject * , PyObject *);
+extern PyObject * quisk_set_sub_filters(PyObject * , PyObject *);
+
+// Native worker threads and stage timing; see workers.c
+#define QUISK_MAX_WORKERS	8
+enum quisk_stages {QUISK_STAGE_CAPTURE, QUISK_STAGE_FRONT, QUISK_STAGE_RX,
+	QUISK_STAGE_PLAY, QUISK_STAGE_MIC, QUISK_STAGE_FFT, QUISK_STAGES} ;
+typedef void (*quisk_job_func)(void *);
+int quisk_workers_start(int);
+void quisk_workers_stop(void);
+void quisk_workers_submit(quisk_job_func, void *);
+void quisk_workers_wait(void);
+void * quisk_thread_start(quisk_job_func, void *);
+void quisk_thread_join(void *);
+struct quisk_lock;
+struct quisk_cond;
+struct quisk_lock * quisk_lock_new(void);
+void quisk_lock_acquire(struct quisk_lock *);
+void quisk_lock_release(struct quisk_lock *);
+struct quisk_cond * quisk_cond_new(void);
+int quisk_cond_wait(struct quisk_cond *, struct quisk_lock *, double);
+void quisk_cond_signal(struct quisk_cond *);
+void quisk_cond_broadcast(struct quisk_cond *);
+double quisk_stage_end(int, double);
+extern PyObject * quisk_set_worker_threads(PyObject * , PyObject *);
+extern PyObject * quisk_get_stage_times(PyObject * , PyObject *);
+
+// Shared fftw plans and wisdom; see fft_plans.c
+#ifdef FFTW_FORWARD		// for files that include fftw3.h
+fftw_plan quisk_fft_plan(int, int, int);
+fftw_plan quisk_fft_plan_threads(int, int, int, int);
+#endif
+extern PyObject * quisk_import_wisdom(PyObject * , PyObject *);
+extern PyObject * quisk_export_wisdom(PyObject * , PyObject *);
+extern PyObject * quisk_get_plan_stats(PyObject * , PyObject *);
+
+// UDP sample receive thread and jitter buffer; see rx_udp.c
+#define RX_UDP_SIZE		1442		// Expected size of UDP samples packet
+struct quisk_udp_stats {
+	int depth;					// jitter buffer depth in packets
+	int buffered;				// packets now in the jitter buffer
+	int received;				// packets received
+	int lost;					// packets filled with zeros or interpolated samples
+	int late;					// packets that arrived after they were filled, and duplicates
+	int reordered;				// packets that arrived after a newer packet
+} ;
+
+int quisk_udp_rx_start(int, int, int, int);
+void quisk_udp_rx_stop(void);
+int quisk_udp_rx_read(struct sound_dev *, complex *, int);
+void quisk_udp_rx_get_stats(struct quisk_udp_stats *);
+
+// Filter design and the cache of designs; see filter_design.c
+void quisk_filter_prewarm_stop(void);
+extern PyObject * quisk_design_filter(PyObject * , PyObject *);
+extern PyObject * quisk_prewarm_filters(PyObject * , PyObject *);
+
 int  quisk_read_alsa(struct sound_dev *, complex *);
 void quisk_play_alsa(struct sound_dev *, int, complex *, int);
 void quisk_start_sound_alsa(struct sound_dev *, struct sound_dev *, struct sound_dev *,struct sound_dev *);
@@ -0,0 +1,526 @@
+#include <Python.h>
+#include <stdlib.h>
+#include <math.h>
+#include <complex.h>	// Use native C99 complex type for fftw3
+#include "quisk.h"
+
+#ifdef MS_WINDOWS
+#include <windows.h>
+#else
+#include <pthread.h>
+#endif
+
+// A receiver tunes, decimates, filters and demodulates the I/Q samples into audio.
+// All its state is in struct quisk_rx, so any number of receivers can process the same
+// capture samples.  Receiver zero is the main receiver controlled by the usual
+// set_tune(), set_rx_mode(), set_filters() etc.  The others are sub-receivers that
+// monitor other frequencies within the capture bandwidth.  Their audio is added to the
+// left and/or right playback channel of the main receiver.
+//
+// The structures are created by the GUI thread and are never freed, because the sound
+// thread may be using them.  A sub-receiver is turned off by setting its channels to
+// zero.  Filters may be changed while being used, so the storage is not malloc'd.
+//
+// An FFT filter for fast convolution is malloc'd, so it is handed to the sound thread.
+// The GUI thread puts a new filter in fastFilterPending, and the sound thread swaps it in
+// at the start of quisk_rx_process() and moves the previous filter to fastFilterRetired.
+// The GUI thread only frees filters that the sound thread has retired, or pending filters
+// that the sound thread never took.
+
+#define FM_FILTER_DEMPH		300.0	// Frequency of FM lowpass de-emphasis filter
+#define SUB_AUDIO_SIZE		8192	// Maximum sub-receiver audio waiting to be played
+
+static struct quisk_rx * receivers[QUISK_MAX_RX];	// receiver zero is the main receiver
+
+static int agcInUse;			// 0 for no AGC; else the AGC method 1, 2
+static double agcAttack, agcRelease;	// AGC attack and release parameters
+
+static double * fmFilterI;		// FM audio filter shared by all receivers
+static int fmFilterSize = 0;
+
+static complex cSubSamples[SAMP_BUFFER_SIZE];	// Copy of the capture samples for the sub-receivers
+static int nSubSamples;
+
+#ifdef MS_WINDOWS
+static int is_init;
+static CRITICAL_SECTION lock;		// lock for the FFT filter handoff
+#define LOCK()			EnterCriticalSection(&lock)
+#define UNLOCK()		LeaveCriticalSection(&lock)
+#else
+static pthread_mutex_t lock = PTHREAD_MUTEX_INITIALIZER;
+#define LOCK()			pthread_mutex_lock(&lock)
+#define UNLOCK()		pthread_mutex_unlock(&lock)
+#endif
+
+struct quisk_rx * quisk_rx_get(int index)
+{	// Return receiver index, and create it if necessary.  Call from the GUI thread.
+	struct quisk_rx * rx;
+
+	if (index < 0 || index >= QUISK_MAX_RX)
+		return NULL;
+	if (receivers[index])
+		return receivers[index];
+#ifdef MS_WINDOWS
+	if ( ! is_init) {		// the sound thread only uses the lock after there is a receiver
+		is_init = 1;
+		InitializeCriticalSection(&lock);
+	}
+#endif
+	rx = (struct quisk_rx *)malloc(sizeof(struct quisk_rx));
+	memset(rx, 0, sizeof(struct quisk_rx));
+	rx->mode = 3;		// USB
+	rx->fm_1 = 10;
+	rx->fm_2 = 10;
+	quisk_nco_init(&rx->nco, 0, 1.0);
+	rx->audio = (complex *)malloc(SUB_AUDIO_SIZE * sizeof(complex));
+	if (index > 0)
+		rx->samples = (complex *)malloc(SAMP_BUFFER_SIZE * sizeof(complex));
+	QUISK_MEMORY_BARRIER();		// finish the receiver before the sound thread can see it
+	receivers[index] = rx;
+	return rx;
+}
+
+int quisk_rx_set_filters(struct quisk_rx * rx, PyObject * filterI, PyObject * filterQ)
+{	// Enter the coefficients of the I and Q digital filters.  Long filters use fast
+	// convolution with the FFT.  The new FFT filter is handed to the sound thread, and the
+	// previous filter is freed after the sound thread retires it.  Return -1 for an error.
+	int i, size, fft_size;
+	struct quisk_fast_conv * fc, * unused, * retired;
+	PyObject * obj;
+	char buf98[98];
+
+	if (PySequence_Check(filterI) != 1) {
+		PyErr_SetString (QuiskError, "Filter I is not a sequence");
+		return -1;
+	}
+	if (PySequence_Check(filterQ) != 1) {
+		PyErr_SetString (QuiskError, "Filter Q is not a sequence");
+		return -1;
+	}
+	size = PySequence_Size(filterI);
+	if (size != PySequence_Size(filterQ)) {
+		PyErr_SetString (QuiskError, "The size of filters I and Q must be equal");
+		return -1;
+	}
+	if (size >= MAX_FILTER_SIZE) {
+		snprintf(buf98, 98, "Filter size must be less than %d", MAX_FILTER_SIZE);
+		PyErr_SetString (QuiskError, buf98);
+		return -1;
+	}
+	for (i = 0; i < size; i++) {
+		obj = PySequence_GetItem(filterI, i);
+		rx->cFilterI[i] = PyFloat_AsDouble(obj);
+		Py_XDECREF(obj);
+		obj = PySequence_GetItem(filterQ, i);
+		rx->cFilterQ[i] = PyFloat_AsDouble(obj);
+		Py_XDECREF(obj);
+	}
+	fft_size = quisk_fast_conv_size(size);
+	if (fft_size)
+		fc = quisk_fast_conv_new(rx->cFilterI, rx->cFilterQ, size, fft_size);
+	else
+		fc = NULL;
+	LOCK();
+	unused = rx->fastFilterNew ? rx->fastFilterPending : NULL;	// never used by the sound thread
+	retired = rx->fastFilterRetired;
+	rx->fastFilterRetired = NULL;
+	rx->fastFilterPending = fc;
+	rx->fastFilterNew = 1;
+	UNLOCK();
+	quisk_fast_conv_delete(unused);
+	quisk_fast_conv_delete(retired);
+	rx->indexFilter = 0;
+	rx->sizeFilter = size;
+	rx->filter_serial++;
+	return 0;
+}
+
+void quisk_rx_set_agc(int in_use, double attack, double release)
+{	// Change the AGC parameters for all receivers
+	int i;
+
+	agcInUse = in_use;
+	agcAttack = attack;
+	agcRelease = release;
+	for (i = 0; i < QUISK_MAX_RX; i++)
+		if (receivers[i])
+			receivers[i]->agcGain = 0.0;
+}
+
+int quisk_rx_process(struct quisk_rx * rx, complex * cSamples, int nSamples)
+{	// Tune, decimate, filter and demodulate the samples.  The stereo audio samples at the
+	// play rate are returned in cSamples, and the return value is the number of samples.
+	int i, j, k, filter_srate, size;
+	double d, di, accI, accQ, agc_level, agcPeak, www, nnn, a_0, a_1, b_1;
+	complex cx;
+	struct quisk_fast_conv * fast_filter;
+	double dsamples[SAMP_BUFFER_SIZE];
+
+	if (rx->fastFilterNew) {	// Swap in a new FFT filter.  The GUI took the last retired filter.
+		LOCK();
+		rx->fastFilterRetired = rx->fastFilter;
+		rx->fastFilter = rx->fastFilterPending;
+		rx->fastFilterPending = NULL;
+		rx->fastFilterNew = 0;
+		UNLOCK();
+	}
+
+	// Tune the data to frequency
+	if (rx->tune_freq && quisk_sound_state.sample_rate) {
+		quisk_nco_set_delta(&rx->nco, -2.0 * M_PI * rx->tune_freq / quisk_sound_state.sample_rate);
+		quisk_nco_mix(&rx->nco, cSamples, nSamples);
+	}
+
+	if (rx->mode == 6) {		// External filter and demodulate
+		d = quisk_sound_state.double_filter_decim * quisk_sound_state.int_filter_decim /
+				quisk_sound_state.int_filter_interp;	// total decimation needed
+		nSamples = quisk_extern_demod(cSamples, nSamples, d);
+		// Find the peak signal amplitude
+		agcPeak = 0;
+		for (i = 0; i < nSamples; i++) {
+			di = creal(cSamples[i]);
+			if (agcPeak < di)
+				agcPeak = di;
+			di = cimag(cSamples[i]);
+			if (agcPeak < di)
+				agcPeak = di;
+		}
+		goto start_agc;
+	}
+
+	// Perhaps write sample data to the soundcard output without decimation
+	if (TEST_AUDIO == 1) {		// Copy I channel capture to playback
+		di = 1.e4 * rx->volume;
+		for (i = 0; i < nSamples; i++)
+			cSamples[i] = creal(cSamples[i]) * di;
+		return nSamples;
+	}
+	else if (TEST_AUDIO == 2) {	// Copy Q channel capture to playback
+		di = 1.e4 * rx->volume;
+		for (i = 0; i < nSamples; i++)
+			cSamples[i] = cimag(cSamples[i]) * di;
+		return nSamples;
+	}
+
+	// Decimate: Lower the sample rate.
+	nSamples = quisk_decimate(&rx->decimator, cSamples, nSamples, quisk_sound_state.int_filter_decim);
+
+	/* Filter the signal */
+	fast_filter = rx->fastFilter;
+	if (fast_filter) {		// Long filter: use the FFT
+		quisk_fast_conv_filter(fast_filter, cSamples, nSamples, rx->mode == 4 || rx->mode == 5);
+	}
+	else if (rx->sizeFilter) {
+		size = rx->sizeFilter;
+		if (rx->mode == 4 || rx->mode == 5)	{	// AM and FM: Use same filter for I and Q
+			for (i = 0; i < nSamples; i++) {
+				rx->bufFilterC[rx->indexFilter] = cSamples[i];
+				cx = 0;
+				j = rx->indexFilter;
+				for (k = 0; k < size; k++) {
+					cx += rx->bufFilterC[j] * rx->cFilterI[k];
+					if (++j >= size)
+						j = 0;
+				}
+				cSamples[i] = cx;
+				if (++rx->indexFilter >= size)
+					rx->indexFilter = 0;
+			}
+		}
+		else {			// CW and SSB: Use filters for 90 degree phase shift
+			for (i = 0; i < nSamples; i++) {
+				cx = cSamples[i];
+				rx->bufFilterI[rx->indexFilter] = creal(cx);
+				rx->bufFilterQ[rx->indexFilter] = cimag(cx);
+				accI = accQ = 0;
+				j = rx->indexFilter;
+				for (k = 0; k < size; k++) {
+					accI += rx->bufFilterI[j] * rx->cFilterI[k];
+					accQ += rx->bufFilterQ[j] * rx->cFilterQ[k];
+					if (++j >= size)
+						j = 0;
+				}
+				cSamples[i] = accI + I * accQ;
+				if (++rx->indexFilter >= size)
+					rx->indexFilter = 0;
+			}
+		}
+	}
+	// Demodulate signal, copy capture buffer cSamples to play buffer dsamples.
+	// filter_srate is the sample rate after decimation.
+	filter_srate = quisk_sound_state.sample_rate / quisk_sound_state.int_filter_decim;
+	for (i = 0; i < nSamples; i++) {
+		cx = cSamples[i];
+		switch(rx->mode) {
+		case 0:		// lower sideband
+		case 2:
+			di = creal(cx) + cimag(cx);
+			break;
+		case 1:		// upper sideband
+		case 3:
+		default:
+			di = creal(cx) - cimag(cx);
+			break;
+		case 4:		// AM
+			di = cabs(cx);
+			break;
+		case 5:		// FM
+			di = creal(rx->fm_1) * (cimag(cx) - cimag(rx->fm_2)) -
+			     cimag(rx->fm_1) * (creal(cx) - creal(rx->fm_2));
+			d = creal(rx->fm_1) * creal(rx->fm_1) + cimag(rx->fm_1) * cimag(rx->fm_1);
+			if (d == 0)	// I don't think this can happen
+				di = 0;
+			else
+				di = di / d * filter_srate;
+			rx->fm_2 = rx->fm_1;	// fm_2 is sample cSamples[i - 2]
+			rx->fm_1 = cx;			// fm_1 is sample cSamples[i - 1]
+			break;
+		}
+		dsamples[i] = di;
+	}
+	// For FM, filter the audio
+	size = fmFilterSize;
+	if (rx->mode == 5 && size) {
+		if (rx->fmFilterBufSize != size) {	// the FM filter was changed
+			rx->fmFilterBufI = (double *)realloc(rx->fmFilterBufI, size * sizeof(double));
+			memset(rx->fmFilterBufI, 0, size * sizeof(double));
+			rx->fmFilterBufSize = size;
+			rx->indexFmFilter = 0;
+		}
+		www = tan(M_PI * FM_FILTER_DEMPH / filter_srate);	// filter_srate might change
+		nnn = 1.0 / (1.0 + www);
+		a_0 = www * nnn;
+		a_1 = a_0;
+		b_1 = nnn * (www - 1.0);
+		for (i = 0; i < nSamples; i++) {
+			rx->fmFilterBufI[rx->indexFmFilter] =  dsamples[i];
+			accI = 0;
+			j = rx->indexFmFilter;
+			for (k = 0; k < size; k++) {
+				accI += rx->fmFilterBufI[j] * fmFilterI[k];
+				if (++j >= size)
+					j = 0;
+			}
+			if (++rx->indexFmFilter >= size)
+				rx->indexFmFilter = 0;
+			// FM de-emphasis
+			dsamples[i] = rx->y_1 = accI * a_0 + rx->x_1 * a_1 - rx->y_1 * b_1;
+			rx->x_1 = accI;
+		}
+	}
+	// Perhaps interpolate the samples back to the play rate, or decimate by a fraction.
+	// There is no fractional decimation when there is interpolation.
+	if (quisk_sound_state.int_filter_interp > 1 && quisk_sound_state.interp_coef) {
+		if (rx->interp.proto != quisk_sound_state.interp_coef)	// the interpolation filter was changed
+			quisk_interp_fir_init(&rx->interp, quisk_sound_state.interp_coef,
+				quisk_sound_state.interp_taps, quisk_sound_state.int_filter_interp);
+		nSamples = quisk_interp_fir_play(&rx->interp, dsamples, nSamples, cSamples);
+		// Find the peak signal amplitude
+		agcPeak = 0;
+		for (i = 0; i < nSamples; i++) {
+			d = fabs(creal(cSamples[i]));
+			if (agcPeak < d)
+				agcPeak = d;
+		}
+	}
+	else if (quisk_sound_state.double_filter_decim != 1.0) {
+		// Decimate (lower the sample rate) by an additional fraction
+		d = quisk_sound_state.double_filter_decim;
+		if (rx->resampler.ratio != d || rx->resampler.quality != quisk_resample_quality)
+			quisk_resample_init(&rx->resampler, d, quisk_resample_quality);
+		nSamples = quisk_resample_play(&rx->resampler, dsamples, nSamples, cSamples);
+		// Find the peak signal amplitude
+		agcPeak = 0;
+		for (i = 0; i < nSamples; i++) {
+			d = fabs(creal(cSamples[i]));
+			if (agcPeak < d)
+				agcPeak = d;
+		}
+	}
+	else {
+		// Find the peak signal amplitude, copy sound to output cSamples
+		agcPeak = 0;
+		for (i = 0; i < nSamples; i++) {
+			d = dsamples[i];
+			cSamples[i] = d + I * d;	// monophonic sound, two channels
+			d = fabs(d);
+			if (agcPeak < d)
+				agcPeak = d;
+		}
+	}
+	// Perhaps change volume using automatic gain control, AGC.
+	// The maximum signal is about 2^31, namely 2e9.
+start_agc:
+	agc_level = 1400. * rx->volume;	// For no AGC
+	if (agcInUse) {
+		if (agcInUse == 1) {
+			// Brick wall agc; make all signals the same volume 2e9.
+			// Then multiply by volume control.
+			di = agcPeak * rx->agcGain;	// Current level if not changed
+			if (agcPeak < 1.0)
+				;
+			else if (di <= 2.e9)	// Current level is below the soundcard max, increase gain
+				rx->agcGain += (2.e9 / agcPeak - rx->agcGain) * agcRelease;
+			else			// decrease gain
+				rx->agcGain += (2.e9 / agcPeak - rx->agcGain) * agcAttack;
+			agc_level = rx->agcGain * rx->volume;		// change volume
+		}
+		else if (agcInUse == 2) {
+			// Set gain with the volume control, but limit max signal to 2e9
+			rx->agcGain += (10000. * rx->volume - rx->agcGain) * agcRelease;
+			if (agcPeak * rx->agcGain > 2.e9)	// check maximum level
+				rx->agcGain += (2.e9 / agcPeak - rx->agcGain) * agcAttack;
+			agc_level = rx->agcGain;
+		}
+	}
+	for (i = 0; i < nSamples; i++)
+		cSamples[i] *= agc_level;
+	return nSamples;
+}
+
+static void sub_job(void * arg)
+{	// Run one sub-receiver on the saved capture samples, and save its audio for
+	// quisk_rx_mix_subs().  This may run on a worker thread.
+	int n, count;
+	struct quisk_rx * rx = (struct quisk_rx *)arg;
+
+	memcpy(rx->samples, cSubSamples, nSubSamples * sizeof(complex));
+	n = quisk_rx_process(rx, rx->samples, nSubSamples);
+	count = rx->audio_count;
+	if (count + n > SUB_AUDIO_SIZE) {	// too much audio; discard the oldest
+		count = SUB_AUDIO_SIZE - n;
+		if (count < 0) {
+			count = 0;
+			n = SUB_AUDIO_SIZE;
+		}
+		memmove(rx->audio, rx->audio + rx->audio_count - count, count * sizeof(complex));
+	}
+	memcpy(rx->audio + count, rx->samples, n * sizeof(complex));
+	rx->audio_count = count + n;
+}
+
+void quisk_rx_process_subs(complex * cSamples, int nSamples)
+{	// Start the sub-receivers on the capture samples.  They run on the worker threads
+	// if there are any, while the sound thread runs the main receiver.  Call from the
+	// sound thread before the main receiver changes cSamples.
+	int i, is_copied;
+	struct quisk_rx * rx;
+
+	is_copied = 0;
+	for (i = 1; i < QUISK_MAX_RX; i++) {
+		rx = receivers[i];
+		if ( ! rx || ! rx->channels) {
+			continue;
+		}
+		if ( ! is_copied) {
+			is_copied = 1;
+			memcpy(cSubSamples, cSamples, nSamples * sizeof(complex));
+			nSubSamples = nSamples;
+		}
+		quisk_workers_submit(sub_job, rx);
+	}
+}
+
+void quisk_rx_mix_subs(complex * cSamples, int nSamples)
+{	// Wait for the sub-receivers, and add their audio to the left and/or right channel of
+	// the main receiver audio.  The number of audio samples from each receiver may differ by a sample or
+	// two, so the extra samples are saved for the next call.
+	int i, k, n, channels;
+	struct quisk_rx * rx;
+
+	quisk_workers_wait();
+	for (i = 1; i < QUISK_MAX_RX; i++) {
+		rx = receivers[i];
+		if ( ! rx)
+			continue;
+		channels = rx->channels;
+		if ( ! channels) {
+			rx->audio_count = 0;
+			continue;
+		}
+		n = rx->audio_count < nSamples ? rx->audio_count : nSamples;
+		for (k = 0; k < n; k++) {
+			if (channels & 1)
+				cSamples[k] += creal(rx->audio[k]);
+			if (channels & 2)
+				cSamples[k] += I * cimag(rx->audio[k]);
+		}
+		rx->audio_count -= n;
+		memmove(rx->audio, rx->audio + n, rx->audio_count * sizeof(complex));
+	}
+}
+
+PyObject * quisk_set_fm_filters(PyObject * self, PyObject * args)
+{  // Enter the coefficients of the audio filter for FM
+   // Storage space is malloc'd.
+	PyObject * filterI;
+	int i, size;
+	PyObject * obj;
+
+	if (!PyArg_ParseTuple (args, "O", &filterI))
+		return NULL;
+	if (PySequence_Check(filterI) != 1) {
+		PyErr_SetString (PyExc_TypeError, "FM filter is not a sequence");
+		return NULL;
+	}
+
+	if (fmFilterSize) {
+		fmFilterSize = 0;
+		free (fmFilterI);
+	}
+	size = PySequence_Size(filterI);
+    if (size) {
+		fmFilterI = (double *)malloc(size * sizeof(double));
+		for (i = 0; i < size; i++) {
+			obj = PySequence_GetItem(filterI, i);
+			fmFilterI[i] = PyFloat_AsDouble(obj);
+			Py_XDECREF(obj);
+		}
+		fmFilterSize = size;
+	}
+	Py_INCREF (Py_None);
+	return Py_None;
+}
+
+PyObject * quisk_set_sub_receiver(PyObject * self, PyObject * args)
+{	// Set the tuning frequency, mode, volume and audio channels of a sub-receiver.
+	// The channels are 1 for left, 2 for right, 3 for both or 0 for off.
+	int index, freq, mode, channels;
+	double volume;
+	struct quisk_rx * rx;
+
+	if (!PyArg_ParseTuple (args, "iiidi", &index, &freq, &mode, &volume, &channels))
+		return NULL;
+	if (index < 1 || index >= QUISK_MAX_RX) {
+		PyErr_Format(QuiskError, "The sub-receiver index must be 1 to %d", QUISK_MAX_RX - 1);
+		return NULL;
+	}
+	if (mode == 6) {
+		PyErr_SetString (QuiskError, "External demodulation is only available for the main receiver");
+		return NULL;
+	}
+	rx = quisk_rx_get(index);
+	rx->tune_freq = freq;
+	rx->mode = mode;
+	rx->volume = volume;
+	rx->channels = channels & 3;
+	Py_INCREF (Py_None);
+	return Py_None;
+}
+
+PyObject * quisk_set_sub_filters(PyObject * self, PyObject * args)
+{	// Enter the coefficients of the I and Q digital filters of a sub-receiver
+	int index;
+	PyObject * filterI, * filterQ;
+
+	if (!PyArg_ParseTuple (args, "iOO", &index, &filterI, &filterQ))
+		return NULL;
+	if (index < 1 || index >= QUISK_MAX_RX) {
+		PyErr_Format(QuiskError, "The sub-receiver index must be 1 to %d", QUISK_MAX_RX - 1);
+		return NULL;
+	}
+	if (quisk_rx_set_filters(quisk_rx_get(index), filterI, filterQ))
+		return NULL;
+	Py_INCREF (Py_None);
+	return Py_None;
+}
@@ -0,0 +1,333 @@
+#include <Python.h>
+#include <stdlib.h>
+#include <string.h>
+#include <complex.h>	// Use native C99 complex type for fftw3
+#include <sys/types.h>
+
+#ifdef MS_WINDOWS
+#include <Winsock2.h>
+#include <windows.h>
+#else
+#include <sys/socket.h>
+#include <sys/time.h>
+#endif
+
+#include "quisk.h"
+
+// A native thread to receive the UDP sample packets, and a jitter buffer to put them in order.
+//
+// The thread reads packets with recvmmsg(), so one system call returns all the packets
+// that are waiting.  Each packet is received into a buffer from a pool that is allocated
+// once.  The thread puts the buffer in the jitter buffer slot for its sequence number, and
+// takes the old buffer of that slot for the next read, so packets are never copied.  The
+// eight-bit sequence numbers in the packets are extended to 32 bits.
+//
+// The sound thread calls quisk_udp_rx_read() to take the packets in sequence order.  If the
+// next packet is missing, it waits until "depth" newer packets have arrived before it gives
+// up on it.  So a packet can arrive that much out of order without any loss, and there is
+// no added latency when packets arrive in order.  The samples of a lost packet are filled
+// with zeros or interpolated, so the sample clock does not slip.  A lost packet that arrives
+// after its samples were filled is counted as late and discarded.  After a gap of more than
+// 127 packets the sequence numbers seem to be old.  When two packets in sequence are more
+// than "depth" behind, the gap is counted as lost and the reader starts again after it.
+//
+// Without recvmmsg() (Windows and other systems) the thread uses recv() for each packet.
+
+#define UDP_SLOTS		256			// number of jitter buffer slots, a power of two
+#define UDP_SLOT_MASK	(UDP_SLOTS - 1)
+#define UDP_BATCH		32			// maximum packets for each read
+#define UDP_BUF_SIZE	1500		// maximum Ethernet is 1500 bytes
+#define UDP_POLL_MSEC	50			// receive timeout, so the thread can check for quit
+#define UDP_READ_SECS	0.1			// maximum time for quisk_udp_rx_read() to wait
+#define UDP_SAMPLES		((RX_UDP_SIZE - 2) / 6)	// samples in each packet
+
+struct udp_slot {
+	int valid;					// buf has a packet that was not read yet
+	unsigned int seq;			// extended sequence number of the packet in buf
+	unsigned char * buf;
+} ;
+
+static struct udp_slot slots[UDP_SLOTS];	// the jitter buffer
+static unsigned char * batch[UDP_BATCH];	// buffers for the next read
+static unsigned char * pool;				// memory for all the buffers
+static void * thread_handle;
+static int rx_sock;
+static int rx_quit;
+static int depth;					// jitter buffer depth in packets
+static int gap_fill;				// 0 to fill lost packets with zeros, 1 to interpolate
+static int have_packet;				// a packet has been received
+static unsigned int play_seq;		// sequence number of the next packet to read
+static unsigned int high_seq;		// highest sequence number received
+static int far_behind;				// sequence byte of the last packet far behind play_seq, or -1
+static int bad_packets;				// packets with the wrong size, not yet counted as read errors
+static complex last_sample;			// the last sample returned by quisk_udp_rx_read()
+static struct quisk_udp_stats stats;
+
+static struct quisk_lock * lock;
+static struct quisk_cond * cond_ready;	// signaled when packets are received or on quit
+#define LOCK()			quisk_lock_acquire(lock)
+#define UNLOCK()		quisk_lock_release(lock)
+#define SIGNAL(c)		quisk_cond_signal(c)
+
+static int wait_ready(double secs)
+{	// Wait for cond_ready with the lock held.  Return zero for a timeout.
+	return quisk_cond_wait(cond_ready, lock, secs);
+}
+
+static void add_packet(int index, int bytes)
+{	// Put the packet in batch[index] into the jitter buffer.  Call with the lock held.
+	struct udp_slot * slot;
+	unsigned char * buf;
+	unsigned int seq;
+	int i;
+
+	buf = batch[index];
+	if (bytes != RX_UDP_SIZE) {		// Known size of sample block
+		bad_packets++;
+		return;
+	}
+	stats.received++;
+	if ( ! have_packet) {
+		have_packet = 1;
+		play_seq = high_seq = buf[0];
+	}
+	// buf[0] is the sequence number; extend it to 32 bits near the highest number
+	seq = high_seq + (signed char)(buf[0] - (unsigned char)high_seq);
+	if ((int)(seq - play_seq) < - depth) {	// a very late packet, or a gap of more than 127 packets
+		if (far_behind != (unsigned char)(buf[0] - 1)) {
+			far_behind = buf[0];
+			stats.late++;
+			return;
+		}
+		// Two packets in sequence are far behind, so there was a gap.  Start again after it.
+		seq = high_seq + ((buf[0] - high_seq - 1) & 0xFF) + 1;
+		stats.lost += seq - play_seq - 1;	// the previous packet was counted as late
+		for (i = 0; i < UDP_SLOTS; i++)
+			slots[i].valid = 0;
+		play_seq = high_seq = seq;
+	}
+	else if ((int)(seq - play_seq) < 0) {		// too late; its samples were already filled
+		stats.late++;
+		return;
+	}
+	far_behind = -1;
+	if ((int)(seq - play_seq) >= UDP_SLOTS) {	// the reader is far behind; discard old packets
+		stats.lost += seq - play_seq - UDP_SLOTS + 1;
+		play_seq = seq - UDP_SLOTS + 1;
+	}
+	slot = slots + (seq & UDP_SLOT_MASK);
+	if (slot->valid && slot->seq == seq) {		// duplicate packet
+		stats.late++;
+		return;
+	}
+	if ((int)(seq - high_seq) < 0)
+		stats.reordered++;
+	else
+		high_seq = seq;
+	batch[index] = slot->buf;	// exchange the buffers
+	slot->buf = buf;
+	slot->seq = seq;
+	slot->valid = 1;
+}
+
+static void rx_thread(void * unused)
+{	// Receive packets until told to quit
+#ifdef __linux__
+	int i, n;
+	struct mmsghdr msgs[UDP_BATCH];
+	struct iovec iov[UDP_BATCH];
+
+	memset(msgs, 0, sizeof(msgs));
+	for (i = 0; i < UDP_BATCH; i++) {
+		msgs[i].msg_hdr.msg_iov = iov + i;
+		msgs[i].msg_hdr.msg_iovlen = 1;
+	}
+#else
+	int bytes;
+#endif
+
+	while ( ! rx_quit) {
+#ifdef __linux__
+		for (i = 0; i < UDP_BATCH; i++) {
+			iov[i].iov_base = batch[i];
+			iov[i].iov_len = UDP_BUF_SIZE;
+		}
+		// wait for one packet, and then take all the packets that are waiting
+		n = recvmmsg(rx_sock, msgs, UDP_BATCH, MSG_WAITFORONE, NULL);
+		if (n <= 0)		// timeout or error
+			continue;
+		LOCK();
+		for (i = 0; i < n; i++)
+			add_packet(i, msgs[i].msg_len);
+#else
+		bytes = recv(rx_sock, (char *)batch[0], UDP_BUF_SIZE, 0);
+		if (bytes <= 0)		// timeout or error
+			continue;
+		LOCK();
+		add_packet(0, bytes);
+#endif
+		SIGNAL(cond_ready);
+		UNLOCK();
+	}
+}
+
+int quisk_udp_rx_start(int sock, int jitter_depth, int fill, int rcvbuf)
+{	// Start the receive thread for this socket.  Return 1 for success or 0 for an error.
+	int i;
+#ifdef MS_WINDOWS
+	DWORD timeout = UDP_POLL_MSEC;
+#else
+	struct timeval timeout = {0, UDP_POLL_MSEC * 1000};
+#endif
+
+	quisk_udp_rx_stop();
+	if ( ! lock) {
+		lock = quisk_lock_new();
+		cond_ready = quisk_cond_new();
+	}
+	if (jitter_depth < 1)
+		jitter_depth = 1;
+	else if (jitter_depth > UDP_SLOTS / 2)
+		jitter_depth = UDP_SLOTS / 2;
+	depth = jitter_depth;
+	gap_fill = fill;
+	if (rcvbuf > 0)		// the system may limit the size
+		setsockopt(sock, SOL_SOCKET, SO_RCVBUF, (char *)&rcvbuf, sizeof(rcvbuf));
+	setsockopt(sock, SOL_SOCKET, SO_RCVTIMEO, (char *)&timeout, sizeof(timeout));
+	pool = (unsigned char *)malloc((UDP_SLOTS + UDP_BATCH) * UDP_BUF_SIZE);
+	if ( ! pool)
+		return 0;
+	for (i = 0; i < UDP_SLOTS; i++) {
+		slots[i].buf = pool + i * UDP_BUF_SIZE;
+		slots[i].valid = 0;
+	}
+	for (i = 0; i < UDP_BATCH; i++)
+		batch[i] = pool + (UDP_SLOTS + i) * UDP_BUF_SIZE;
+	memset(&stats, 0, sizeof(stats));
+	stats.depth = depth;
+	have_packet = 0;
+	far_behind = -1;
+	bad_packets = 0;
+	last_sample = 0;
+	rx_sock = sock;
+	rx_quit = 0;
+	thread_handle = quisk_thread_start(rx_thread, NULL);
+	if ( ! thread_handle) {
+		free(pool);
+		pool = NULL;
+		return 0;
+	}
+	return 1;
+}
+
+void quisk_udp_rx_stop(void)
+{	// Stop the receive thread, and wake up any reader
+	if ( ! thread_handle)
+		return;
+	LOCK();
+	rx_quit = 1;
+	SIGNAL(cond_ready);
+	UNLOCK();
+	quisk_thread_join(thread_handle);
+	thread_handle = NULL;
+	free(pool);
+	pool = NULL;
+}
+
+static void fill_packet(struct sound_dev * dev, complex * samp)
+{	// Fill the samples of the missing packet play_seq.  Call with the lock held.
+	struct sound_dev tmp;
+	complex target;
+	unsigned int seq;
+	int i, steps;
+
+	stats.lost++;
+	quisk_sound_state.read_error++;
+	if ( ! gap_fill) {
+		for (i = 0; i < UDP_SAMPLES; i++)
+			samp[i] = 0;
+		last_sample = 0;
+		return;
+	}
+	// Draw a line from the last sample to the first sample of the next packet we have.
+	// The packet high_seq is always there.
+	for (seq = play_seq + 1; ! slots[seq & UDP_SLOT_MASK].valid || slots[seq & UDP_SLOT_MASK].seq != seq; seq++)
+		;
+	tmp = *dev;		// convert one sample without changing the front end state
+	quisk_frontend(&tmp, QUISK_FMT_S24, slots[seq & UDP_SLOT_MASK].buf + 2, 1, &target);
+	steps = (seq - play_seq) * UDP_SAMPLES + 1;
+	for (i = 0; i < UDP_SAMPLES; i++)
+		samp[i] = last_sample + (target - last_sample) * (i + 1) / steps;
+	last_sample = samp[UDP_SAMPLES - 1];
+}
+
+int quisk_udp_rx_read(struct sound_dev * dev, complex * samp, int blocks)
+{	// Read this many packets in sequence order, and convert them to samples with the
+	// front end options in dev.  Wait for the packets, but return the samples we have
+	// after UDP_READ_SECS.  Return the number of samples.
+	struct udp_slot * slot;
+	unsigned char * buf;
+	int count, nSamples;
+	double t0, secs;
+
+	if ( ! thread_handle)
+		return 0;
+	nSamples = 0;
+	t0 = QuiskTimeSec();
+	LOCK();
+	quisk_sound_state.read_error += bad_packets;
+	bad_packets = 0;
+	for (count = 0; count < blocks; count++) {
+		while ( ! rx_quit) {
+			if (have_packet) {
+				slot = slots + (play_seq & UDP_SLOT_MASK);
+				if ((slot->valid && slot->seq == play_seq) || (int)(high_seq - play_seq) >= depth)
+					break;
+			}
+			secs = t0 + UDP_READ_SECS - QuiskTimeSec();
+			if (secs <= 0 || ! wait_ready(secs))
+				break;
+		}
+		if (rx_quit || ! have_packet)
+			break;
+		slot = slots + (play_seq & UDP_SLOT_MASK);
+		if (slot->valid && slot->seq == play_seq) {
+			slot->valid = 0;
+			buf = slot->buf;
+			// buf[1] is the status:
+			//		bit 0:  key up/down state
+			//		bit 1:	set for ADC overrange (clip)
+			quisk_set_key_down(buf[1] & 0x01);	// bit zero is key state
+			if (buf[1] & 0x02)					// bit one is ADC overrange
+				quisk_sound_state.overrange++;
+			// convert 24-bit little-endian samples to 32-bit samples, and make the corrections
+			nSamples += quisk_frontend(dev, QUISK_FMT_S24, buf + 2, UDP_SAMPLES, samp + nSamples);
+			last_sample = samp[nSamples - 1];
+		}
+		else if ((int)(high_seq - play_seq) >= depth) {		// the packet is lost
+			fill_packet(dev, samp + nSamples);
+			nSamples += UDP_SAMPLES;
+		}
+		else {		// timeout
+			break;
+		}
+		play_seq++;
+	}
+	UNLOCK();
+	return nSamples;
+}
+
+void quisk_udp_rx_get_stats(struct quisk_udp_stats * st)
+{	// Copy the statistics
+	if ( ! lock) {		// the receiver was never started
+		memset(st, 0, sizeof(*st));
+		return;
+	}
+	LOCK();
+	*st = stats;
+	if (have_packet)
+		st->buffered = high_seq - play_seq + 1;
+	else
+		st->buffered = 0;
+	UNLOCK();
+}
@@ -98,31 +98,37 @@ static void correct_sample (struct sound_dev * dev, complex * cSamples, int nSam
 
 int quisk_read_sound(void)	// Called from sound thread
 {  // called in an infinite loop by the main program
-	int i, j, k, nSamples, mic_count, retval, is_cw;
-	complex acc, tx_mic_phase;
+	int i, nSamples, mic_count, retval, is_cw;
+	double t0;
 	static double cwEnvelope=0;
 	static double cwCount=0;
-	static complex tuneVector = (double)CLIP32 / CLIP16;	// Convert 16-bit to 32-bit samples
-	static int indexInterpFilter = 0;		// index into interpolation filter
-	static complex interpFilterBuf[INTERP_FILTER_TAPS];		// Interpolation audio filter
+	static struct quisk_nco txNco;		// Tune the mic samples to the transmit frequency
+	static int txNcoIsInit = 0;
+	static struct quisk_interp_fir micInterp;		// Interpolate the mic samples to the play rate
 
 	quisk_sound_state.interupts++;
 
+	t0 = QuiskTimeSec();
 	if (pt_sample_read) {			// read samples from SDR-IQ
 		nSamples = (*pt_sample_read)(cSamples);
+		if (quisk_invert_spectrum) {
+			for (i = 0; i < nSamples; i++)
+				cSamples[i] = conj(cSamples[i]);
+		}
 	}
 	else if (quisk_use_rx_udp) {	// read samples from UDP port
 		nSamples = quisk_read_rx_udp(cSamples);
 	}
 	else if (Capture.handle) {							// blocking read from soundcard
+		// The capture front end removes DC, delays the I or Q channel by one sample,
+		// makes the amplitude and phase corrections, and inverts the spectrum.
+		Capture.frontend = QUISK_FE_DC_REMOVE | QUISK_FE_CORRECT;
+		if (quisk_invert_spectrum)
+			Capture.frontend |= QUISK_FE_INVERT;
 		if (Capture.portaudio_index < 0)
 			nSamples = quisk_read_alsa(&Capture, cSamples);
 		else
 			nSamples = quisk_read_portaudio(&Capture, cSamples);
-		if (Capture.channel_Delay >= 0)	// delay the I or Q channel by one sample
-			delay_sample(&Capture, (double *)cSamples, nSamples);
-		if (Capture.doAmplPhase)		// amplitude and phase corrections
-			correct_sample(&Capture, cSamples, nSamples);
 	}
 	else {
 		nSamples = 0;
@@ -132,11 +138,14 @@ int quisk_read_sound(void)	// Called from sound thread
 	ptimer (nSamples);
 #endif
 	quisk_sound_state.latencyCapt = nSamples;	// samples available
+	quisk_stage_end(QUISK_STAGE_CAPTURE, t0);
 	nSamples = quisk_process_samples(cSamples, nSamples);	// get sound to play
+	t0 = QuiskTimeSec();
 	if (Playback.portaudio_index < 0)
 		quisk_play_alsa(&Playback, nSamples, cSamples, 1);
 	else
 		quisk_play_portaudio(&Playback, nSamples, cSamples, 1);
+	t0 = quisk_stage_end(QUISK_STAGE_PLAY, t0);
 
 	// Read and process the microphone
 	mic_count = 0;
@@ -158,32 +167,34 @@ int quisk_read_sound(void)	// Called from sound thread
 			cwCount = 0;
 			cwEnvelope = 0.0;
 		}
-		tx_mic_phase = cexp(( -I * 2.0 * M_PI * quisk_tx_tune_freq) / MicPlayback.sample_rate);
+		if ( ! txNcoIsInit) {
+			txNcoIsInit = 1;
+			quisk_nco_init(&txNco, 0, (double)CLIP32 / CLIP16);	// Convert 16-bit to 32-bit samples
+		}
+		quisk_nco_set_delta(&txNco, -2.0 * M_PI * quisk_tx_tune_freq / MicPlayback.sample_rate);
 		if (is_cw) {	// Transmit CW; use capture device for timing, not microphone
 			cwCount += (double)retval * MicPlayback.sample_rate / quisk_sound_state.sample_rate;
-			mic_count = 0;
+			mic_count = (int)cwCount;
+			cwCount -= mic_count;
+			quisk_nco_get(&txNco, cSamples, mic_count);
 			if (quisk_is_key_down()) {
-				while (cwCount >= 1.0) {
+				for (i = 0; i < mic_count; i++) {
 					if (cwEnvelope < 1.0) {
 						cwEnvelope += 1. / (MicPlayback.sample_rate * 5e-3);	// 5 milliseconds
 						if (cwEnvelope > 1.0)
 							cwEnvelope = 1.0;
 					}
-					cSamples[mic_count++] = (CLIP16 - 1) * cwEnvelope * tuneVector * quisk_sound_state.mic_out_volume;
-					tuneVector *= tx_mic_phase;
-					cwCount -= 1;
+					cSamples[i] *= (CLIP16 - 1) * cwEnvelope * quisk_sound_state.mic_out_volume;
 				}
 			}
 			else {		// key is up
-				while (cwCount >= 1.0) {
+				for (i = 0; i < mic_count; i++) {
 					if (cwEnvelope > 0.0) {
 						cwEnvelope -= 1.0 / (MicPlayback.sample_rate * 5e-3);	// 5 milliseconds
 						if (cwEnvelope < 0.0)
 							cwEnvelope = 0.0;
 					}
-					cSamples[mic_count++] = (CLIP16 - 1) * cwEnvelope * tuneVector * quisk_sound_state.mic_out_volume;
-					tuneVector *= tx_mic_phase;
-					cwCount -= 1;
+					cSamples[i] *= (CLIP16 - 1) * cwEnvelope * quisk_sound_state.mic_out_volume;
 				}
 			}
 		}
@@ -194,36 +205,17 @@ int quisk_read_sound(void)	// Called from sound thread
 			}
 		}
 		// Perhaps interpolate the mic samples back to the mic play rate
-		if ( ! is_cw && quisk_sound_state.mic_interp > 1) {
-			k = quisk_sound_state.mic_interp;
-			// from samples a, b, c  make  a, 0, 0, b, 0, 0, c, 0, 0
-			mic_count *= k;
-			for (i = mic_count - 1; i >= 0; i--) {
-				if (i % k == 0)
-					cSamples[i] = cSamples[i / k] * k;
-				else
-					cSamples[i] = 0;
-			}
-			for (i = 0; i < mic_count; i++) {	// low pass filter
-				interpFilterBuf[indexInterpFilter] =  cSamples[i];
-				acc = 0;
-				j = indexInterpFilter;
-				for (k = 0; k < INTERP_FILTER_TAPS; k++) {
-					acc += interpFilterBuf[j] * interpFilterCoef[k];
-					if (++j >= INTERP_FILTER_TAPS)
-						j = 0;
-				}
-				cSamples[i] = acc;
-				if (++indexInterpFilter >= INTERP_FILTER_TAPS)
-					indexInterpFilter = 0;
-			}
+		if ( ! is_cw && quisk_sound_state.mic_interp > 1 && quisk_sound_state.mic_interp_coef) {
+			if (micInterp.proto != quisk_sound_state.mic_interp_coef)	// the interpolation filter was changed
+				quisk_interp_fir_init(&micInterp, quisk_sound_state.mic_interp_coef,
+					quisk_sound_state.mic_interp_taps, quisk_sound_state.mic_interp);
+			mic_count = quisk_interp_fir(&micInterp, cSamples, mic_count);
 		}
 		// Tune the samples to frequency
 		if ( ! is_cw) {
-			for (i = 0; i < mic_count; i++) {
-				cSamples[i] = conj(cSamples[i]) * tuneVector * quisk_sound_state.mic_out_volume;
-				tuneVector *= tx_mic_phase;
-			}
+			for (i = 0; i < mic_count; i++)
+				cSamples[i] = conj(cSamples[i]) * quisk_sound_state.mic_out_volume;
+			quisk_nco_mix(&txNco, cSamples, mic_count);
 		}
 		// delay the I or Q channel by one sample
 		if (MicPlayback.channel_Delay >= 0)
@@ -237,6 +229,8 @@ int quisk_read_sound(void)	// Called from sound thread
 		else
 			quisk_play_portaudio(&MicPlayback, mic_count, cSamples, 0);
 	}
+	if (MicCapture.handle || MicPlayback.handle)
+		quisk_stage_end(QUISK_STAGE_MIC, t0);
 	// Return negative number for error
 	return retval;
 }
@@ -304,6 +298,9 @@ void quisk_set_decimation(void)		// Set the decimation rates
 			d = 1.0;
 		quisk_sound_state.double_filter_decim = d;
 	}
+	// Design the interpolation filter, or find it in the cache
+	quisk_sound_state.interp_coef = quisk_interp_coef(quisk_sound_state.int_filter_interp,
+		&quisk_sound_state.interp_taps);
 #if DEBUG
 	printf("int_filter_decim %d, int_filter_interp %d, double_filter_decim %.3f\n",
 		quisk_sound_state.int_filter_decim,	quisk_sound_state.int_filter_interp,
@@ -346,6 +343,7 @@ void quisk_open_sound(void)	// Called from GUI thread
 	Capture.channel_Delay = QuiskGetConfigLong ("channel_delay", -1);
 #endif
 	MicPlayback.channel_Delay = QuiskGetConfigLong ("tx_channel_delay", -1);
+	MicCapture.frontend = QUISK_FE_DC_REMOVE;
 
 	if (pt_sample_read) {		// capture from SDR-IQ by Rf-Space
 		Capture.name[0] = 0;	// zero the capture soundcard name
@@ -361,6 +359,8 @@ void quisk_open_sound(void)	// Called from GUI thread
 	quisk_sound_state.mic_interp = 1;	// Mic interpolation must be an integer
 	if (MicPlayback.name[0] && MicCapture.name[0])
 		quisk_sound_state.mic_interp = MicPlayback.sample_rate / MicCapture.sample_rate;
+	quisk_sound_state.mic_interp_coef = quisk_interp_coef(quisk_sound_state.mic_interp,
+		&quisk_sound_state.mic_interp_taps);
 	// set read size for sound card capture
 	i = (int)(quisk_sound_state.data_poll_usec * 1e-6 * Capture.sample_rate + 0.5);
 	i = i / 64 * 64;
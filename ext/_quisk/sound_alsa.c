@@ -27,12 +27,9 @@ static int bufferz[SAMP_BUFFER_SIZE];				// Buffer for zero samples
 int quisk_read_alsa(struct sound_dev * dev, complex * cSamples)
 {	// Read sound samples from the ALSA soundcard.
 	// Samples are converted to 32 bits with a range of +/- CLIP32 and placed into cSamples.
-	int i;
 	snd_pcm_sframes_t frames, avail;
-	short si, sq;
-	int ii, qq;
-	int nSamples;
-	complex c;
+	void * buffer;
+	int format;
 
 	if (!dev->handle)
 		return -1;
@@ -45,91 +42,34 @@ int quisk_read_alsa(struct sound_dev * dev, complex * cSamples)
 		if (avail > SAMP_BUFFER_SIZE / dev->num_channels)		// limit read request to buffer size
 			avail = SAMP_BUFFER_SIZE / dev->num_channels;
 	}
-	nSamples = 0;
 	switch (dev->sample_bytes) {
 	case 2:
-		frames = snd_pcm_readi (dev->handle, buffer2, avail);	// read samples
-		if (frames == -EAGAIN) {	// no samples available
-			break;
-		}
-		else if (frames <= 0) {		// error
-			quisk_sound_state.read_error++;
-			snd_pcm_prepare (dev->handle);
-			snd_pcm_start (dev->handle);
-			break;
-		}
-		for (i = 0; frames; i += dev->num_channels, nSamples++, frames--) {
-			si = buffer2[i + dev->channel_I];
-			sq = buffer2[i + dev->channel_Q];
-			if (si >=  CLIP16 || si <= -CLIP16)
-				dev->overrange++;	// assume overrange returns max int
-			if (sq >=  CLIP16 || sq <= -CLIP16)
-				dev->overrange++;
-			ii = si << 16;
-			qq = sq << 16;
-			cSamples[nSamples] = ii + I * qq;
-		}
+		buffer = buffer2;
+		format = QUISK_FMT_S16;
 		break;
 	case 3:
-		frames = snd_pcm_readi (dev->handle, buffer3, avail);	// read samples
-		if (frames == -EAGAIN) {	// no samples available
-			break;
-		}
-		else if (frames <= 0) {		// error
-			quisk_sound_state.read_error++;
-			snd_pcm_prepare (dev->handle);
-			snd_pcm_start (dev->handle);
-			break;
-		}
-		for (i = 0; frames; i += dev->num_channels, nSamples++, frames--) {
-			ii = qq = 0;
-			if (!is_little_endian) {	// convert to big-endian
-				*((unsigned char *)&ii    ) = buffer3[(i + dev->channel_I) * 3 + 2];
-				*((unsigned char *)&ii + 1) = buffer3[(i + dev->channel_I) * 3 + 1];
-				*((unsigned char *)&ii + 2) = buffer3[(i + dev->channel_I) * 3    ];
-				*((unsigned char *)&qq    ) = buffer3[(i + dev->channel_Q) * 3 + 2];
-				*((unsigned char *)&qq + 1) = buffer3[(i + dev->channel_Q) * 3 + 1];
-				*((unsigned char *)&qq + 2) = buffer3[(i + dev->channel_Q) * 3    ];
-			}
-			else {		// convert to little-endian
-				memcpy((unsigned char *)&ii + 1, buffer3 + (i + dev->channel_I) * 3, 3);
-				memcpy((unsigned char *)&qq + 1, buffer3 + (i + dev->channel_Q) * 3, 3);
-			}
-			if (ii >=  CLIP32 || ii <= -CLIP32)
-				dev->overrange++;	// assume overrange returns max int
-			if (qq >=  CLIP32 || qq <= -CLIP32)
-				dev->overrange++;
-			cSamples[nSamples] = ii + I * qq;
-		}
+		buffer = buffer3;
+		format = QUISK_FMT_S24;
 		break;
 	case 4:
-		frames = snd_pcm_readi (dev->handle, buffer4, avail);	// read samples
-		if (frames == -EAGAIN) {	// no samples available
-			break;
-		}
-		else if (frames <= 0) {		// error
-			quisk_sound_state.read_error++;
-			snd_pcm_prepare (dev->handle);
-			snd_pcm_start (dev->handle);
-			break;
-		}
-		for (i = 0; frames; i += dev->num_channels, nSamples++, frames--) {
-			ii = buffer4[i + dev->channel_I];
-			qq = buffer4[i + dev->channel_Q];
-			if (ii >=  CLIP32 || ii <= -CLIP32)
-				dev->overrange++;	// assume overrange returns max int
-			if (qq >=  CLIP32 || qq <= -CLIP32)
-				dev->overrange++;
-			cSamples[nSamples] = ii + I * qq;
-		}
+		buffer = buffer4;
+		format = QUISK_FMT_S32;
 		break;
+	default:
+		return 0;
 	}
-	for (i = 0; i < nSamples; i++) {	// DC removal; R.G. Lyons page 553
-		c = cSamples[i] + dev->dc_remove * 0.95;
-		cSamples[i] = c - dev->dc_remove;
-		dev->dc_remove = c;
+	frames = snd_pcm_readi (dev->handle, buffer, avail);	// read samples
+	if (frames == -EAGAIN) {	// no samples available
+		return 0;
+	}
+	else if (frames <= 0) {		// error
+		quisk_sound_state.read_error++;
+		snd_pcm_prepare (dev->handle);
+		snd_pcm_start (dev->handle);
+		return 0;
 	}
-	return nSamples;
+	// Convert the samples, remove DC, and make any corrections
+	return quisk_frontend(dev, format, buffer, frames, cSamples);
 }
 
 void quisk_play_alsa(struct sound_dev * playdev, int nSamples,
@@ -261,12 +261,8 @@ int  quisk_read_alsa(struct sound_dev * dev, complex * cSamples)
 	static DWORD dataPos=0;
 	LPVOID pt1, pt2;
 	DWORD i, n1, n2;
-	short si, sq, * pts;
-	float fi, fq, * ptf;
-	long  li, lq, * ptl;
-	complex c;
-	int ii, qq, nSamples;
-	int bytes, frames, poll_size, millisecs, bytes_per_frame, pass;
+	int nSamples, format;
+	int bytes, frames, poll_size, millisecs, bytes_per_frame;
 	static int started = 0;
 	
 	if ( ! dev->handle || ! dev->buffer)
@@ -334,74 +330,31 @@ int  quisk_read_alsa(struct sound_dev * dev, complex * cSamples)
 #endif
 	dataPos += bytes;
 	dataPos = dataPos % dev->play_buf_size;
-	nSamples = 0;
-	pass = 0;
 	switch (dev->sample_bytes + dev->use_float) {
 	case 2:
-		pts = (short *)pt1;
-		frames = (n1 + n2) / bytes_per_frame;
-		bytes = 0;
-		while (frames) {
-			si = pts[dev->channel_I];
-			sq = pts[dev->channel_Q];
-			pts += dev->num_channels;
-			if (si >=  CLIP16 || si <= -CLIP16)
-				dev->overrange++;	// assume overrange returns max int
-			if (sq >=  CLIP16 || sq <= -CLIP16)
-				dev->overrange++;
-			ii = si << 16;
-			qq = sq << 16;
-			cSamples[nSamples++] = ii + I * qq;
-			bytes += bytes_per_frame;
-			frames--;
-			if (bytes == n1)
-				pts = (short *)pt2;
-		}
+		format = QUISK_FMT_S16;
 		break;
 	case 4:
-		ptl = (long *)pt1;
-		frames = (n1 + n2) / bytes_per_frame;
-		bytes = 0;
-		while (frames) {
-			li = ptl[dev->channel_I];
-			lq = ptl[dev->channel_Q];
-			ptl += dev->num_channels;
-			if (li >=  CLIP32 || li <= -CLIP32)
-				dev->overrange++;	// assume overrange returns max int
-			if (lq >=  CLIP32 || lq <= -CLIP32)
-				dev->overrange++;
-			cSamples[nSamples++] = li + I * lq;
-			bytes += bytes_per_frame;
-			frames--;
-			if (bytes == n1)
-				ptl = (long *)pt2;
-		}
+		format = QUISK_FMT_S32;
 		break;
-	case 5:		// use IEEE float
-		ptf = (float *)pt1;
-		frames = (n1 + n2) / bytes_per_frame;
-		bytes = 0;
-		while (frames) {
-			fi = ptf[dev->channel_I];
-			fq = ptf[dev->channel_Q];
-			ptf += dev->num_channels;
-			if (fabsf(fi) >= 1.0 || fabsf(fq) >= 1.0)
-				dev->overrange++;	// assume overrange returns maximum
-			cSamples[nSamples++] = (fi + I * fq) * 16777215;
-			bytes += bytes_per_frame;
-			frames--;
-			if (bytes == n1) {
-				ptf = (float *)pt2;
-			}
-		}
+	case 5:		// use IEEE float; the range is +/- 2**24
+		format = QUISK_FMT_FLOAT;
+		dev->frontend |= QUISK_FE_GAIN;
+		dev->frontend_gain = 16777215.0 / CLIP32;
+		dev->frontend_offset = 0;
+		break;
+	default:
+		format = -1;
 		break;
 	}
-	IDirectSoundCaptureBuffer8_Unlock(ptBuf, pt1, n1, pt2, n2);
-	for (i = 0; i < nSamples; i++) {	// DC removal; R.G. Lyons page 553
-		c = cSamples[i] + dev->dc_remove * 0.95;
-		cSamples[i] = c - dev->dc_remove;
-		dev->dc_remove = c;
+	// Convert the samples, remove DC, and make any corrections
+	nSamples = 0;
+	if (format >= 0) {
+		nSamples = quisk_frontend(dev, format, pt1, n1 / bytes_per_frame, cSamples);
+		if (pt2 && n2)
+			nSamples += quisk_frontend(dev, format, pt2, n2 / bytes_per_frame, cSamples + nSamples);
 	}
+	IDirectSoundCaptureBuffer8_Unlock(ptBuf, pt1, n1, pt2, n2);
 	return nSamples;
 }
 
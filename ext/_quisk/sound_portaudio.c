@@ -24,12 +24,8 @@ static float fbuffer[SAMP_BUFFER_SIZE];		// Buffer for float32 samples from soun
 int quisk_read_portaudio(struct sound_dev * dev, complex * cSamples)
 {	// Read sound samples from the soundcard.
 	// Samples are converted to 32 bits with a range of +/- CLIP32 and placed into cSamples.
-	int i;
 	long avail;
-	int nSamples;
-	complex c;
 	PaError error;
-	float fi, fq;
 
 	if (!dev->handle)
 		return -1;
@@ -43,22 +39,8 @@ int quisk_read_portaudio(struct sound_dev * dev, complex * cSamples)
 	error = Pa_ReadStream ((PaStream * )dev->handle, fbuffer, avail);
 	if (error != paNoError)
 		quisk_sound_state.read_error++;
-	nSamples = 0;
-	for (i = 0; avail; i += dev->num_channels, nSamples++, avail--) {
-		fi = fbuffer[i + dev->channel_I];
-		fq = fbuffer[i + dev->channel_Q];
-		if (fi >=  1.0 || fi <= -1.0)
-			dev->overrange++;	// assume overrange returns max int
-		if (fq >=  1.0 || fq <= -1.0)
-			dev->overrange++;
-		cSamples[nSamples] = (fi + I * fq) * CLIP32;
-	}
-	for (i = 0; i < nSamples; i++) {	// DC removal; R.G. Lyons page 553
-		c = cSamples[i] + dev->dc_remove * 0.95;
-		cSamples[i] = c - dev->dc_remove;
-		dev->dc_remove = c;
-	}
-	return nSamples;
+	// Convert the samples, remove DC, and make any corrections
+	return quisk_frontend(dev, QUISK_FMT_FLOAT, fbuffer, avail, cSamples);
 }
 
 void quisk_play_portaudio(struct sound_dev * playdev, int nSamples, complex * cSamples,
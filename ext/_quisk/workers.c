@@ -0,0 +1,393 @@
+#include <Python.h>
+#include <stdlib.h>
+#include <complex.h>	// Use native C99 complex type for fftw3
+#include "quisk.h"
+
+#ifdef MS_WINDOWS
+#include <windows.h>
+#else
+#include <sys/time.h>
+#include <time.h>
+#include <pthread.h>
+#endif
+
+// A pool of native worker threads, and timing statistics for each stage of the
+// sound processing.
+//
+// The sound thread submits independent jobs such as the sub-receivers, does its own
+// work (the main receiver), and then waits for the jobs to finish.  The workers never
+// call Python, so they do not need the GIL.  If there is no pool, or the job queue is
+// full, a job is run immediately by the calling thread, so the results are the same
+// with or without workers.
+//
+// Each stage time is written by one thread only, and read by the GUI for display.
+//
+// There are also functions to start and join other long running native threads, and a
+// lock and condition variable for them.  Windows XP has no condition variables, so on
+// Windows a condition is a semaphore and a count of the waiting threads.  A thread must
+// test its condition again after a wait, because it may wake up when the condition is
+// not true.
+
+#define MAX_JOBS			32
+#define WORKER_STACK_SIZE	(4 * 1024 * 1024)	// quisk_rx_process() uses a large stack
+
+struct job {
+	quisk_job_func func;
+	void * arg;
+} ;
+
+static struct job jobs[MAX_JOBS];	// circular queue of waiting jobs
+static int job_head, job_count;		// index of the next job, and the number waiting
+static int jobs_pending;			// jobs waiting or running
+static int workers_quit;
+static int num_workers;
+
+struct quisk_lock {
+#ifdef MS_WINDOWS
+	CRITICAL_SECTION cs;
+#else
+	pthread_mutex_t mutex;
+#endif
+} ;
+
+struct quisk_cond {
+#ifdef MS_WINDOWS
+	HANDLE sem;
+	int waiters;		// number of threads waiting; changed with the lock held
+#else
+	pthread_cond_t cond;
+#endif
+} ;
+
+#ifdef MS_WINDOWS
+static HANDLE threads[QUISK_MAX_WORKERS];
+#else
+static pthread_t threads[QUISK_MAX_WORKERS];
+#endif
+static struct quisk_lock * lock;
+static struct quisk_cond * cond_job;		// signaled when a job is added or on quit
+static struct quisk_cond * cond_done;		// signaled when all jobs are finished
+#define LOCK()			quisk_lock_acquire(lock)
+#define UNLOCK()		quisk_lock_release(lock)
+#define WAIT(c)			quisk_cond_wait(c, lock, -1.0)
+#define SIGNAL(c)		quisk_cond_signal(c)
+#define BROADCAST(c)	quisk_cond_broadcast(c)
+
+static const char * stage_names[QUISK_STAGES] = {
+	"capture", "front", "receivers", "playback", "microphone", "fft"} ;
+static int stage_count[QUISK_STAGES];
+static double stage_total[QUISK_STAGES];		// total time in seconds
+static double stage_max[QUISK_STAGES];			// maximum time in seconds
+
+#ifdef MS_WINDOWS
+static DWORD WINAPI worker_main(LPVOID unused)
+#else
+static void * worker_main(void * unused)
+#endif
+{	// Run jobs until told to quit
+	struct job job;
+
+	LOCK();
+	while (1) {
+		while ( ! job_count && ! workers_quit)
+			WAIT(cond_job);
+		if (workers_quit)
+			break;
+		job = jobs[job_head];
+		job_head = (job_head + 1) % MAX_JOBS;
+		job_count--;
+		UNLOCK();
+		(*job.func)(job.arg);
+		LOCK();
+		if (--jobs_pending == 0)
+			BROADCAST(cond_done);
+	}
+	UNLOCK();
+	return 0;
+}
+
+int quisk_workers_start(int nthreads)
+{	// Start the pool with nthreads threads, and return the number started.  Call from
+	// the GUI thread before the sound starts.
+	int i;
+#ifndef MS_WINDOWS
+	pthread_attr_t attr;
+#endif
+
+	quisk_workers_stop();
+	if (nthreads > QUISK_MAX_WORKERS)
+		nthreads = QUISK_MAX_WORKERS;
+	workers_quit = 0;
+	if ( ! lock) {
+		lock = quisk_lock_new();
+		cond_job = quisk_cond_new();
+		cond_done = quisk_cond_new();
+	}
+#ifdef MS_WINDOWS
+	for (i = 0; i < nthreads; i++) {
+		threads[i] = CreateThread(NULL, WORKER_STACK_SIZE, worker_main, NULL, 0, NULL);
+		if ( ! threads[i])
+			break;
+	}
+#else
+	pthread_attr_init(&attr);
+	pthread_attr_setstacksize(&attr, WORKER_STACK_SIZE);
+	for (i = 0; i < nthreads; i++) {
+		if (pthread_create(threads + i, &attr, worker_main, NULL))
+			break;
+	}
+	pthread_attr_destroy(&attr);
+#endif
+	num_workers = i;
+	return num_workers;
+}
+
+void quisk_workers_stop(void)
+{	// Stop the worker threads after they finish their jobs
+	int i;
+
+	if ( ! num_workers)
+		return;
+	quisk_workers_wait();
+	LOCK();
+	workers_quit = 1;
+	BROADCAST(cond_job);
+	UNLOCK();
+	for (i = 0; i < num_workers; i++) {
+#ifdef MS_WINDOWS
+		WaitForSingleObject(threads[i], INFINITE);
+		CloseHandle(threads[i]);
+#else
+		pthread_join(threads[i], NULL);
+#endif
+	}
+	num_workers = 0;
+}
+
+void quisk_workers_submit(quisk_job_func func, void * arg)
+{	// Run func(arg) on a worker thread, or run it now if there are no workers
+	if (num_workers) {
+		LOCK();
+		if (job_count < MAX_JOBS) {
+			jobs[(job_head + job_count) % MAX_JOBS].func = func;
+			jobs[(job_head + job_count) % MAX_JOBS].arg = arg;
+			job_count++;
+			jobs_pending++;
+			SIGNAL(cond_job);
+			UNLOCK();
+			return;
+		}
+		UNLOCK();
+	}
+	(*func)(arg);
+}
+
+void quisk_workers_wait(void)
+{	// Wait for all submitted jobs to finish
+	if ( ! num_workers)
+		return;
+	LOCK();
+	while (jobs_pending)
+		WAIT(cond_done);
+	UNLOCK();
+}
+
+struct thread_start {
+	quisk_job_func func;
+	void * arg;
+#ifdef MS_WINDOWS
+	HANDLE handle;
+#else
+	pthread_t handle;
+#endif
+} ;
+
+#ifdef MS_WINDOWS
+static DWORD WINAPI thread_main(LPVOID arg)
+#else
+static void * thread_main(void * arg)
+#endif
+{
+	struct thread_start * ts = (struct thread_start *)arg;
+
+	(*ts->func)(ts->arg);
+	return 0;
+}
+
+void * quisk_thread_start(quisk_job_func func, void * arg)
+{	// Start a thread to run func(arg) and return its handle, or NULL for an error
+	struct thread_start * ts;
+
+	ts = (struct thread_start *)malloc(sizeof(struct thread_start));
+	ts->func = func;
+	ts->arg = arg;
+#ifdef MS_WINDOWS
+	ts->handle = CreateThread(NULL, WORKER_STACK_SIZE, thread_main, ts, 0, NULL);
+	if (ts->handle)
+		return ts;
+#else
+	if (pthread_create(&ts->handle, NULL, thread_main, ts) == 0)
+		return ts;
+#endif
+	free(ts);
+	return NULL;
+}
+
+void quisk_thread_join(void * handle)
+{	// Wait for the thread from quisk_thread_start() to return
+	struct thread_start * ts = (struct thread_start *)handle;
+
+#ifdef MS_WINDOWS
+	WaitForSingleObject(ts->handle, INFINITE);
+	CloseHandle(ts->handle);
+#else
+	pthread_join(ts->handle, NULL);
+#endif
+	free(ts);
+}
+
+struct quisk_lock * quisk_lock_new(void)
+{	// Return a new lock.  Locks are never freed.
+	struct quisk_lock * lk;
+
+	lk = (struct quisk_lock *)malloc(sizeof(struct quisk_lock));
+#ifdef MS_WINDOWS
+	InitializeCriticalSection(&lk->cs);
+#else
+	pthread_mutex_init(&lk->mutex, NULL);
+#endif
+	return lk;
+}
+
+void quisk_lock_acquire(struct quisk_lock * lk)
+{
+#ifdef MS_WINDOWS
+	EnterCriticalSection(&lk->cs);
+#else
+	pthread_mutex_lock(&lk->mutex);
+#endif
+}
+
+void quisk_lock_release(struct quisk_lock * lk)
+{
+#ifdef MS_WINDOWS
+	LeaveCriticalSection(&lk->cs);
+#else
+	pthread_mutex_unlock(&lk->mutex);
+#endif
+}
+
+struct quisk_cond * quisk_cond_new(void)
+{	// Return a new condition variable.  Conditions are never freed.
+	struct quisk_cond * cond;
+
+	cond = (struct quisk_cond *)malloc(sizeof(struct quisk_cond));
+#ifdef MS_WINDOWS
+	cond->sem = CreateSemaphore(NULL, 0, 0x7FFFFFFF, NULL);
+	cond->waiters = 0;
+#else
+	pthread_cond_init(&cond->cond, NULL);
+#endif
+	return cond;
+}
+
+int quisk_cond_wait(struct quisk_cond * cond, struct quisk_lock * lk, double secs)
+{	// Wait for the condition with the lock held.  Wait forever if secs is negative.
+	// Return zero for a timeout.
+#ifdef MS_WINDOWS
+	DWORD ret;
+
+	cond->waiters++;
+	LeaveCriticalSection(&lk->cs);
+	ret = WaitForSingleObject(cond->sem, secs < 0 ? INFINITE : (DWORD)(secs * 1e3 + 1));
+	EnterCriticalSection(&lk->cs);
+	cond->waiters--;
+	return ret == WAIT_OBJECT_0;
+#else
+	struct timespec ts;
+	struct timeval tv;
+
+	if (secs < 0)
+		return pthread_cond_wait(&cond->cond, &lk->mutex) == 0;
+	gettimeofday(&tv, NULL);
+	ts.tv_sec = tv.tv_sec + (time_t)secs;
+	ts.tv_nsec = tv.tv_usec * 1000 + (long)((secs - (time_t)secs) * 1e9);
+	if (ts.tv_nsec >= 1000000000) {
+		ts.tv_sec++;
+		ts.tv_nsec -= 1000000000;
+	}
+	return pthread_cond_timedwait(&cond->cond, &lk->mutex, &ts) == 0;
+#endif
+}
+
+void quisk_cond_signal(struct quisk_cond * cond)
+{	// Wake up one waiting thread.  Call with the lock held.
+#ifdef MS_WINDOWS
+	if (cond->waiters)
+		ReleaseSemaphore(cond->sem, 1, NULL);
+#else
+	pthread_cond_signal(&cond->cond);
+#endif
+}
+
+void quisk_cond_broadcast(struct quisk_cond * cond)
+{	// Wake up all waiting threads.  Call with the lock held.
+#ifdef MS_WINDOWS
+	if (cond->waiters)
+		ReleaseSemaphore(cond->sem, cond->waiters, NULL);
+#else
+	pthread_cond_broadcast(&cond->cond);
+#endif
+}
+
+double quisk_stage_end(int stage, double t0)
+{	// Add the time since t0 to the stage, and return the current time to start the next stage
+	double t1, dt;
+
+	t1 = QuiskTimeSec();
+	dt = t1 - t0;
+	stage_count[stage]++;
+	stage_total[stage] += dt;
+	if (stage_max[stage] < dt)
+		stage_max[stage] = dt;
+	return t1;
+}
+
+PyObject * quisk_set_worker_threads(PyObject * self, PyObject * args)
+{	// Start the worker pool with this many threads, or zero to stop it.  Return the
+	// number of threads started.
+	int n;
+
+	if (!PyArg_ParseTuple (args, "i", &n))
+		return NULL;
+Py_BEGIN_ALLOW_THREADS
+	n = quisk_workers_start(n);
+Py_END_ALLOW_THREADS
+	return PyInt_FromLong(n);
+}
+
+PyObject * quisk_get_stage_times(PyObject * self, PyObject * args)
+{	// Return a tuple of (name, count, average microseconds, maximum microseconds) for
+	// each processing stage.  If reset is true, start new statistics.
+	int i, reset = 0;
+	double average;
+	PyObject * tuple;
+
+	if (!PyArg_ParseTuple (args, "|i", &reset))
+		return NULL;
+	tuple = PyTuple_New(QUISK_STAGES);
+	for (i = 0; i < QUISK_STAGES; i++) {
+		if (stage_count[i])
+			average = stage_total[i] / stage_count[i] * 1e6;
+		else
+			average = 0;
+		PyTuple_SetItem(tuple, i, Py_BuildValue("sidd", stage_names[i],
+			stage_count[i], average, stage_max[i] * 1e6));
+		if (reset) {
+			stage_count[i] = 0;
+			stage_total[i] = 0;
+			stage_max[i] = 0;
+		}
+	}
+	return tuple;
+}
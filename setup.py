@@ -18,7 +18,18 @@ if sys.platform == 'win32':
                 'ext/_quisk/microphone.c',
                 'ext/_quisk/utility.c',
                 'ext/_quisk/filter.c',
-                'ext/_quisk/extdemod.c'
+                'ext/_quisk/filter_design.c',
+                'ext/_quisk/frontend.c',
+                'ext/_quisk/benchmark.c',
+                'ext/_quisk/extdemod.c',
+                'ext/_quisk/fast_conv.c',
+                'ext/_quisk/fft_ring.c',
+                'ext/_quisk/fft_plans.c',
+                'ext/_quisk/nco.c',
+                'ext/_quisk/receiver.c',
+                'ext/_quisk/rx_udp.c',
+                'ext/_quisk/file_source.c',
+                'ext/_quisk/workers.c'
             ]),
         Extension('sdriqpkg.sdriq',
             libraries=[':_quisk.pyd', ':ftd2xx.lib'],
@@ -29,7 +40,7 @@ if sys.platform == 'win32':
 else:
     ext_modules = [
         Extension('_quisk',
-            libraries=['asound', 'portaudio', 'fftw3', 'm'],
+            libraries=['asound', 'portaudio', 'fftw3', 'fftw3_threads', 'm', 'pthread'],
             sources=[
                 'ext/_quisk/quisk.c',
                 'ext/_quisk/sound.c',
@@ -39,7 +50,18 @@ else:
                 'ext/_quisk/microphone.c',
                 'ext/_quisk/utility.c',
                 'ext/_quisk/filter.c',
+                'ext/_quisk/filter_design.c',
+                'ext/_quisk/frontend.c',
+                'ext/_quisk/benchmark.c',
                 'ext/_quisk/extdemod.c',
+                'ext/_quisk/fast_conv.c',
+                'ext/_quisk/fft_ring.c',
+                'ext/_quisk/fft_plans.c',
+                'ext/_quisk/nco.c',
+                'ext/_quisk/receiver.c',
+                'ext/_quisk/rx_udp.c',
+                'ext/_quisk/file_source.c',
+                'ext/_quisk/workers.c',
             ]),
         Extension('sdriqpkg.sdriq',
             libraries=['m'],
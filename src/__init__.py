@@ -20,7 +20,7 @@ if sys.path[0] != "'.'":		# Make sure the current working directory is on path
   sys.path.insert(0, '.')
 
 import wx, wx.html, wx.lib.buttons, wx.lib.stattext, wx.lib.colourdb
-import math, cmath, time, traceback
+import math, cmath, time, traceback, array
 import threading, pickle, webbrowser
 import _quisk as QS
 from types import *
@@ -157,6 +157,16 @@ class ConfigScreen(wx.ScrolledWindow):
     self.write_error = -1
     self.underrun_error = -1
     self.fft_error = -1
+    self.fft_ring_depth = 0
+    self.fft_ring_used = 0
+    self.fft_ring_max = 0
+    self.fft_dropped = 0
+    self.udp_depth = 0
+    self.udp_buffered = 0
+    self.udp_lost = 0
+    self.udp_late = 0
+    self.udp_reordered = 0
+    self.stage_times = {}	# average/maximum microseconds for each processing stage
     self.latencyCapt = -1
     self.latencyPlay = -1
     self.y_scale = 0
@@ -196,7 +206,7 @@ class ConfigScreen(wx.ScrolledWindow):
         break
       points -= 2
     self.dy = chary		# line spacing
-    self.mem_height = self.dy * 4
+    self.mem_height = self.dy * 6
     self.bitmap = wx.EmptyBitmap(width, self.mem_height)
     self.mem_rect = wx.Rect(0, 0, width, self.mem_height)
     self.mem_dc = wx.MemoryDC(self.bitmap)
@@ -225,6 +235,14 @@ class ConfigScreen(wx.ScrolledWindow):
     self.y += self.dy
     dc.DrawText(application.config_text, x0, self.y)
     self.y += self.dy
+    loaded, wisdom, measured, reused, msec, saved = QS.get_plan_stats()
+    if loaded:
+      t = "FFT plans: %d from saved wisdom" % wisdom
+    else:
+      t = "FFT plans: no saved wisdom"
+    t = "%s, %d measured, %.0f msec planning; %d reused, %.0f msec saved." % (t, measured, msec, reused, saved)
+    dc.DrawText(t, x0, self.y)
+    self.y += self.dy
     if conf.name_of_sound_play:
       t = "Play rate %d to %s." % (conf.playback_rate,  conf.name_of_sound_play)
     else:
@@ -324,6 +342,19 @@ class ConfigScreen(wx.ScrolledWindow):
     self.MakeRow2(self.mem_dc, "Sample rate", application.sample_rate,
                  "Mic level dB", level,
                  None, None, "FFT points", self.fft_size)
+    self.MakeRow2(self.mem_dc, "FFT ring depth", self.fft_ring_depth,
+                 "FFT ring used", "%d/%d" % (self.fft_ring_used, self.fft_ring_max),
+                 None, None, "FFT blocks dropped", self.fft_dropped)
+    if conf.use_rx_udp:
+      self.MakeRow2(self.mem_dc, "UDP lost", self.udp_lost,
+                   "UDP late", self.udp_late,
+                   "UDP reordered", self.udp_reordered,
+                   "UDP buffer", "%d/%d" % (self.udp_buffered, self.udp_depth))
+    t = self.stage_times
+    self.MakeRow2(self.mem_dc, "Front usec", t.get('front', '-'),
+                 "Receivers usec", t.get('receivers', '-'),
+                 "FFT usec", t.get('fft', '-'),
+                 "Worker threads", application.worker_threads)
     if self.err_msg:		# Error message on line 4
       x = self.tabstops[0]
       self.mem_dc.SetTextForeground('Red')
@@ -335,9 +366,14 @@ class ConfigScreen(wx.ScrolledWindow):
          self.msg1, self.unused, self.err_msg,
          self.read_error, self.write_error, self.underrun_error,
          self.latencyCapt, self.latencyPlay, self.interupts, self.fft_error, self.mic_max_display,
-         self.data_poll_usec
+         self.data_poll_usec, self.fft_ring_depth, self.fft_ring_used, self.fft_ring_max,
+         self.fft_dropped, self.udp_depth, self.udp_buffered, self.udp_lost, self.udp_late,
+         self.udp_reordered
 	 ) = QS.get_state()
     self.mic_max_display = 20.0 * math.log10((self.mic_max_display + 1) / 32767.0)
+    for name, count, average, maximum in QS.get_stage_times(1):
+      if count:
+        self.stage_times[name] = "%d/%d" % (average, maximum)
     self.RefreshRect(self.mem_rect)
   def ChangeYscale(self, y_scale):
     pass
@@ -393,7 +429,6 @@ class GraphDisplay(wx.Window):
     self.tune_tx = graph_width / 2	# Current X position of the Tx tuning line
     self.tune_rx = 0				# Current X position of Rx tuning line or zero
     self.scale = 20				# pixels per 10 dB
-    self.peak_hold = 9999		# time constant for holding peak value
     self.height = 10
     self.y_min = 1000
     self.y_max = 0
@@ -433,16 +468,12 @@ class GraphDisplay(wx.Window):
     self.SetSize((self.graph_width, height))
   def OnGraphData(self, data):
     x = 0
-    for y in data:	# y is in dB, -130 to 0
+    for y in data:	# y is in dB, -130 to 0; the peak hold is done in C
       y = self.zeroDB - int(y * self.scale / 10.0 + 0.5)
       try:
-        y0 = self.line[x][1]
+        self.line[x] = [x, y]
       except IndexError:
         self.line.append([x, y])
-      else:
-        if y > y0:
-          y = min(y, y0 + self.peak_hold)
-        self.line[x] = [x, y]
       x = x + 1
     self.Refresh()
   def XXOnGraphData(self, data):
@@ -785,14 +816,13 @@ class GraphScreen(wx.Window):
   def ChangeHwFrequency(self, tune, vfo, source, event):
     application.ChangeHwFrequency(tune, vfo, source, event)
   def PeakHold(self, name):
+    # The peak hold decay is in units of 10 dB per graph
     if name == 'GraphP1':
-      self.display.peak_hold = int(self.display.scale * conf.graph_peak_hold_1)
+      QS.set_peak_hold(max(conf.graph_peak_hold_1 * 10.0, 0.1))
     elif name == 'GraphP2':
-      self.display.peak_hold = int(self.display.scale * conf.graph_peak_hold_2)
+      QS.set_peak_hold(max(conf.graph_peak_hold_2 * 10.0, 0.1))
     else:
-      self.display.peak_hold = 9999
-    if self.display.peak_hold < 1:
-      self.display.peak_hold = 1
+      QS.set_peak_hold(9999)
 
 class WaterfallDisplay(wx.Window):
   """Create a waterfall display within the waterfall screen."""
@@ -838,14 +868,39 @@ class WaterfallDisplay(wx.Window):
       blue.append((i - pal2[n][0]) *
        (long)(pal2[n+1][3] - pal2[n][3]) /
        (long)(pal2[n+1][0] - pal2[n][0]) + pal2[n][3])
-    self.red = red
-    self.green = green
-    self.blue = blue
-    bmp = wx.EmptyBitmap(0, 0)
-    bmp.x_origin = 0
-    self.bitmaps = [bmp] * application.screen_height
+    # The palette is a string of 256 RGB entries for QS.waterfall_row()
+    self.palette = ''.join(["%c%c%c" % (red[i], green[i], blue[i]) for i in range(256)])
+    # The waterfall rows are kept in a circular buffer of rows in one bitmap.  Each new row
+    # is written in place above the previous row, and wf_top is the row of the newest data.
+    # The list wf_runs is [x_origin, count] for each group of rows with the same x_origin,
+    # newest first, so a change in the VFO moves old rows without drawing them again.
+    self.wf_height = application.screen_height
+    self.wf_bitmap = self.MakeWfBitmap()
+    self.wf_top = 0
+    self.wf_runs = [[0, self.wf_height]]
     if sys.platform == 'win32':
       self.Bind(wx.EVT_ENTER_WINDOW, self.OnEnter)
+  def MakeWfBitmap(self):
+    bmp = wx.EmptyBitmap(self.graph_width, self.wf_height)
+    dc = wx.MemoryDC(bmp)
+    dc.SetBackground(wx.Brush('Black'))
+    dc.Clear()
+    dc.SelectObject(wx.NullBitmap)
+    return bmp
+  def RowOrigin(self, index):
+    # Return the x_origin of row index; zero is the newest row
+    for origin, count in self.wf_runs:
+      if index < count:
+        break
+      index -= count
+    return origin
+  def BlitRows(self, dc, src, x, y, index, count):
+    # Copy count rows starting at row index from the circular buffer to dc at x, y
+    row = (self.wf_top + index) % self.wf_height
+    n = min(count, self.wf_height - row)
+    dc.Blit(x, y, self.graph_width, n, src, 0, row)
+    if count > n:		# the rows wrap around to the start of the bitmap
+      dc.Blit(x, y + n, self.graph_width, count - n, src, 0, 0)
   def OnEnter(self, event):
     if not application.w_phase:
       self.SetFocus()	# Set focus so we get mouse wheel events
@@ -859,21 +914,27 @@ class WaterfallDisplay(wx.Window):
     for i in range(0, self.margin):
       dc.DrawLine(0, y, self.graph_width, y)
       y += 1
-    index = 0
+    src = wx.MemoryDC(self.wf_bitmap)
+    index = 0		# row number; zero is the newest row
     if conf.waterfall_scroll_mode:	# Draw the first few lines multiple times
       for i in range(self.top_key, 1, -1):
-        b = self.bitmaps[index]
-        x = b.x_origin - x_origin
+        x = self.RowOrigin(index) - x_origin
         for j in range(0, i):
-          dc.DrawBitmap(b, x, y)
+          self.BlitRows(dc, src, x, y, index, 1)
           y += 1
         index += 1
-    while y < self.height:
-      b = self.bitmaps[index]
-      x = b.x_origin - x_origin
-      dc.DrawBitmap(b, x, y)
-      y += 1
-      index += 1
+    start = 0
+    for origin, count in self.wf_runs:	# Draw the remaining rows one run at a time
+      end = start + count
+      if end > index:
+        n = min(end - index, self.height - y)
+        if n <= 0:
+          break
+        self.BlitRows(dc, src, origin - x_origin, y, index, n)
+        y += n
+        index += n
+      start = end
+    src.SelectObject(wx.NullBitmap)
     dc.SetPen(self.tuningPen)
     dc.SetLogicalFunction(wx.XOR)
     dc.DrawLine(self.tune_tx, 0, self.tune_tx, self.height)
@@ -884,17 +945,24 @@ class WaterfallDisplay(wx.Window):
     self.SetSize((self.graph_width, height))
   def OnGraphData(self, data, y_zero, y_scale):
     #T('graph start')
-    row = ''		# Make a new row of pixels for a one-line image
-    for x in data:	# x is -130 to 0, or so (dB)
-      l = int((x + y_zero / 3 + 100) * y_scale / 10)
-      l = max(l, 0)
-      l = min(l, 255)
-      row = row + "%c%c%c" % (chr(self.red[l]), chr(self.green[l]), chr(self.blue[l]))
+    # Make a new row of pixels for a one-line image; data is -130 to 0, or so (dB)
+    row = QS.waterfall_row(data, self.palette, y_zero / 3 + 100, y_scale / 10.0)
     #T('graph string')
     bmp = wx.BitmapFromBuffer(len(row) / 3, 1, row)
-    bmp.x_origin = int(float(self.VFO) / self.sample_rate * self.data_width + 0.5)
-    self.bitmaps.insert(0, bmp)
-    del self.bitmaps[-1]
+    x_origin = int(float(self.VFO) / self.sample_rate * self.data_width + 0.5)
+    # Write the new row in place of the oldest row
+    self.wf_top = (self.wf_top - 1) % self.wf_height
+    dc = wx.MemoryDC(self.wf_bitmap)
+    dc.DrawBitmap(bmp, 0, self.wf_top)
+    dc.SelectObject(wx.NullBitmap)
+    runs = self.wf_runs
+    if runs[0][0] == x_origin:
+      runs[0][1] += 1
+    else:
+      runs.insert(0, [x_origin, 1])
+    runs[-1][1] -= 1		# the oldest row is gone
+    if runs[-1][1] <= 0:
+      del runs[-1]
     #self.ScrollWindow(0, 1, None)
     #self.Refresh(False, (0, 0, self.graph_width, self.top_size + self.margin))
     self.Refresh(False)
@@ -1131,7 +1199,7 @@ class FilterScreen(GraphScreen):
     self.data = []
     self.sample_rate = QS.get_filter_rate()
   def NewFilter(self):
-    self.data = QS.get_filter()
+    self.data = QS.get_filter(array.array('d', [0.0]) * self.data_width)
     #self.data = QS.get_tx_filter()
   def OnGraphData(self, data):
     GraphScreen.OnGraphData(self, self.data)
@@ -1367,6 +1435,7 @@ class App(wx.App):
     global application
     application = self
     self.init_path = None
+    self.wisdom_path = None
     if sys.stdout.isatty():
       wx.App.__init__(self, redirect=False)
     else:
@@ -1505,8 +1574,10 @@ The new code supports multiple corrections per band."""
     # The FFT size times the average_count controls the graph refresh rate
     factor = float(self.sample_rate) / conf.graph_refresh / self.data_width
     ifactor = int(factor + 0.5)
+    overlap = min(max(conf.fft_overlap, 0.0), 0.9)	# Overlap of successive FFT blocks
     if conf.fft_size_multiplier >= ifactor:	# Use large FFT and average count 1
-      fft_mult = ifactor
+      # With overlap, the FFT can be longer than the samples for each graph
+      fft_mult = min(conf.fft_size_multiplier, int(ifactor / (1.0 - overlap) + 0.5))
       average_count = 1
     elif conf.fft_size_multiplier > 0:		# Specified fft_size_multiplier
       fft_mult = conf.fft_size_multiplier
@@ -1537,6 +1608,11 @@ The new code supports multiple corrections per band."""
           fft_mult = fft2
           average_count = av2
     self.fft_size = self.data_width * fft_mult
+    # Each FFT block starts fft_hop samples after the previous one; see fft_ring.c
+    self.fft_hop = self.fft_size - int(self.fft_size * overlap + 0.5)
+    if overlap > 0.0:	# Average more FFT's for the same refresh rate
+      average_count = float(self.sample_rate) / conf.graph_refresh / self.fft_hop
+      average_count = max (1, int(average_count + 0.5))
     # print 'data, graph,fft', self.data_width, self.graph_width, self.fft_size
     self.width = self.screen_width * 8 / 10
     self.height = self.screen_height * 5 / 10
@@ -1547,8 +1623,17 @@ The new code supports multiple corrections per band."""
       h = self.main_frame.GetHandle()
     else:
       h = 0
+    # Read the fftw wisdom saved on the last exit before any FFT's are planned
+    if conf.fftw_wisdom:
+      self.wisdom_path = os.path.join(os.path.dirname(ConfigPath), '.quisk_fftw_wisdom')
+      if os.path.isfile(self.wisdom_path):
+        QS.import_wisdom(self.wisdom_path)
     QS.record_app(self, conf, self.data_width, self.fft_size,
                  average_count, self.sample_rate, h)
+    # QS.get_graph() fills this buffer, so no Python objects are created for each point
+    self.graph_data = array.array('d', [0.0]) * self.data_width
+    self.graph_peak = array.array('d', [0.0]) * self.data_width	# graph data with peak hold
+    self.worker_threads = QS.set_worker_threads(conf.worker_threads)
     #print 'FFT size %d, FFT mult %d, average_count %d' % (
     #    self.fft_size, self.fft_size / self.data_width, average_count)
     #print 'Refresh %.2f Hz' % (float(self.sample_rate) / self.fft_size / average_count)
@@ -1654,6 +1739,7 @@ The new code supports multiple corrections per band."""
                 conf.microphone_name, conf.tx_ip, conf.tx_audio_port,
                 conf.mic_sample_rate, conf.mic_channel_I, conf.mic_channel_Q,
 				conf.mic_out_volume, conf.name_of_mic_play, conf.mic_playback_rate)
+    self.PrewarmFilters()		# The filter rate is now valid
     tune, vfo = Hardware.ReturnFrequency()	# Request initial frequency
     #### Change below here
     if tune is None:			# Change to last-used frequency
@@ -1702,6 +1788,8 @@ The new code supports multiple corrections per band."""
   def OnExit(self):
     QS.close_rx_udp()
     Hardware.close()
+    if self.wisdom_path:		# save the fftw plans for the next start
+      QS.export_wisdom(self.wisdom_path)
     if self.init_path:		# save current program state
       d = {}
       for n in self.StateNames:
@@ -1893,99 +1981,25 @@ The new code supports multiple corrections per band."""
       buttons[i].Refresh()
   def MakeFilterCoef(self, rate, N, bw, center):
     """Make an I/Q filter with rectangular passband."""
-    K = bw * N / rate
-    filtI = []
-    filtQ = []
-    pi = math.pi
-    sin = math.sin
-    cos = math.cos
-    tune = 2. * pi * center / rate
-    for k in range(-N/2, N/2 + 1):
-      # Make a lowpass filter
-      if k == 0:
-        z = float(K) / N
-      else:
-        z = 1.0 / N * sin(pi * k * K / N) / sin(pi * k / N)
-      # Apply a windowing function
-      if 1:	# Blackman window
-        w = 0.42 + 0.5 * cos(2. * pi * k / N) + 0.08 * cos(4. * pi * k / N)
-      elif 0:	# Hamming
-        w = 0.54 + 0.46 * cos(2. * pi * k / N)
-      elif 0:	# Hanning
-        w = 0.5 + 0.5 * cos(2. * pi * k / N)
-      else:
-        w = 1
-      z *= w
-      # Make a bandpass filter by tuning the low pass filter to new center frequency.
-      # Make two quadrature filters.
-      if tune:
-        z *= 2.0 * cmath.exp(-1j * tune * k)
-        filtI.append(z.real)
-        filtQ.append(z.imag)
-      else:
-        filtI.append(z)
-        filtQ.append(z)
-    return filtI, filtQ
+    return QS.design_filter(rate, N, bw, center, conf.filter_design)
   def MakeFmFilterCoef(self, rate, N, f1, f2):
     """Make an audio filter with FM de-emphasis; remove CTCSS tones."""
-    bw = f2 - f1
-    center = (f1 + f2) / 2
-    N2 = N / 2				# Half the number of points
-    K2 = bw * N / rate / 2	# Half the bandwidth in points
-    filtI = []
-    filtQ = []
-    passb = [0] * (N + 1)		# desired passband response
-    idft = [0] * (N + 1)		# inverse DFT of desired passband
-    pi = math.pi
-    sin = math.sin
-    cos = math.cos
-    tune = 2. * pi * center / rate
-    # indexing can be from - N2 thru + N2 inclusive; total points is 2 * N2 + 1
-    # indexing can be from 0 thru 2 * N2 inclusive; total points is 2 * N2 + 1
-    for j in range(-K2, K2 + 1):		# Filter shape is -6 bB per octave
-      jj = j + N2
-      freq = center - bw / 2.0 * float(j) / K2
-      passb[jj] = float(center) / freq * 0.3
-    for k in range(-N2 + 1, N2 + 1):		# Take inverse DFT of passband response
-      kk = k + N2
-      x = 0 + 0J
-      for m in range(-N2, N2 + 1):
-        mm = m + N2
-        if passb[mm]:
-          x += passb[mm] * cmath.exp(1J * 2.0 * pi * m * k / N)
-      x /= N
-      idft[kk] = x
-    idft[0] = idft[-1]		# this value is missing
-    for k in range(-N2, N2 + 1):
-      kk = k + N2
-      z = idft[kk]
-      # Apply a windowing function
-      if 1:	# Blackman window
-        w = 0.42 + 0.5 * cos(2. * pi * k / N) + 0.08 * cos(4. * pi * k / N)
-      elif 0:	# Hamming
-        w = 0.54 + 0.46 * cos(2. * pi * k / N)
-      elif 0:	# Hanning
-        w = 0.5 + 0.5 * cos(2. * pi * k / N)
-      else:
-        w = 1
-      z *= w
-      # Make a bandpass filter by tuning the low pass filter to new center frequency.
-      # Make two quadrature filters.
-      if tune:
-        z *= 2.0 * cmath.exp(-1j * tune * k)
-        filtI.append(z.real)
-        filtQ.append(z.imag)
-      else:
-        filtI.append(z.real)
-        filtQ.append(z.real)
-    return filtI, filtQ
+    return QS.design_filter(rate, N, f2 - f1, (f1 + f2) / 2, 'fm')
   def OnBtnFilter(self, event, bw=None):
     if event is None:	# called by application
       self.filterButns.SetLabel(str(bw))
     else:		# called by button
       btn = event.GetEventObject()
       bw = int(btn.GetLabel())
-    mode = self.mode
+    filtI, filtQ = self.MakeModeFilter(self.mode, bw)
+    QS.set_filters(filtI, filtQ, bw)
+    if self.screen is self.filter_screen:
+      self.screen.NewFilter()
+  def MakeModeFilter(self, mode, bw):
+    """Make the receive filter for a mode and bandwidth at the filter sample rate."""
+    return self.MakeFilterCoef(*self.ModeFilterArgs(mode, bw))
+  def ModeFilterArgs(self, mode, bw):
+    """Return the filter rate, taps, bandwidth and center for a mode."""
     if mode in ("CWL", "CWU"):
       N = 1000
       center = max(conf.cwTone, bw/2)
@@ -1996,10 +2010,38 @@ The new code supports multiple corrections per band."""
       N = 140
       center = 0
     frate = QS.get_filter_rate()
-    filtI, filtQ = self.MakeFilterCoef(frate, N, bw, center)
-    QS.set_filters(filtI, filtQ, bw)
-    if self.screen is self.filter_screen:
-      self.screen.NewFilter()
+    return frate, N, bw, center
+  def PrewarmFilters(self):
+    # Design the filters for all the filter buttons in a native thread before they are used
+    designs = []
+    for mode, widths in (('CWU', conf.FilterBwCW), ('USB', conf.FilterBwSSB),
+        ('AM', conf.FilterBwAM), ('FM', conf.FilterBwFM), ('IMD', conf.FilterBwIMD),
+        ('EXT', conf.FilterBwEXT)):
+      for bw in widths:
+        designs.append(self.ModeFilterArgs(mode, bw) + (conf.filter_design,))
+    QS.prewarm_filters(designs)
+  def SetSubFilters(self):
+    # Send the filters for the sub-receivers in conf.sub_receivers to C
+    for i in range(len(conf.sub_receivers)):
+      freq, mode, bw, volume, channels = conf.sub_receivers[i]
+      filtI, filtQ = self.MakeModeFilter(mode, bw)
+      QS.set_sub_filters(i + 1, filtI, filtQ)
+  def SetSubReceivers(self):
+    # Tune the sub-receivers to their frequencies, and mute any that are outside the band
+    modes = {'CWL':0, 'CWU':1, 'LSB':2, 'USB':3, 'AM':4, 'FM':5}
+    chans = {'left':1, 'right':2, 'both':3}
+    for i in range(len(conf.sub_receivers)):
+      freq, mode, bw, volume, channels = conf.sub_receivers[i]
+      tune = freq - self.VFO
+      if mode == 'CWL':
+        tune += conf.cwTone
+      elif mode == 'CWU':
+        tune -= conf.cwTone
+      if abs(tune) > self.sample_rate / 2:
+        chan = 0
+      else:
+        chan = chans[channels]
+      QS.set_sub_receiver(i + 1, int(tune), modes[mode], volume, chan)
   def OnBtnScreen(self, event, name=None):
     if event is not None:
       win = event.GetEventObject()
@@ -2074,10 +2116,12 @@ The new code supports multiple corrections per band."""
       self.waterfall.pane1.sample_rate = rate
       self.waterfall.pane2.sample_rate = rate
       self.waterfall.pane2.display.sample_rate = rate
-      average_count = float(rate) / conf.graph_refresh / self.fft_size
+      average_count = float(rate) / conf.graph_refresh / self.fft_hop
       average_count = int(average_count + 0.5)
       average_count = max (1, average_count)
       QS.change_rate(rate, average_count)
+      self.PrewarmFilters()
+      self.SetSubFilters()
       tune = self.txFreq
       vfo = self.VFO
       self.txFreq = self.VFO = -1		# demand change
@@ -2251,6 +2295,7 @@ The new code supports multiple corrections per band."""
       QS.set_ampl_phase(ampl, phase, 0)
       ampl, phase = self.GetAmplPhase(1)
       QS.set_ampl_phase(ampl, phase, 1)
+      self.SetSubReceivers()
     if change:
       self.freqDisplay.Display(self.txFreq + self.VFO)
     return change
@@ -2440,6 +2485,8 @@ The new code supports multiple corrections per band."""
     return ampl, phas
   def PostStartup(self):	# called once after sound attempts to start
     self.config_screen.OnGraphData(None)	# update config in case sound is not running
+    self.SetSubFilters()
+    self.SetSubReceivers()
   def OnReadSound(self):	# called at frequent intervals
     self.timer = time.time()
     if self.screen == self.scope:
@@ -2448,13 +2495,13 @@ The new code supports multiple corrections per band."""
         self.scope.OnGraphData(data)			# Send message to draw new data
         return 1		# we got new graph/scope data
     else:
-      data = QS.get_graph(1, self.zoom, float(self.zoom_deltaf))	# get FFT data
+      data = QS.get_graph(1, self.zoom, float(self.zoom_deltaf), self.graph_data, self.graph_peak)	# get FFT data
       if data:
         #T('')
         self.NewSmeter()			# update the S-meter
         if self.screen == self.graph:
           self.waterfall.OnGraphData(data)		# save waterfall data
-          self.graph.OnGraphData(data)			# Send message to draw new data
+          self.graph.OnGraphData(self.graph_peak)	# Send message to draw new data
         elif self.screen == self.config_screen:
           pass
         else:
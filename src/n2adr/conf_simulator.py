@@ -0,0 +1,16 @@
+# This is a sample config file to receive samples from the UDP simulator udp_simulator.py
+# on this computer.  Start the simulator first:
+#	python udp_simulator.py
+
+from n2adr import hardware_transceiver as quisk_hardware
+
+use_rx_udp = 1					# Get ADC samples from UDP
+rx_udp_ip = "127.0.0.1"			# The simulator is on this computer
+rx_udp_port = 0xBC77			# Sample source UDP port
+rx_udp_clock = 122880000  		# ADC sample rate in Hertz
+rx_udp_decimation = 8 * 8 * 8	# Decimation from clock to UDP sample rate
+sample_rate = int(float(rx_udp_clock) / rx_udp_decimation + 0.5)	# Don't change this
+name_of_sound_capt = ""			# We do not capture from the soundcard
+name_of_sound_play = ""			# Do not play, so no sound card is needed
+data_poll_usec = 10000
+playback_rate = 48000
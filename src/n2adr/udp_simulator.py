@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# This is a simulator for the UDP sample source in my receiver hardware.  It sends I/Q
+# samples to Quisk on this computer, so you can test and benchmark the use_rx_udp
+# capture without the hardware.  Use the config file conf_simulator.py, and start the
+# simulator before Quisk:
+#	python udp_simulator.py --rate 960000 --tone 12000,-20 --loss 0.001
+# Use "--help" for all the options.
+#
+# The protocol is the same as the hardware:
+#	Quisk sends 0x72 0x72 to the sample port to register its return address, and 0x73 0x73
+#	to stop the samples.  Each sample packet is 1442 bytes:
+#		[0]			sequence number, 0 to 255
+#		[1]			status: bit 0 is the key state, bit 1 is set for ADC overrange
+#		[2:1442]	240 samples of 24-bit little-endian I and Q
+#	The control port is the sample port plus one.  The hardware file sends an "St" status
+#	block, and the simulator returns it with the firmware version in byte 13.  Byte 12 is
+#	the second stage decimation less one, and it sets the sample rate unless you use --rate.
+#
+# The samples are calculated once for a table of TABLE_PACKETS packets, and the table is
+# sent over and over.  The tone frequencies and the pulse rate are rounded so the table
+# repeats smoothly.  This is fast enough for several million samples per second.
+
+import sys, time, math, random, socket, select, struct, array
+from optparse import OptionParser
+
+PACKET_SAMPLES = 240		# samples in each packet
+TABLE_PACKETS = 1024		# packets in the sample table
+FULL_SCALE = 2 ** 23 - 1	# largest 24-bit sample
+FIRMWARE_VERSION = 3
+
+class Simulator:
+  def __init__(self, options):
+    self.options = options
+    self.rate = 0
+    self.table = []			# the payload of each packet in the table
+    self.clipped = []		# does this packet of the table have a clipped sample?
+    self.tones = []
+    for t in options.tones:
+      t = t.split(',')
+      freq = float(t[0])
+      if len(t) > 1:
+        level = float(t[1])
+      else:
+        level = -20.0
+      self.tones.append((freq, level))
+    self.data_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    self.data_sock.bind((options.host, options.port))
+    self.data_sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024 * 1024)
+    self.ctrl_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    self.ctrl_sock.bind((options.host, options.port + 1))
+    self.client = None		# return address for samples
+    self.seq = 0
+    self.held = None		# packet held back to send out of order
+    self.ResetStats()
+  def ResetStats(self):
+    self.sent = 0
+    self.dropped = 0
+    self.reordered = 0
+    self.duplicated = 0
+    self.behind = 0			# largest number of packets we were behind
+  def MakeTable(self, rate):
+    # Calculate the payload of each packet in the table
+    self.rate = rate
+    o = self.options
+    length = PACKET_SAMPLES * TABLE_PACKETS
+    tones = []
+    for freq, level in self.tones:	# round the frequency to repeat in the table
+      cycles = int(round(freq * length / rate))
+      tones.append((2.0 * math.pi * cycles / length, FULL_SCALE * 10.0 ** (level / 20.0)))
+    noise = FULL_SCALE * 10.0 ** (o.noise / 20.0) / math.sqrt(2.0)
+    if o.pulse_rate > 0:
+      pulses = max(1, int(round(o.pulse_rate * length / rate)))
+      pulse_period = length // pulses
+    else:
+      pulse_period = 0
+    pulse = FULL_SCALE * 10.0 ** (o.pulse_level / 20.0)
+    gauss = random.gauss
+    self.table = []
+    self.clipped = []
+    n = 0
+    for p in range(TABLE_PACKETS):
+      data = array.array('i')
+      clip = 0
+      for k in range(PACKET_SAMPLES):
+        re = gauss(0.0, noise)
+        im = gauss(0.0, noise)
+        for delta, amp in tones:
+          re += amp * math.cos(delta * n)
+          im += amp * math.sin(delta * n)
+        if pulse_period and n % pulse_period < o.pulse_width:
+          re += pulse
+          im += pulse
+        re = int(round(re))
+        im = int(round(im))
+        if abs(re) > FULL_SCALE or abs(im) > FULL_SCALE:
+          clip = 1
+          re = max(- FULL_SCALE, min(FULL_SCALE, re))
+          im = max(- FULL_SCALE, min(FULL_SCALE, im))
+        data.append(re)
+        data.append(im)
+        n += 1
+      if sys.byteorder != 'little':
+        data.byteswap()
+      data = bytearray(data.tostring())
+      del data[3::4]		# remove the high byte of each 32-bit int
+      self.table.append(str(data))
+      self.clipped.append(clip)
+    print "Sample rate %d, %d packets per second" % (rate, rate / PACKET_SAMPLES)
+  def Control(self):
+    # Answer the status block from the hardware file, and set the sample rate
+    data, addr = self.ctrl_sock.recvfrom(1024)
+    if data[0:2] != 'St' or len(data) < 14:
+      return
+    self.ctrl_sock.sendto(data[0:13] + chr(FIRMWARE_VERSION) + data[14:], addr)
+    if not self.options.rate:
+      rate = int(float(self.options.clock) / ((ord(data[12]) + 1) * 64) + 0.5)
+      if rate != self.rate:
+        self.MakeTable(rate)
+        self.Start()
+  def Command(self):
+    # Read a command from Quisk on the sample port
+    data, addr = self.data_sock.recvfrom(1024)
+    if data[0:2] == '\x72\x72':	# register return address
+      if self.client != addr:
+        print "Sending samples to", addr
+        self.client = addr
+        self.ResetStats()
+        self.Start()
+    elif data[0:2] == '\x73\x73':	# stop
+      if self.client:
+        print "Stopped by", addr
+        self.Report()
+      self.client = None
+  def Start(self):
+    self.time0 = time.time()
+    self.count = 0			# number of packets due since time0
+    self.time_report = self.time0 + self.options.report
+  def Send(self, packet):
+    self.data_sock.sendto(packet, self.client)
+    self.sent += 1
+  def SendPacket(self):
+    # Make and send the next packet, or simulate its loss
+    o = self.options
+    index = self.count % TABLE_PACKETS
+    status = 0
+    if o.key_period > 0 and int(self.count * PACKET_SAMPLES / o.key_period / self.rate) % 2:
+      status |= 0x01
+    if self.clipped[index] or random.random() < o.overrange:
+      status |= 0x02
+    packet = chr(self.seq) + chr(status) + self.table[index]
+    self.seq = (self.seq + 1) & 0xFF
+    self.count += 1
+    if random.random() < o.loss:
+      self.dropped += 1
+      return
+    if self.held:		# send after the held packet's successor
+      self.Send(packet)
+      self.Send(self.held)
+      self.held = None
+    elif random.random() < o.reorder:
+      self.held = packet
+      self.reordered += 1
+    else:
+      self.Send(packet)
+    if random.random() < o.duplicate:
+      self.Send(packet)
+      self.duplicated += 1
+  def Report(self):
+    secs = time.time() - self.time0
+    print "%8.1f secs: sent %d, dropped %d, reordered %d, duplicated %d, behind %d packets, %.0f samples/sec" % (
+      secs, self.sent, self.dropped, self.reordered, self.duplicated, self.behind,
+      self.count * PACKET_SAMPLES / secs)
+    sys.stdout.flush()
+  def Run(self):
+    o = self.options
+    if o.rate:
+      self.MakeTable(o.rate)
+    else:
+      self.MakeTable(int(float(o.clock) / o.decimation + 0.5))
+    self.Start()
+    time_stop = time.time() + o.seconds
+    while o.seconds <= 0 or time.time() < time_stop:
+      if self.client:
+        timeout = 0.001
+      else:
+        timeout = 0.1
+      r, w, x = select.select([self.data_sock, self.ctrl_sock], [], [], timeout)
+      if self.data_sock in r:
+        self.Command()
+      if self.ctrl_sock in r:
+        self.Control()
+      if not self.client:
+        continue
+      now = time.time()
+      due = int((now - self.time0) * self.rate / PACKET_SAMPLES)
+      self.behind = max(self.behind, due - self.count)
+      while self.count < due:
+        self.SendPacket()
+      if o.report > 0 and now >= self.time_report:
+        self.time_report += o.report
+        self.Report()
+    if self.client:
+      self.Report()
+
+def main():
+  parser = OptionParser()
+  parser.add_option('--host', dest='host', default='127.0.0.1',
+    help='Address to listen on, default 127.0.0.1')
+  parser.add_option('--port', dest='port', type='int', default=0xBC77,
+    help='Sample port; the control port is one more, default 48247 (0xBC77)')
+  parser.add_option('--clock', dest='clock', type='float', default=122.88e6,
+    help='ADC clock in Hertz, default 122.88e6')
+  parser.add_option('--decimation', dest='decimation', type='int', default=8 * 8 * 8,
+    help='Decimation from the clock to the sample rate, default 512')
+  parser.add_option('--rate', dest='rate', type='int', default=0,
+    help='Sample rate in Hertz; this replaces the clock, decimation and control port rate')
+  parser.add_option('--tone', dest='tones', action='append', default=[],
+    help='Add a tone FREQ[,DBFS] in Hertz from the center; use it more than once for more tones')
+  parser.add_option('--noise', dest='noise', type='float', default=-90.0,
+    help='RMS noise level in dB relative to full scale, default -90')
+  parser.add_option('--pulse-rate', dest='pulse_rate', type='float', default=0.0,
+    help='Number of noise pulses per second, default 0')
+  parser.add_option('--pulse-level', dest='pulse_level', type='float', default=-6.0,
+    help='Level of the noise pulses in dB relative to full scale, default -6')
+  parser.add_option('--pulse-width', dest='pulse_width', type='int', default=4,
+    help='Width of the noise pulses in samples, default 4')
+  parser.add_option('--loss', dest='loss', type='float', default=0.0,
+    help='Fraction of packets to lose, default 0')
+  parser.add_option('--reorder', dest='reorder', type='float', default=0.0,
+    help='Fraction of packets to send after the next packet, default 0')
+  parser.add_option('--duplicate', dest='duplicate', type='float', default=0.0,
+    help='Fraction of packets to send twice, default 0')
+  parser.add_option('--overrange', dest='overrange', type='float', default=0.0,
+    help='Fraction of packets with the overrange bit; clipped packets always have it')
+  parser.add_option('--key-period', dest='key_period', type='float', default=0.0,
+    help='Seconds between changes of the key bit, or 0 for key up')
+  parser.add_option('--seconds', dest='seconds', type='float', default=0.0,
+    help='Stop after this many seconds, or 0 to run until interrupted')
+  parser.add_option('--report', dest='report', type='float', default=5.0,
+    help='Seconds between statistics reports, or 0 for none')
+  parser.add_option('--seed', dest='seed', type='int', default=None,
+    help='Seed for the random numbers, to repeat a test')
+  options = parser.parse_args()[0]
+  if not options.tones:
+    options.tones = ['10000,-20']
+  random.seed(options.seed)
+  sim = Simulator(options)
+  try:
+    sim.Run()
+  except KeyboardInterrupt:
+    sim.Report()
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# This program measures the speed of the receive processing in the _quisk extension
+# module.  It does not use wx or the sound card, so it can run on any computer with
+# _quisk.  Synthetic I/Q samples are sent through the C code for each mode, sample rate,
+# decimation, filter and FFT size, and through the microphone processing for transmit.
+# The samples per second and the time for each block are printed.  Run it in the quisk directory:
+#	python quisk_benchmark.py						# run all the tests
+#	python quisk_benchmark.py --save				# run the tests and save them as the baseline
+#	python quisk_benchmark.py --compare				# compare with the saved baseline
+#	python quisk_benchmark.py --select process		# run the tests with "process" in the name
+#	python quisk_benchmark.py --file rec.wav		# add tests that play I/Q samples from a file
+# With --compare the exit status is 1 if any test is slower than the baseline by more
+# than the threshold.  A baseline is only useful on the computer that made it.
+
+import sys, os, math, json, platform
+from timeit import default_timer as Timer
+from optparse import OptionParser
+import _quisk as QS
+import quisk_conf_defaults as conf
+
+DATA_WIDTH = 1024		# number of points in the graph
+
+# Sample rate schemes.  A "card" rate is played at the sample rate and filtered at 48 kHz
+# with integer decimation and interpolation.  An "sdr" rate is decimated and resampled to
+# the play rate of 48 kHz.
+Rates = (
+  ('card', 48000),
+  ('card', 192000),
+  ('sdr', 196078),
+  ('sdr', 960000),
+  )
+Modes = (('CWU', 1), ('USB', 3), ('AM', 4), ('FM', 5), ('EXT', 6))
+
+class Test:
+  """One benchmark test."""
+  def __init__(self, name, stage, param=0, ratio=0.0, block=1024, **setup):
+    self.name = name
+    self.stage = stage
+    self.param = param
+    self.ratio = ratio
+    self.block = block
+    self.setup = setup
+  def Run(self, seconds):
+    """Return the samples per second and the list of block times in microseconds."""
+    if self.setup:
+      SetupReceiver(**self.setup)
+    if self.stage == 'graph':
+      return self.RunGraph(seconds)
+    if self.ratio:
+      return QS.benchmark(self.stage, self.block, seconds, self.param, self.ratio)
+    return QS.benchmark(self.stage, self.block, seconds, self.param)
+  def RunGraph(self, seconds):
+    # Process samples until there is a new graph frame, and time get_graph().  The C code
+    # calculates the graph FFT in get_graph() because there is no spectrum thread.
+    times = []
+    total = 0.0
+    count = 0
+    while total < seconds or count < 2:
+      QS.benchmark('process', self.block, 0)
+      t0 = Timer()
+      data = QS.get_graph(1, 1.0, 0.0)
+      t1 = Timer()
+      if data is not None:
+        if count:		# the first frame plans the FFT
+          times.append((t1 - t0) * 1e6)
+          total += t1 - t0
+        count += 1
+    return self.setup['fft_size'] * len(times) / total, times
+
+def SetupReceiver(scheme, rate, mode, bw, taps=0, fft_taps=0, blanker=0, fft_size=8192):
+  """Set up the receiver as Quisk does when it starts and when a mode button is pressed."""
+  if scheme == 'card':
+    conf.playback_rate = rate
+  else:
+    conf.playback_rate = 48000
+  conf.filter_fft_taps = fft_taps
+  QS.record_app(None, conf, DATA_WIDTH, fft_size, 1, rate, 0)
+  QS.open_sound('', '', rate, conf.data_poll_usec, conf.latency_millisecs, '', '',
+    conf.tx_audio_port, conf.mic_sample_rate, conf.mic_channel_I, conf.mic_channel_Q,
+    conf.mic_out_volume, '', conf.mic_playback_rate)
+  frate = QS.get_filter_rate()
+  filtI, filtQ = QS.design_filter(frate, 600, 2800 - 340, (340 + 2800) / 2, 'fm')
+  QS.set_fm_filters(filtI)
+  # The transmit filters are from quisk.py, and set_rx_mode() starts them for the mode
+  filtI, filtQ = QS.design_filter(conf.mic_sample_rate, 540, 2700, 1650, conf.filter_design)
+  QS.set_tx_filters(filtI, filtQ, ())
+  QS.set_rx_mode(dict(Modes)[mode])
+  # The filter taps and center are from ModeFilterArgs() in quisk.py
+  if mode == 'CWU':
+    N = 1000
+    center = max(conf.cwTone, bw / 2)
+  elif mode == 'USB':
+    N = 540
+    center = 300 + bw / 2
+  else:
+    N = 140
+    center = 0
+  if taps:
+    N = taps
+  filtI, filtQ = QS.design_filter(frate, N, bw, center, conf.filter_design)
+  QS.set_filters(filtI, filtQ, bw)
+  QS.set_noise_blanker(blanker)
+  QS.set_volume(0.5)
+
+def MakeTests(file_rate):
+  tests = []
+  bandwidths = {'CWU':500, 'USB':2800, 'AM':6000, 'FM':12000, 'EXT':12000}
+  # The whole receive processing for each mode and sample rate
+  for scheme, rate in Rates:
+    for mode, index in Modes:
+      if mode == 'EXT' and scheme != 'card':	# the example in extdemod.c can not decimate
+        continue
+      tests.append(Test('process %s %s %d' % (mode, scheme, rate), 'process',
+        scheme=scheme, rate=rate, mode=mode, bw=bandwidths[mode]))
+  # Filter lengths with the direct FIR filter and with fast convolution
+  for taps in (140, 540, 1000, 2000, 4000):
+    for fft_taps, name in ((-1, 'fir'), (1, 'fft')):
+      tests.append(Test('filter %s %d taps' % (name, taps), 'process',
+        scheme='card', rate=192000, mode='USB', bw=2800, taps=taps, fft_taps=fft_taps))
+  # The noise blanker
+  for blanker in (1, 2, 3):
+    tests.append(Test('blanker %d' % blanker, 'process',
+      scheme='card', rate=192000, mode='USB', bw=2800, blanker=blanker))
+  # The graph FFT
+  for fft_size in (4096, 16384, 65536):
+    tests.append(Test('graph fft %d' % fft_size, 'graph', block=4096,
+      scheme='sdr', rate=960000, mode='USB', bw=2800, fft_size=fft_size))
+  # Parts of the processing
+  for fmt, name in ((0, 's16'), (1, 's24'), (2, 's32'), (3, 'float')):
+    tests.append(Test('frontend %s' % name, 'frontend', fmt))
+  for decim in (2, 4, 5, 8, 10, 20, 40):
+    tests.append(Test('decimate %d' % decim, 'decimate', decim, block=4000))
+  for quality in range(4):
+    tests.append(Test('resample quality %d' % quality, 'resample', quality, 196078.4 / 48000))
+  # The transmit processing of the microphone samples
+  for mode in ('USB', 'AM'):
+    tests.append(Test('microphone %s' % mode, 'microphone',
+      scheme='card', rate=48000, mode=mode, bw=bandwidths[mode]))
+  # The whole receive processing with samples from the file source
+  if file_rate:
+    if file_rate % 48000 == 0:
+      scheme = 'card'
+    else:
+      scheme = 'sdr'
+    for mode, index in Modes:
+      if mode == 'EXT' and scheme != 'card':
+        continue
+      tests.append(Test('file %s %s %d' % (mode, scheme, file_rate), 'source', block=0,
+        scheme=scheme, rate=file_rate, mode=mode, bw=bandwidths[mode]))
+  return tests
+
+def Percentile(times, percent):
+  """Return the percentile of the sorted list of times."""
+  if not times:
+    return 0.0
+  i = int(math.ceil(percent / 100.0 * len(times))) - 1
+  return times[max(0, min(i, len(times) - 1))]
+
+def main():
+  parser = OptionParser()
+  parser.add_option('--seconds', dest='seconds', type='float', default=1.0,
+    help='Seconds to run each test, default 1.0')
+  parser.add_option('--select', dest='select', action='append', default=[],
+    help='Run the tests with this text in the name; use it more than once for more tests')
+  parser.add_option('--list', dest='list', action='store_true', default=False,
+    help='List the test names and exit')
+  parser.add_option('--baseline', dest='baseline',
+    default=os.path.join(os.path.expanduser('~'), '.quisk_benchmark.json'),
+    help='The baseline file, default ~/.quisk_benchmark.json')
+  parser.add_option('--save', dest='save', action='store_true', default=False,
+    help='Save the results to the baseline file')
+  parser.add_option('--compare', dest='compare', action='store_true', default=False,
+    help='Compare the results with the baseline file')
+  parser.add_option('--file', dest='file', default='',
+    help='Add tests of the whole receive processing with I/Q samples from this WAV file')
+  parser.add_option('--threshold', dest='threshold', type='float', default=10.0,
+    help='Percent slower than the baseline that is a regression, default 10')
+  options = parser.parse_args()[0]
+  file_rate = 0
+  if options.file:		# play the file as fast as possible, and repeat it
+    msg, file_rate = QS.open_file_source(options.file, '', 0, 0, 0, 1)
+    print msg
+    if not file_rate:
+      return 2
+  tests = MakeTests(file_rate)
+  if options.select:
+    tests = [t for t in tests if [s for s in options.select if s in t.name]]
+  if options.list:
+    for t in tests:
+      print t.name
+    return 0
+  baseline = {}
+  if options.compare or options.save:
+    if os.path.isfile(options.baseline):
+      fp = open(options.baseline, 'r')
+      baseline = json.load(fp)
+      fp.close()
+    elif options.compare:
+      print 'There is no baseline file', options.baseline
+      return 2
+  conf.spectrum_thread = 0		# calculate the graph in get_graph()
+  conf.fftw_wisdom = 0
+  results = baseline.get('results', {})
+  regressions = 0
+  print '%-28s %10s %9s %9s %9s %9s' % ('Test', 'Msamp/sec', 'p50 usec', 'p90 usec', 'p99 usec', 'max usec'),
+  if options.compare:
+    print '%9s' % 'Change',
+  print
+  for t in tests:
+    rate, times = t.Run(options.seconds)
+    times.sort()
+    result = {'rate':rate, 'block':t.block, 'p50':Percentile(times, 50), 'p90':Percentile(times, 90),
+      'p99':Percentile(times, 99), 'max':Percentile(times, 100)}
+    print '%-28s %10.3f %9.1f %9.1f %9.1f %9.1f' % (t.name, rate * 1e-6,
+      result['p50'], result['p90'], result['p99'], result['max']),
+    if options.compare:
+      base = results.get(t.name)
+      if base and base['block'] == t.block:
+        change = (rate / base['rate'] - 1.0) * 100.0
+        print '%8.1f%%' % change,
+        if change < - options.threshold:
+          print 'REGRESSION',
+          regressions += 1
+      else:
+        print '%9s' % 'new',
+    print
+    sys.stdout.flush()
+    if options.save:
+      results[t.name] = result
+  QS.close_sound()
+  QS.close_file_source()
+  if options.save:
+    baseline = {'machine':platform.platform(), 'python':platform.python_version(), 'results':results}
+    fp = open(options.baseline, 'w')
+    json.dump(baseline, fp, indent=1, sort_keys=True)
+    fp.close()
+    print 'Saved the baseline to', options.baseline
+  if regressions:
+    print '%d tests are slower than the baseline by more than %.0f%%' % (regressions, options.threshold)
+    return 1
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -200,6 +200,30 @@ rx_ip = ""							# Receiver IP address for VFO control
 # name_of_sound_play = "hw:0"		# Play back on this soundcard
 # playback_rate = 48000				# Radio sound play rate, default 48000
 
+# A thread receives the UDP packets and puts them in order in a jitter buffer.  A missing
+# packet is waited for until rx_udp_jitter_packets newer packets arrive; then its samples
+# are filled and it is counted as lost.  Packets that arrive in order are not delayed.
+rx_udp_jitter_packets = 8			# Depth of the jitter buffer in packets, 1 to 128
+rx_udp_gap_fill = 1					# Fill lost packets with zeros (0) or interpolate (1)
+rx_udp_rcvbuf = 1048576				# Socket receive buffer in bytes; the system may limit it
+
+# To play I/Q samples from a recording instead of a radio, set these parameters.  This is
+# useful to reproduce a problem, or to test Quisk without a radio.  The file is a WAV file
+# or raw samples with 16, 24 or 32-bit integers or 32-bit floats.  Channel 0 is I and
+# channel 1 is Q.  The sample rate of a WAV file is used instead of sample_rate.
+# import quisk_hardware_file as quisk_hardware		# Use different hardware file
+# file_source_name = "rec.wav"		# Name of the recording
+# name_of_sound_capt = ""			# We do not capture from the soundcard
+# name_of_sound_play = "hw:0"		# Play back on this soundcard
+# playback_rate = 48000				# Radio sound play rate, default 48000
+# fixed_vfo_freq = 7056000			# The VFO frequency of the recording
+file_source_name = ""
+file_source_format = ""				# "" for a WAV file, or raw samples "s16", "s24", "s32" or "float"
+file_source_rate = 48000			# Sample rate of raw samples
+file_source_channels = 2			# Number of channels of raw samples
+file_source_realtime = 1			# Play at the sample rate (1) or as fast as possible (0)
+file_source_loop = 1				# At the end of the file start again (1) or stop (0)
+
 # Thanks to Ethan Blanton, KB8OJH, for this patch for the Si570 (many SoftRock's):
 # If you are using a DG8SAQ interface to set a Si570 clock directly, set
 # this to True.  Complex controllers which have their own internal
@@ -282,6 +306,20 @@ add_imd_button = 0
 # same time), set this to 1.
 add_fdx_button = 0
 
+# Quisk can demodulate up to seven more signals within the sample rate at the same time
+# as the main receiver.  These sub-receivers share the I/Q samples, noise blanker and
+# sound device with the main receiver, and their audio is added to the left, right or
+# both playback channels.  For example, listen to a CW net on the left channel while
+# you tune on the right.  Each item is (frequency in Hertz, mode, filter bandwidth in
+# Hertz, volume 0.0 to 1.0, channels "left", "right" or "both").  The mode is one of
+# CWL, CWU, LSB, USB, AM or FM.  A sub-receiver is silent when its frequency is outside
+# the displayed band.
+sub_receivers = []
+#sub_receivers = [
+#  (7030000, 'CWU', 500, 0.5, "left"),
+#  (7200000, 'LSB', 2800, 0.5, "right"),
+#  ]
+
 # If you want to write your own I/Q filter and demodulation module, set
 # this to the name of the button to add, and change extdemod.c.
 # add_extern_demod = "WFM"
@@ -295,6 +333,33 @@ FilterBwFM	= (8000, 10000, 12000, 15000, 17000, 20000)
 FilterBwIMD	= (1800, 2000, 2200, 2500, 2800, 3300)
 FilterBwEXT	= (8000, 10000, 12000, 15000, 17000, 20000)
 
+# Long receive filters (such as the sharp CW filters) are calculated with the FFT
+# (fast convolution) instead of a direct FIR filter.  This is much faster, but
+# adds a delay of about the filter length.  Set filter_fft_taps to zero to let
+# Quisk decide, to -1 to never use the FFT, or to the minimum number of filter
+# taps that will use the FFT.
+filter_fft_taps = 0
+
+# When the sample rate is not an exact multiple of the play rate, for example the SDR-IQ
+# at 196078 Hz, the audio is resampled by a fraction to the play rate.  Set the
+# resample_quality to 0 for linear interpolation (the least CPU), or to 1, 2 or 3 for a
+# polyphase filter with 50, 80 or 100 dB of alias rejection.
+resample_quality = 2
+
+# The receive filters are designed when a filter button is first used, and the designs
+# are saved.  Quisk also designs the filters for all the buttons ahead of time.  The
+# filter_design is "sinc" for the original windowed sinc filters, "kaiser" for a Kaiser
+# window with the same stopband and fewer taps, or "remez" for Parks-McClellan equiripple
+# filters with 0.1 dB of passband ripple and the fewest taps.
+
+filter_design = "sinc"
+
+# Quisk can use native worker threads to run the sub-receivers in parallel with the
+# main receiver on a multi-core computer.  Set this to the number of worker threads,
+# or to zero to do all the sound processing in the sound thread.  The Config screen
+# shows the average/maximum microseconds used by each processing stage.
+worker_threads = 0
+
 # This is the data used to draw colored lines on the frequency X axis to
 # indicate CW and Phone sub-bands.  You can make it anything you want.
 
@@ -514,6 +579,51 @@ fft_size_multiplier = 0
 
 graph_refresh = 7			# update the graph at this rate in Hertz
 
+# The sound thread passes samples to the graph through a ring with the history of
+# fft_ring_depth blocks of fft_size samples.  If the graph can not keep up, the oldest
+# samples are overwritten and blocks are dropped.  A deeper ring rides through longer
+# delays in the GUI, and uses fft_size * 16 bytes for each block.  The Config screen
+# shows the ring statistics.
+
+fft_ring_depth = 8
+
+# Successive FFT blocks can overlap (Welch averaging).  With fft_overlap = 0.5 each
+# block starts half an FFT after the previous block, so twice as many FFT's are
+# averaged for the same refresh rate, and the graph is smoother.  Use 0.75 for four
+# times as many.  When fft_size_multiplier is large, overlap also lets the FFT be
+# longer than the time between graph updates.  Overlap uses more processor time
+# for the FFT's but adds no capture latency.  Use 0.0 for no overlap.
+
+fft_overlap = 0.0
+
+# A wideband receiver can use a very large FFT, 256k to 1M points, for fine resolution
+# across the whole band.  Set fft_size_multiplier to a large number, and fft_overlap to
+# get more FFT's for each graph.  On a multi-core computer, set fft_threads to the
+# number of threads that calculate each graph FFT.  Neighboring bins are added in blocks
+# as they are averaged when there are many bins for each pixel.
+
+fft_threads = 1
+
+# When you zoom in on the graph, Quisk tunes the samples to the center of the zoomed
+# graph, decimates them, and calculates a separate FFT with narrower bins.  This shows
+# real detail, for example separate CW signals a few Hertz apart.  Set zoom_fft to
+# zero to use the bins of the full FFT instead.
+
+zoom_fft = 1
+
+# The FFT's, averaging and conversion to dB for the graph are calculated in a separate
+# native thread, so the screen stays responsive with a large fft_size.  Set this to
+# zero to calculate them in the GUI thread instead.
+
+spectrum_thread = 1
+
+# Quisk plans each FFT size by timing several methods, and this takes a noticeable
+# time for large FFT's.  The best plans are saved on exit in the file .quisk_fftw_wisdom
+# in the same directory as your config file, so the next start is faster.  The Config
+# screen shows the planning time.  Set this to zero to plan from scratch each time.
+
+fftw_wisdom = 1
+
 # latency_millisecs determines how many samples are in the soundcard play buffer.
 # A larger number makes it less likely that you will run out of samples to play,
 # but increases latency.  It is OK to suffer a certain number of play buffer 
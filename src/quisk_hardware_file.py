@@ -0,0 +1,37 @@
+# Please do not change this hardware control module for Quisk.
+# This hardware module plays I/Q samples from a WAV or raw file instead of a radio.
+# The VFO frequency is fixed at fixed_vfo_freq.  See the file_source items in
+# quisk_conf_defaults.py.
+
+# If you want to use this hardware module, specify it in quisk_conf.py.
+# import quisk_hardware_file as quisk_hardware
+# See quisk_hardware_model.py for documentation.
+
+import _quisk as QS
+
+from quisk_hardware_model import Hardware as BaseHardware
+
+class Hardware(BaseHardware):
+  def __init__(self, app, conf):
+    BaseHardware.__init__(self, app, conf)
+    self.vfo = self.conf.fixed_vfo_freq		# Fixed VFO frequency in Hertz
+    self.tune = self.vfo + 10000			# Current tuning frequency in Hertz
+    # Open the file now, because the sample rate of a WAV file is needed before open()
+    self.config_text, rate = QS.open_file_source(conf.file_source_name, conf.file_source_format,
+        conf.file_source_rate, conf.file_source_channels, conf.file_source_realtime,
+        conf.file_source_loop)
+    if rate:
+      conf.sample_rate = rate
+    if not hasattr(conf, 'playback_rate'):
+      conf.playback_rate = 48000
+  def open(self):
+    return self.config_text		# Return a config message
+  def close(self):
+    QS.close_file_source()
+  def ChangeFrequency(self, tune, vfo, source='', band='', event=None):
+    # Change and return the tuning and VFO frequency.  See quisk_hardware_model.py.
+    self.tune = tune
+    return tune, self.vfo
+  def ReturnFrequency(self):
+    # Return the current tuning and VFO frequency.  See quisk_hardware_model.py.
+    return self.tune, self.vfo